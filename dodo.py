@@ -440,6 +440,10 @@ read_config_crf = {
     "data_year": get_var("data_year", None),
     "totest": get_var("totest", None),
     "type": get_var("type", "CRF"),
+    "n_workers": get_var("n_workers", "1"),
+    "use_cache": get_var("use_cache", "True"),
+    "incremental": get_var("incremental", "False"),
+    "streaming": get_var("streaming", "False"),
 }
 
 
@@ -461,6 +465,8 @@ def task_read_unfccc_crf_submission():
             date_or_version=date_or_version,
             re_read=re_read,
             type=read_config_crf["type"],
+            n_workers=int(read_config_crf["n_workers"]),
+            incremental=read_config_crf["incremental"] == "True",
         )
 
     return {
@@ -491,6 +497,7 @@ def task_read_new_unfccc_crf_for_year():
             # countries=read_config_crf["countries"],
             re_read=re_read,
             type=read_config_crf["type"],
+            n_workers=int(read_config_crf["n_workers"]),
         )
 
     return {
@@ -526,6 +533,7 @@ def task_test_read_unfccc_crf_for_year():
             totest=totest,
             country_code=read_config_crf["country"],
             submission_type=read_config_crf["type"],
+            use_cache=read_config_crf["use_cache"] == "True",
         )
 
     return {
@@ -538,6 +546,25 @@ def task_test_read_unfccc_crf_for_year():
     }
 
 
+def task_clear_crf_sheet_cache():
+    """
+    Clear the cache of parsed CRF/CRT worksheets
+
+    Use max_size (in MB) to only remove the least recently used entries until the
+    cache is smaller than max_size.
+    """
+    action = "python src/unfccc_ghg_data/unfccc_crf_reader/clear_crf_sheet_cache.py"
+    max_size = get_var("max_size", None)
+    if max_size is not None:
+        action = f"{action} --max_size={max_size}"
+
+    return {
+        "actions": [action],
+        "verbosity": 2,
+        "setup": ["in_venv"],
+    }
+
+
 def task_compile_raw_unfccc_crf_for_year():
     """
     Collect all latest CRF/CRT submissions for a given year / submission round
@@ -555,6 +582,8 @@ def task_compile_raw_unfccc_crf_for_year():
         f"--submission_year={read_config_crf['submission_year']} "
         f"--type={read_config_crf['type']} "
     ]
+    if read_config_crf["streaming"] == "True":
+        actions[0] = actions[0] + "--streaming"
     return {
         "actions": actions,
         "verbosity": 2,
@@ -569,6 +598,11 @@ read_config_di = {
     "country": get_var("country", None),
     "date": get_var("date", None),
     "annexI": get_var("annexI", False),
+    "n_workers": get_var("n_workers", "1"),
+    "streaming": get_var("streaming", "False"),
+    "use_zenodo": get_var("use_zenodo", "True"),
+    "rate_limit": get_var("rate_limit", None),
+    "use_cache": get_var("use_cache", "False"),
     # "countries": get_var('countries', None),
 }
 
@@ -612,7 +646,18 @@ def task_read_unfccc_di_for_country_group():
             annexI = True
         else:
             annexI = False
-        read_DI_for_country_group_datalad(annexI=annexI)
+        if read_config_di["rate_limit"] is None:
+            rate_limit = None
+        else:
+            rate_limit = float(read_config_di["rate_limit"])
+        read_DI_for_country_group_datalad(
+            annexI=annexI,
+            streaming=read_config_di["streaming"] == "True",
+            use_zenodo=read_config_di["use_zenodo"] == "True",
+            n_workers=int(read_config_di["n_workers"]),
+            rate_limit=rate_limit,
+            use_cache=read_config_di["use_cache"] == "True",
+        )
 
     return {
         "actions": [(read_DI,), (map_folders, ["extracted_data/UNFCCC"])],
@@ -632,6 +677,7 @@ def task_process_unfccc_di_for_country_group():
         process_DI_for_country_group_datalad(
             annexI=annexI,
             date_str=read_config_di["date"],
+            n_workers=int(read_config_di["n_workers"]),
         )
 
     return {
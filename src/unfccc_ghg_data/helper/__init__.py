@@ -10,6 +10,7 @@ from .definitions import (
     GWP_factors,
     additional_territories,
     all_countries,
+    cache_path,
     code_path,
     compression,
     custom_country_mapping,
@@ -27,29 +28,47 @@ from .definitions import (
     root_path,
 )
 from .functions import (
+    DatasetCombiner,
+    FolderMappingIndex,
+    ProcessingProfiler,
+    add_aggregates_coordinates_planned,
     auto_fix_rows,
+    combine_datasets,
+    concat_area_datasets,
     convert_categories,
     create_folder_mapping,
     fix_rows,
+    folder_mapping_index,
     get_code_file,
     get_country_code,
     get_country_datasets,
     get_country_name,
+    get_dataset_hash,
     make_long_table,
     make_wide_table,
     merge_rows,
+    plan_aggregation,
     process_data_for_country,
     set_to_nan_in_ds,
+    write_interchange_format_streaming,
+    write_netcdf_streaming,
 )
 
 __all__ = [
     "AI_countries",
+    "DatasetCombiner",
+    "FolderMappingIndex",
     "GWP_factors",
+    "ProcessingProfiler",
+    "add_aggregates_coordinates_planned",
     "additional_territories",
     "all_countries",
     "auto_fix_rows",
+    "cache_path",
     "code_path",
+    "combine_datasets",
     "compression",
+    "concat_area_datasets",
     "convert_categories",
     "create_folder_mapping",
     "custom_country_mapping",
@@ -61,18 +80,23 @@ __all__ = [
     "extracted_data_path",
     "extracted_data_path_UNFCCC",
     "fix_rows",
+    "folder_mapping_index",
     "gas_baskets",
     "get_code_file",
     "get_country_code",
     "get_country_datasets",
     "get_country_name",
+    "get_dataset_hash",
     "legacy_data_path",
     "log_path",
     "make_long_table",
     "make_wide_table",
     "merge_rows",
     "nAI_countries",
+    "plan_aggregation",
     "process_data_for_country",
     "root_path",
     "set_to_nan_in_ds",
+    "write_interchange_format_streaming",
+    "write_netcdf_streaming",
 ]
@@ -63,6 +63,10 @@ downloaded_data_path_UNFCCC = downloaded_data_path / "UNFCCC"
 legacy_data_path = root_path / "legacy_data"
 dataset_path = root_path / "datasets"
 dataset_path_UNFCCC = dataset_path / "UNFCCC"
+# caches are kept outside of the datalad dataset so they don't show up as changes
+cache_path = Path(
+    os.getenv("UNFCCC_GHG_CACHE_PATH") or Path.home() / ".cache" / "unfccc_ghg_data"
+).resolve()
 
 nAI_countries = list(pd.read_csv(code_path / "helper" / "DI_NAI_parties.conf")["code"])
 # AI_countries = list(reader.annex_one_reader.parties["code"])
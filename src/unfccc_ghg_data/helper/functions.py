@@ -6,16 +6,23 @@ Functions used by the different readers and downloaders in the unfccc_ghg_data p
 from __future__ import annotations
 
 import copy
+import csv
+import functools
+import hashlib
 import json
 import re
+import time
+import tracemalloc
 import warnings
-from collections.abc import Hashable
+from collections.abc import Hashable, Iterable
 from copy import deepcopy
 from datetime import date
 from pathlib import Path
 
+import dask
 import numpy as np
 import pandas as pd
+import primap2 as pm2
 import pycountry
 import xarray as xr
 
@@ -27,6 +34,7 @@ from .definitions import (
     downloaded_data_path,
     extracted_data_path,
     legacy_data_path,
+    log_path,
     root_path,
 )
 
@@ -40,6 +48,8 @@ def process_data_for_country(  # noqa PLR0913, PLR0912, PLR0915
     category_conversion: dict[str, dict] | None = None,
     sectors_out: list[str] | None = None,
     processing_info_country: dict | None = None,
+    batch_subtract_cats: bool = False,
+    profiler: ProcessingProfiler | None = None,
 ) -> xr.Dataset:
     """
     Process data from DI interface (where necessary).
@@ -74,6 +84,13 @@ def process_data_for_country(  # noqa PLR0913, PLR0912, PLR0915
         more detailed processing info TODO: explain format
         The "aggregate_cats" flag is deprecated and will be removed in a future
         version. Please use "aggregate_coord" with key "category" instead
+    batch_subtract_cats: bool = False
+        If True, generate the categories from "subtract_cats" in batches using
+        `subtract_categories_batched` instead of one at a time. The result is the
+        same, but it's much faster for many categories.
+    profiler: ProcessingProfiler | None = None
+        If given, the run time, memory use and dataset size of each processing step
+        are recorded in the profiler
 
     Returns
     -------
@@ -124,6 +141,14 @@ def process_data_for_country(  # noqa PLR0913, PLR0912, PLR0915
     else:
         cat_name_present = False
 
+    # record the processing steps if a profiler is given
+    def record_step(step: str, case: str | None = None) -> None:
+        if profiler is not None:
+            profiler.record(step, data_country, case=case)
+
+    if profiler is not None:
+        profiler.start(data_country)
+
     # 1: general processing
     # remove unused cats
     data_country = data_country.dropna(f"category ({cat_terminology_in})", how="all")
@@ -137,16 +162,19 @@ def process_data_for_country(  # noqa PLR0913, PLR0912, PLR0915
     ]
     print(f"removing all-nan variables: {nan_vars_country}")
     data_country = data_country.drop_vars(nan_vars_country)
+    record_step("remove_nan")
 
     # remove unnecessary variables
     entities_ignore_present = [
         entity for entity in entities_to_ignore if entity in data_country.data_vars
     ]
     data_country = data_country.drop_vars(entities_ignore_present)
+    record_step("entities_to_ignore")
 
     # filter ()
     if filter_dims is not None:
         data_country = data_country.pr.loc[filter_dims]
+        record_step("filter_dims")
 
     # 2: country specific processing
     if processing_info_country is not None:
@@ -162,12 +190,14 @@ def process_data_for_country(  # noqa PLR0913, PLR0912, PLR0915
                 if entity in data_country.data_vars
             ]
             data_country = data_country.drop_vars(entities_ignore_present)
+            record_step("ignore_entities")
 
         # take only desired years
         if "years" in processing_info_country:
             data_country = data_country.pr.loc[
                 {"time": processing_info_country["years"]}
             ]
+            record_step("years")
 
         # remove timeseries if desired
         if "remove_ts" in processing_info_country:
@@ -176,15 +206,17 @@ def process_data_for_country(  # noqa PLR0913, PLR0912, PLR0915
                 if "entities" in remove_info:
                     entities = remove_info.pop("entities")
                 else:
-                    entities = data_country.data_vars
-                for entity in entities:
-                    data_country[entity].pr.loc[remove_info] *= np.nan
+                    entities = list(data_country.data_vars)
+                mask = get_selection_mask(data_country, remove_info)
+                data_country = data_country.assign(data_country[entities].where(~mask))
+                record_step("remove_ts", case)
 
         # remove all data for given years if necessary
         if "remove_years" in processing_info_country:
             data_country = data_country.drop_sel(
                 time=processing_info_country["remove_years"]
             )
+            record_step("remove_years")
 
         # move timeseries if desired
         if "move_ts" in processing_info_country:
@@ -195,70 +227,81 @@ def process_data_for_country(  # noqa PLR0913, PLR0912, PLR0915
                 sel = move_info["sel"].copy()
                 sel.update({dim: move_info["from"]})
                 to_val = move_info["to"]
-                for entity in entities:
-                    ts_to_move = data_country[entity].pr.loc[sel]
-                    data_country[entity] = data_country[entity].pr.set(
-                        dim, to_val, ts_to_move
-                    )
-                    data_country[entity].pr.loc[sel] *= np.nan
+                ts_to_move = data_country[entities].pr.loc[sel]
+                data_country = data_country.assign(
+                    data_country[entities].pr.set(dim, to_val, ts_to_move)
+                )
+                mask = get_selection_mask(data_country, sel)
+                data_country = data_country.assign(data_country[entities].where(~mask))
+                record_step("move_ts", case)
 
         # subtract categories
         if "subtract_cats" in processing_info_country:
             subtract_cats_current = processing_info_country["subtract_cats"]
             print(f"Subtracting categories for country {country_code}")
-            for cat_to_generate in subtract_cats_current:
-                if "entities" in subtract_cats_current[cat_to_generate].keys():
-                    entities_current = subtract_cats_current[cat_to_generate][
-                        "entities"
-                    ]
-                else:
-                    entities_current = list(data_country.data_vars)
-
-                cats_to_subtract = subtract_cats_current[cat_to_generate]["subtract"]
-                data_sub = (
-                    data_country[entities_current]
-                    .pr.loc[{"category": cats_to_subtract}]
-                    .pr.sum(dim="category", skipna=True, min_count=1)
+            if batch_subtract_cats:
+                data_country = subtract_categories_batched(
+                    data_country, subtract_cats_current, tolerance=tolerance
                 )
-                data_parent = data_country[entities_current].pr.loc[
-                    {"category": subtract_cats_current[cat_to_generate]["parent"]}
-                ]
-                data_agg = data_parent - data_sub
-                nan_vars = [
-                    var
-                    for var in data_agg.data_vars
-                    if data_agg[var].isnull().all().data is True  # noqa: PD003
-                ]
-                data_agg = data_agg.drop(nan_vars)
-                if len(data_agg.data_vars) > 0:
-                    print(f"Generating {cat_to_generate} through subtraction")
-                    data_agg = data_agg.expand_dims(
-                        [f"category ({cat_terminology_in})"]
-                    )
+            else:
+                for cat_to_generate in subtract_cats_current:
+                    if "entities" in subtract_cats_current[cat_to_generate].keys():
+                        entities_current = subtract_cats_current[cat_to_generate][
+                            "entities"
+                        ]
+                    else:
+                        entities_current = list(data_country.data_vars)
 
-                    data_agg = data_agg.assign_coords(
-                        coords={
-                            f"category ({cat_terminology_in})": (
-                                f"category ({cat_terminology_in})",
-                                [cat_to_generate],
-                            )
-                        }
+                    cats_to_subtract = subtract_cats_current[cat_to_generate][
+                        "subtract"
+                    ]
+                    data_sub = (
+                        data_country[entities_current]
+                        .pr.loc[{"category": cats_to_subtract}]
+                        .pr.sum(dim="category", skipna=True, min_count=1)
                     )
-                    if cat_name_present:
-                        cat_name = subtract_cats_current[cat_to_generate][
-                            "orig_cat_name"
-                        ]
+                    data_parent = data_country[entities_current].pr.loc[
+                        {"category": subtract_cats_current[cat_to_generate]["parent"]}
+                    ]
+                    data_agg = data_parent - data_sub
+                    nan_vars = [
+                        var
+                        for var in data_agg.data_vars
+                        if data_agg[var].isnull().all().data is True  # noqa: PD003
+                    ]
+                    data_agg = data_agg.drop(nan_vars)
+                    if len(data_agg.data_vars) > 0:
+                        print(f"Generating {cat_to_generate} through subtraction")
+                        data_agg = data_agg.expand_dims(
+                            [f"category ({cat_terminology_in})"]
+                        )
+
                         data_agg = data_agg.assign_coords(
                             coords={
-                                "orig_cat_name": (
+                                f"category ({cat_terminology_in})": (
                                     f"category ({cat_terminology_in})",
-                                    [cat_name],
+                                    [cat_to_generate],
                                 )
                             }
                         )
-                    data_country = data_country.pr.merge(data_agg, tolerance=tolerance)
-                else:
-                    print(f"no data to generate category {cat_to_generate}")
+                        if cat_name_present:
+                            cat_name = subtract_cats_current[cat_to_generate][
+                                "orig_cat_name"
+                            ]
+                            data_agg = data_agg.assign_coords(
+                                coords={
+                                    "orig_cat_name": (
+                                        f"category ({cat_terminology_in})",
+                                        [cat_name],
+                                    )
+                                }
+                            )
+                        data_country = data_country.pr.merge(
+                            data_agg, tolerance=tolerance
+                        )
+                    else:
+                        print(f"no data to generate category {cat_to_generate}")
+            record_step("subtract_cats")
 
         # interpolation
         if "interpolate_ts" in processing_info_country:
@@ -269,16 +312,18 @@ def process_data_for_country(  # noqa PLR0913, PLR0912, PLR0915
                 if "entities" in interp_info:
                     entities = interp_info.pop("entities")
                 else:
-                    entities = data_country.data_vars
-                for entity in entities:
-                    data_interpolated = (
-                        data_country[entity]
-                        .pr.loc[interp_info]
-                        .interpolate_na(dim="time", method="linear")
-                    )
-                    data_country[entity] = data_country[entity].pr.merge(
-                        data_interpolated
-                    )
+                    entities = list(data_country.data_vars)
+                data_interpolated = (
+                    data_country[entities]
+                    .pr.loc[interp_info]
+                    .interpolate_na(dim="time", method="linear")
+                )
+                # interpolation only fills missing values, so existing values don't
+                # have to be checked for consistency as in pr.merge
+                data_country = data_country.assign(
+                    data_country[entities].fillna(data_interpolated)
+                )
+                record_step("interpolate_ts", case)
 
         # downscaling
         if "downscale" in processing_info_country:
@@ -293,6 +338,7 @@ def process_data_for_country(  # noqa PLR0913, PLR0912, PLR0915
                             entity
                         ].pr.downscale_timeseries(**sector_downscaling_current)
                         # , skipna_evaluation_dims=None)
+                    record_step("downscale", case)
 
             if "entities" in processing_info_country["downscale"]:
                 entity_downscaling = processing_info_country["downscale"]["entities"]
@@ -305,6 +351,7 @@ def process_data_for_country(  # noqa PLR0913, PLR0912, PLR0915
                         skipna=True,
                         skipna_evaluation_dims=None,
                     )
+                    record_step("downscale", case)
 
         # aggregate categories
         if "aggregate_cats" in processing_info_country:
@@ -319,7 +366,7 @@ def process_data_for_country(  # noqa PLR0913, PLR0912, PLR0915
                 f"scenario {scenario}"
             )
 
-            # prep input to add_aggregates_coordinates
+            # prep input to add_aggregates_coordinates_planned
             agg_info = {"category": processing_info_country["aggregate_cats"]}
 
             if "agg_tolerance" in processing_info_country:
@@ -327,63 +374,69 @@ def process_data_for_country(  # noqa PLR0913, PLR0912, PLR0915
             else:
                 agg_tolerance = tolerance
 
-            data_country = data_country.pr.add_aggregates_coordinates(
+            data_country = add_aggregates_coordinates_planned(
+                data_country,
                 agg_info=agg_info,
                 tolerance=agg_tolerance,
                 skipna=True,
                 min_count=1,
             )
+            record_step("aggregate_cats")
 
         if "aggregate_coords" in processing_info_country:
             print(
                 f"Aggregating data for country {country_code}, source {source}, "
                 f"scenario {scenario}"
             )
-            data_country = data_country.pr.add_aggregates_coordinates(
+            data_country = add_aggregates_coordinates_planned(
+                data_country,
                 agg_info=processing_info_country["aggregate_coords"],
                 skipna=True,
                 min_count=1,
             )
+            record_step("aggregate_coords")
 
         # copy HFCs and PFCs with default factors
         if "basket_copy" in processing_info_country:
             GWPs_to_add = processing_info_country["basket_copy"]["GWPs_to_add"]
             entities = processing_info_country["basket_copy"]["entities"]
             source_GWP = processing_info_country["basket_copy"]["source_GWP"]
+            data_source = data_country[
+                [f"{entity} ({source_GWP})" for entity in entities]
+            ]
             if "sel" in processing_info_country["basket_copy"]:
-                for entity in entities:
-                    data_source = data_country[f"{entity} ({source_GWP})"].pr.loc[
-                        processing_info_country["basket_copy"]["sel"]
-                    ]
-                    for GWP in GWPs_to_add:
-                        data_GWP = (
-                            data_source * GWP_factors[f"{source_GWP}_to_{GWP}"][entity]
-                        )
-                        data_GWP.attrs["entity"] = entity
-                        data_GWP.attrs["gwp_context"] = GWP
-                        variable = f"{entity} ({GWP})"
-                        if entity in data_country.data_vars:
-                            data_country[variable] = data_country[variable].pr.merge(
-                                data_GWP
-                            )
-                        else:
-                            data_country[variable] = data_GWP
-            else:
-                for entity in entities:
-                    data_source = data_country[f"{entity} ({source_GWP})"]
-                    for GWP in GWPs_to_add:
-                        data_GWP = (
-                            data_source * GWP_factors[f"{source_GWP}_to_{GWP}"][entity]
-                        )
-                        data_GWP.attrs["entity"] = entity
-                        data_GWP.attrs["gwp_context"] = GWP
-                        data_country[f"{entity} ({GWP})"] = data_GWP
+                # data outside of the selection is set to NaN, which is the same as
+                # adding the selected data to the dataset
+                mask = get_selection_mask(
+                    data_country, processing_info_country["basket_copy"]["sel"]
+                )
+                data_source = data_source.where(mask)
+            # all new variables are added to the dataset at once
+            data_GWPs = {}
+            for entity in entities:
+                for GWP in GWPs_to_add:
+                    data_GWP = (
+                        data_source[f"{entity} ({source_GWP})"]
+                        * GWP_factors[f"{source_GWP}_to_{GWP}"][entity]
+                    )
+                    data_GWP.attrs["entity"] = entity
+                    data_GWP.attrs["gwp_context"] = GWP
+                    variable = f"{entity} ({GWP})"
+                    if (
+                        "sel" in processing_info_country["basket_copy"]
+                        and entity in data_country.data_vars
+                    ):
+                        data_GWP = data_country[variable].pr.merge(data_GWP)
+                    data_GWPs[variable] = data_GWP
+            data_country = data_country.assign(data_GWPs)
+            record_step("basket_copy")
 
         # aggregate gases if desired
         if "aggregate_gases" in processing_info_country:
             data_country = data_country.pr.add_aggregates_variables(
                 gas_baskets=processing_info_country["aggregate_gases"],
             )
+            record_step("aggregate_gases")
 
     # 3: map categories
     if category_conversion is not None:
@@ -394,6 +447,7 @@ def process_data_for_country(  # noqa PLR0913, PLR0912, PLR0915
             debug=False,
             tolerance=tolerance,
         )
+        record_step("convert_categories")
     else:
         cat_terminology_out = cat_terminology_in
 
@@ -408,12 +462,14 @@ def process_data_for_country(  # noqa PLR0913, PLR0912, PLR0915
             if cat in sectors_out
         ]
         data_country = data_country.pr.loc[{"category": cats_to_keep}]
+        record_step("sectors_out")
 
     # create gas baskets
     if gas_baskets:
         data_country = data_country.pr.add_aggregates_variables(
             gas_baskets=gas_baskets, skipna=True, min_count=1, tolerance=tolerance
         )
+        record_step("gas_baskets")
 
     # amend title and comment
     if "comment" in data_country.attrs.keys():
@@ -430,6 +486,569 @@ def process_data_for_country(  # noqa PLR0913, PLR0912, PLR0915
     return data_country
 
 
+class ProcessingProfiler:
+    """
+    Record run time, memory use and dataset size of processing steps
+
+    Opt-in instrumentation for `process_data_for_country`. If a profiler is passed,
+    each processing step (and each case of steps with several cases like
+    "remove_ts") is recorded when it's done. The record of a step contains
+
+    * "wall_time": run time of the step in seconds
+    * "peak_memory": peak of the memory allocated during the step on top of the
+      memory in use at its start in bytes. It's measured with `tracemalloc`, which
+      traces the allocations of python objects and numpy arrays, so the run time
+      of the steps is longer than without the profiler.
+    * "size_before" and "size_after": size of the dataset before and after the step
+      in bytes
+    * "variables_before" and "variables_after": number of data variables before and
+      after the step
+    * "error": `None` for steps which are done. If the processing fails inside the
+      profiler context, a record with step "failed" and the error is added.
+
+    The profiler is a context manager which writes the report as JSON and CSV file
+    when it's closed::
+
+        with ProcessingProfiler("ALB") as profiler:
+            data_processed = process_data_for_country(..., profiler=profiler)
+
+    Parameters
+    ----------
+    name: str
+        Name of the report, e.g. the country code
+    folder: Path | None = None
+        Folder to write the report to. Default is ``log_path / "processing_profiles"``
+    """
+
+    def __init__(self, name: str, folder: Path | None = None):
+        self.name = name
+        if folder is None:
+            folder = log_path / "processing_profiles"
+        self.folder = Path(folder)
+        self.records = []
+        # only stop tracing when closing if it has been started here
+        self._stop_tracing = not tracemalloc.is_tracing()
+        if self._stop_tracing:
+            tracemalloc.start()
+        self.start()
+
+    def __enter__(self) -> ProcessingProfiler:
+        """Return the profiler"""
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        """Write the report, also if the processing failed"""
+        if exc_value is not None:
+            self.record_error(exc_value)
+        if self._stop_tracing and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self.write_report()
+
+    def start(self, data: xr.Dataset | None = None) -> None:
+        """
+        Start measuring the next step
+
+        Parameters
+        ----------
+        data: xr.Dataset | None = None
+            Dataset before the step
+        """
+        if data is None:
+            self._size = None
+            self._variables = None
+        else:
+            self._size = data.nbytes
+            self._variables = len(data.data_vars)
+        # the peak is measured per step
+        tracemalloc.reset_peak()
+        self._memory, _ = tracemalloc.get_traced_memory()
+        self._start_time = time.perf_counter()
+
+    def record(self, step: str, data: xr.Dataset, case: str | None = None) -> None:
+        """
+        Record a step which is done and start measuring the next step
+
+        Parameters
+        ----------
+        step: str
+            Name of the step
+        data: xr.Dataset
+            Dataset after the step
+        case: str | None = None
+            Case of the step, e.g. the key of the case in the "remove_ts" field of
+            the processing info
+        """
+        wall_time = time.perf_counter() - self._start_time
+        _, peak_memory = tracemalloc.get_traced_memory()
+        self.records.append(
+            {
+                "step": step,
+                "case": case,
+                "wall_time": wall_time,
+                "peak_memory": peak_memory - self._memory,
+                "size_before": self._size,
+                "size_after": data.nbytes,
+                "variables_before": self._variables,
+                "variables_after": len(data.data_vars),
+                "error": None,
+            }
+        )
+        self.start(data)
+
+    def record_error(self, error: BaseException) -> None:
+        """
+        Record that the processing failed in the current step
+
+        Parameters
+        ----------
+        error: BaseException
+            The error raised by the step
+        """
+        wall_time = time.perf_counter() - self._start_time
+        _, peak_memory = tracemalloc.get_traced_memory()
+        self.records.append(
+            {
+                "step": "failed",
+                "case": None,
+                "wall_time": wall_time,
+                "peak_memory": peak_memory - self._memory,
+                "size_before": self._size,
+                "size_after": None,
+                "variables_before": self._variables,
+                "variables_after": None,
+                "error": f"{type(error).__name__}: {error}",
+            }
+        )
+
+    def write_report(self) -> Path | None:
+        """
+        Write the recorded steps to ``<folder>/<name>.json`` and ``<folder>/<name>.csv``
+
+        Returns
+        -------
+            Path of the JSON file or None if no steps were recorded
+        """
+        if not self.records:
+            return None
+        self.folder.mkdir(parents=True, exist_ok=True)
+        report_file = self.folder / f"{self.name}.json"
+        report = {
+            "name": self.name,
+            "date": date.today().isoformat(),
+            "wall_time": sum(record["wall_time"] for record in self.records),
+            "steps": self.records,
+        }
+        with open(report_file, "w") as file:
+            json.dump(report, file, indent=4)
+        pd.DataFrame(self.records).to_csv(report_file.with_suffix(".csv"), index=False)
+        print(f"Processing profile written to {report_file}")
+        return report_file
+
+
+def subtract_categories_batched(  # noqa: PLR0912
+    data_country: xr.Dataset,
+    subtract_cats: dict[str, dict],
+    tolerance: float = 0.01,
+) -> xr.Dataset:
+    """
+    Generate categories by subtracting categories from a parent category
+
+    Batched version of the "subtract_cats" step of `process_data_for_country`.
+    Categories which don't use categories generated in the same batch are computed
+    together and merged into the dataset at once. Categories using generated
+    categories are computed in a later batch, so the result is the same as when
+    generating the categories one after another.
+
+    Parameters
+    ----------
+    data_country: xr.Dataset
+        data to generate the categories for
+    subtract_cats: dict[str, dict]
+        Categories to generate in the format of the "subtract_cats" field of the
+        processing info: the category to generate is the key and the value is a
+        dict with the "parent" category, the list of categories to "subtract" and
+        optionally the "entities" to use and the "orig_cat_name"
+    tolerance: float = 0.01
+        Tolerance for merging the generated data with existing data
+
+    Returns
+    -------
+    xr.Dataset: dataset with the generated categories
+
+    """
+    cat_dim = data_country.attrs["cat"]
+    cat_name_present = "orig_cat_name" in data_country.coords
+
+    # split the categories in batches
+    batches = [[]]
+    for cat_to_generate, subtract_info in subtract_cats.items():
+        cats_used = [subtract_info["parent"], *subtract_info["subtract"]]
+        if any(cat in batches[-1] for cat in cats_used):
+            batches.append([])
+        batches[-1].append(cat_to_generate)
+
+    for batch in batches:
+        # categories using the same entities are computed together
+        cats_for_entities = {}
+        for cat_to_generate in batch:
+            if "entities" in subtract_cats[cat_to_generate]:
+                entities = subtract_cats[cat_to_generate]["entities"]
+            else:
+                entities = list(data_country.data_vars)
+            cats_for_entities.setdefault(tuple(entities), []).append(cat_to_generate)
+
+        data_agg_batch = []
+        cats_generated = []
+        for entities, cats in cats_for_entities.items():
+            if not entities:
+                continue
+            data_entities = data_country[list(entities)]
+            if cat_name_present:
+                data_entities = data_entities.drop_vars("orig_cat_name")
+
+            # select all parent categories and all categories to subtract at once and
+            # label them with the category to generate
+            data_parent = data_entities.pr.loc[
+                {"category": [subtract_cats[cat]["parent"] for cat in cats]}
+            ].assign_coords({cat_dim: cats})
+            cats_to_subtract = []
+            cats_subtract_from = []
+            for cat in cats:
+                for cat_to_subtract in subtract_cats[cat]["subtract"]:
+                    cats_to_subtract.append(cat_to_subtract)
+                    cats_subtract_from.append(cat)
+            data_sub = data_entities.pr.loc[{"category": cats_to_subtract}]
+            data_sub = data_sub.assign_coords({cat_dim: cats_subtract_from})
+            if cats_to_subtract:
+                data_sub = data_sub.groupby(cat_dim).sum(skipna=True, min_count=1)
+            data_sub = data_sub.reindex({cat_dim: cats})
+            data_agg = data_parent - data_sub
+            if cat_name_present:
+                data_agg = data_agg.assign_coords(
+                    orig_cat_name=(
+                        cat_dim,
+                        [subtract_cats[cat]["orig_cat_name"] for cat in cats],
+                    )
+                )
+            data_agg_batch.append(data_agg)
+            cats_generated = cats_generated + cats
+
+        for cat_to_generate in batch:
+            if cat_to_generate in cats_generated:
+                print(f"Generating {cat_to_generate} through subtraction")
+            else:
+                print(f"no data to generate category {cat_to_generate}")
+        if data_agg_batch:
+            data_agg_batch = xr.merge(
+                data_agg_batch, compat="no_conflicts", join="outer"
+            ).reindex({cat_dim: [cat for cat in batch if cat in cats_generated]})
+            data_country = data_country.pr.merge(data_agg_batch, tolerance=tolerance)
+
+    return data_country
+
+
+def get_selection_mask(
+    ds: xr.Dataset,
+    selection: dict,
+) -> xr.DataArray:
+    """
+    Get a boolean mask for the data selected by ``ds.pr.loc[selection]``
+
+    The mask can be used to change the selected data for all data variables in one
+    operation, e.g. ``ds.where(~mask)`` sets the selected data to NaN. It only has
+    the dimensions which are restricted by the selection.
+
+    Parameters
+    ----------
+    ds: xr.Dataset
+        Dataset to select data from
+    selection: dict
+        Selection in the format taken by PRIMAP2's ds.pr.loc[] functionality
+
+    Returns
+    -------
+        xr.DataArray with `True` for the selected data
+
+    """
+    # select on the coordinates only, so the selection is checked and translated
+    # by primap2 but no data is copied
+    selected = xr.Dataset(coords=ds.coords, attrs=ds.attrs).pr.loc[selection]
+    mask = xr.DataArray(True)
+    for dim in ds.dims:
+        if dim not in ds.indexes:
+            continue
+        selected_values = np.atleast_1d(selected.coords[dim].to_numpy())
+        mask_dim = ds.indexes[dim].isin(selected_values)
+        if not mask_dim.all():
+            mask = mask & xr.DataArray(
+                mask_dim, dims=[dim], coords={dim: ds.indexes[dim]}
+            )
+    return mask
+
+
+def get_aggregation_rule(
+    value: str,
+    rule: list[str] | dict,
+    tolerance: float = 0.01,
+) -> dict:
+    """
+    Bring an aggregation rule into a common format
+
+    The formats of the aggregation rules are described in
+    `add_aggregates_coordinates_planned`.
+
+    Parameters
+    ----------
+    value: str
+        The value the rule aggregates to
+    rule: list[str] | dict
+        The list of source values or the rule dict
+    tolerance: float = 0.01
+        Tolerance to use if the rule doesn't define one
+
+    Returns
+    -------
+    dict with the "sources", "sel", "tolerance" and the additional coordinates
+    ("add_coords")
+
+    """
+    if isinstance(rule, list):
+        return {"sources": rule, "sel": {}, "tolerance": tolerance, "add_coords": {}}
+    if isinstance(rule, dict):
+        rule = deepcopy(rule)
+        return {
+            "sources": rule.pop("sources"),
+            "sel": rule.pop("sel", {}),
+            "tolerance": rule.pop("tolerance", tolerance),
+            "add_coords": rule,
+        }
+    raise ValueError(f"Unrecognized aggregation definition for {value!r}")  # noqa: TRY003
+
+
+def plan_aggregation(
+    agg_rules: dict[str, list[str] | dict],
+) -> list[list[str]]:
+    """
+    Sort the aggregation rules for one coordinate into levels
+
+    PRIMAP2's ``add_aggregates_coordinates`` applies the rules one after another in
+    the order of the dict, so a rule uses the results of the rules before it, but
+    not the results of rules after it. The rules are sorted into levels such that
+    all rules of a level only use results from earlier levels and a rule is never
+    in an earlier level than a rule before it which uses its result. Computing the
+    levels one after another gives the same result as applying the rules one after
+    another.
+
+    Parameters
+    ----------
+    agg_rules: dict[str, list[str] | dict]
+        aggregation rules for one coordinate in the format used by
+        ``add_aggregates_coordinates``
+
+    Returns
+    -------
+    list of levels, each a list of the values to aggregate in the order of the
+    rules
+
+    """
+    sources = {
+        value: get_aggregation_rule(value, rule)["sources"]
+        for value, rule in agg_rules.items()
+    }
+    levels = {}
+    for value in agg_rules:
+        level = 0
+        for value_before, level_before in levels.items():
+            if value_before in sources[value]:
+                level = max(level, level_before + 1)
+            elif value in sources[value_before]:
+                level = max(level, level_before)
+        levels[value] = level
+
+    plan = [[] for _ in range(max(levels.values(), default=-1) + 1)]
+    for value, level in levels.items():
+        plan[level].append(value)
+    return plan
+
+
+def add_aggregates_coordinates_planned(  # noqa: PLR0912
+    ds: xr.Dataset,
+    agg_info: dict[str, dict[str, list[str] | dict]],
+    tolerance: float = 0.01,
+    skipna: bool = True,
+    min_count: int = 1,
+) -> xr.Dataset:
+    """
+    Aggregate data for coordinates level by level
+
+    Gives the same result as PRIMAP2's ``ds.pr.add_aggregates_coordinates``, but
+    instead of computing each aggregate for each data variable and merging it into
+    the dataset, the rules are sorted into levels using `plan_aggregation`. All
+    aggregates of a level which use the same selection are computed for all data
+    variables in one grouped sum and merged into the dataset at once. Aggregates of
+    later levels use the merged data, so intermediate sums are only computed once.
+
+    If ``skipna`` is ``False`` or ``min_count`` is below one, the result depends on
+    the source values present for each variable, so PRIMAP2's function is used.
+
+    Parameters
+    ----------
+    ds: xr.Dataset
+        data to aggregate
+    agg_info: dict[str, dict[str, list[str] | dict]]
+        aggregation rules in the format used by ``add_aggregates_coordinates``::
+
+            agg_info = {
+                <coord1>: {
+                    <new_value>: {
+                        'sources': [source_values],
+                        <add_coord_name>: <value for additional coordinate> (optional),
+                        'tolerance': <non-default tolerance> (optional),
+                        'sel': <filter in pr.loc style> (optional),
+                    },
+                },
+                <coord2>: { # simplified format for coord2
+                    <new_value>: [source_values]
+                    ...
+                },
+                ...
+            }
+
+    tolerance: float = 0.01
+        Tolerance for merging aggregates with existing data
+    skipna: bool = True
+        Skip missing values when summing
+    min_count: int = 1
+        Minimal number of non-NaN values for a non-NaN sum
+
+    Returns
+    -------
+    xr.Dataset: dataset with the aggregated data
+
+    """
+    if not skipna or min_count < 1:
+        return ds.pr.add_aggregates_coordinates(
+            agg_info=agg_info, tolerance=tolerance, skipna=skipna, min_count=min_count
+        )
+
+    # as in PRIMAP2 work without units for speed. Units don't change in aggregation
+    ds_out = ds.pr.dequantify()
+
+    for coordinate, agg_rules in agg_info.items():
+        coord_dim = ds_out.pr.dim_alias_translations.get(coordinate, coordinate)
+        rules = {
+            value: get_aggregation_rule(value, rule, tolerance)
+            for value, rule in agg_rules.items()
+        }
+        for level in plan_aggregation(agg_rules):
+            values_present = set(ds_out.indexes[coord_dim])
+            # aggregates for the same variables with the same selection, tolerance
+            # and additional coordinates are computed and merged together
+            groups = {}
+            for value in level:
+                rule = rules[value]
+                sel = deepcopy(rule["sel"])
+                variables = [
+                    var
+                    for var in ds_out.data_vars
+                    if ("variable" not in sel or var in sel["variable"])
+                    and (
+                        "entity" not in sel
+                        or ds_out[var].attrs["entity"] in sel["entity"]
+                    )
+                ]
+                sel.pop("variable", None)
+                sel.pop("entity", None)
+                sources_present = [
+                    source for source in rule["sources"] if source in values_present
+                ]
+                if not variables or not sources_present:
+                    continue
+                group_key = (
+                    tuple(variables),
+                    repr(sel),
+                    rule["tolerance"],
+                    tuple(rule["add_coords"]),
+                )
+                groups.setdefault(group_key, (sel, []))[1].append(
+                    (value, sources_present)
+                )
+
+            # all groups are computed from the data at the start of the level and
+            # merged afterwards, as the rules of a level must not see each other's
+            # results
+            data_agg_level = []
+            for (variables, _, rule_tolerance, add_coords), (
+                sel,
+                values,
+            ) in groups.items():
+                sources_flat = []
+                values_flat = []
+                for value, sources_present in values:
+                    sources_flat = sources_flat + sources_present
+                    values_flat = values_flat + [value] * len(sources_present)
+                data_sources = ds_out[list(variables)].pr.loc[
+                    {**sel, coordinate: sources_flat}
+                ]
+                data_sources = data_sources.drop_vars(
+                    [
+                        coord
+                        for coord in data_sources.coords
+                        if coord != coord_dim and coord_dim in data_sources[coord].dims
+                    ]
+                )
+                data_agg = (
+                    data_sources.assign_coords({coord_dim: values_flat})
+                    .groupby(coord_dim)
+                    .sum(skipna=skipna, min_count=min_count, keep_attrs=True)
+                )
+
+                # aggregates which are NaN for all variables are not added
+                other_dims = [dim for dim in data_agg.dims if dim != coord_dim]
+                has_data = (
+                    data_agg.notnull().any(dim=other_dims).to_array().any("variable")  # noqa: PD004
+                )
+                values_agg = [
+                    value for value, _ in values if has_data.loc[value].item()
+                ]
+                if not values_agg:
+                    continue
+                data_agg = data_agg.reindex({coord_dim: values_agg})
+                for add_coord in add_coords:
+                    if add_coord not in ds_out.coords:
+                        raise ValueError(  # noqa: TRY003
+                            f"Additional coordinate {add_coord!r} specified but not "
+                            f"present in data"
+                        )
+                    data_agg = data_agg.assign_coords(
+                        {
+                            add_coord: (
+                                coord_dim,
+                                [
+                                    rules[value]["add_coords"][add_coord]
+                                    for value in values_agg
+                                ],
+                            )
+                        }
+                    )
+                data_agg_level.append((data_agg, rule_tolerance))
+            for data_agg, rule_tolerance in data_agg_level:
+                ds_out = ds_out.pr.merge(data_agg, tolerance=rule_tolerance)
+
+    ds_out = ds_out.pr.quantify()
+    # PRIMAP2 merges the data variables into the dataset one by one, which adds
+    # their attrs to the dataset attrs unless they conflict with the attrs present.
+    # Do the same, so the attrs are the same as well
+    for var in ds_out.data_vars:
+        for key, value in ds_out[var].attrs.items():
+            if key not in ds_out.attrs:
+                ds_out.attrs[key] = value
+            elif ds_out.attrs[key] != value:
+                ds_out.attrs.pop(key)
+
+    return ds_out
+
+
 def convert_categories(
     ds_input: xr.Dataset,
     conversion: dict[str, dict[str, str]],
@@ -474,7 +1093,8 @@ def convert_categories(
         agg_info = {
             "category": conversion["aggregate"],
         }
-        ds_converted = ds_converted.pr.add_aggregates_coordinates(
+        ds_converted = add_aggregates_coordinates_planned(
+            ds_converted,
             agg_info=agg_info,
             tolerance=tolerance,
             skipna=True,
@@ -483,6 +1103,7 @@ def convert_categories(
     return ds_converted
 
 
+@functools.lru_cache(maxsize=1024)
 def get_country_name(
     country_code: str,
 ) -> str:
@@ -501,6 +1122,46 @@ def get_country_name(
     return country_name
 
 
+def normalize_country_name(country_name: str) -> str:
+    """
+    Normalize a country or folder name for the lookup in the country name index
+
+    Underscores are replaced by spaces, whitespace is collapsed and the name is
+    case folded, e.g. "Republic_of_Korea" becomes "republic of korea".
+    """
+    return " ".join(country_name.replace("_", " ").split()).casefold()
+
+
+@functools.lru_cache(maxsize=1)
+def get_country_name_index() -> dict[str, str]:
+    """
+    Get the index of normalized country names to three letter codes
+
+    The index contains the folder names from `custom_folders`, the names, common
+    names and official names of all countries in pycountry and the names from
+    `custom_country_mapping`. If a name is used several times the first one in this
+    order is used. The index is created on the first call.
+
+    Returns
+    -------
+        dict with normalized names (see `normalize_country_name`) as keys and three
+        letter codes as values
+
+    """
+    name_index = {}
+    for folder_name, country_code in custom_folders.items():
+        name_index.setdefault(normalize_country_name(folder_name), country_code)
+    for name_field in ["name", "common_name", "official_name"]:
+        for country in pycountry.countries:
+            name = getattr(country, name_field, None)
+            if name is not None:
+                name_index.setdefault(normalize_country_name(name), country.alpha_3)
+    for country_code, name in custom_country_mapping.items():
+        name_index.setdefault(normalize_country_name(name), country_code)
+    return name_index
+
+
+@functools.lru_cache(maxsize=1024)
 def get_country_code(
     country_name: str,
 ) -> str:
@@ -508,7 +1169,9 @@ def get_country_code(
     Obtain country code.
 
     If the input is a code it will be returned,
-    if the input is not a three letter code a search will be performed
+    if the input is not a three letter code the name is looked up in the country
+    name index (see `get_country_name_index`). Only if the name is not in the index
+    a fuzzy search will be performed. Results are cached.
 
     Parameters
     ----------
@@ -522,39 +1185,36 @@ def get_country_code(
     """
     # First check if it's in the list of custom codes
     if country_name in custom_country_mapping:
-        country_code = country_name
-    else:
-        try:
-            # check if it's a 3 letter code
-            country = pycountry.countries.get(alpha_3=country_name)
-            country_code = country.alpha_3
-        except Exception as ex:
-            try:
-                country = pycountry.countries.search_fuzzy(
-                    country_name.replace("_", " ")
-                )
-            except Exception as ex_inner:
-                raise ValueError(  # noqa: TRY003
-                    f"Country name {country_name} can not be mapped to "
-                    f"any country code. Try using the ISO3 code directly."
-                ) from ex_inner
-            if len(country) > 1:
-                country_code = None
-                for current_country in country:
-                    if current_country.name == country_name:
-                        country_code = current_country.alpha_3
-                if country_code is None:
-                    raise ValueError(  # noqa: TRY003
-                        f"Country name {country_name} has {len(country)} "
-                        f"possible results for country codes."
-                    ) from ex
+        return country_name
 
-            country_code = country[0].alpha_3
+    # check if it's a 3 letter code
+    country = pycountry.countries.get(alpha_3=country_name)
+    if country is not None:
+        return country.alpha_3
 
-    return country_code
+    # check if it's a known name
+    country_code = get_country_name_index().get(normalize_country_name(country_name))
+    if country_code is not None:
+        return country_code
+
+    try:
+        country = pycountry.countries.search_fuzzy(country_name.replace("_", " "))
+    except Exception as ex:
+        raise ValueError(  # noqa: TRY003
+            f"Country name {country_name} can not be mapped to "
+            f"any country code. Try using the ISO3 code directly."
+        ) from ex
+    # exact matches are in the name index, so several results are ambiguous
+    if len(country) > 1:
+        raise ValueError(  # noqa: TRY003
+            f"Country name {country_name} has {len(country)} "
+            f"possible results for country codes."
+        )
+
+    return country[0].alpha_3
 
 
-def create_folder_mapping(folder: str, extracted: bool = False) -> None:  # noqa: PLR0912
+def create_folder_mapping(folder: str, extracted: bool = False) -> None:
     """
     Create a mapping of iso codes to folder names
 
@@ -579,29 +1239,15 @@ def create_folder_mapping(folder: str, extracted: bool = False) -> None:  # noqa
     """
     folder = root_path / folder
     folder_mapping = {}
-    # if not extracted:
-    known_folders = custom_folders
-    # else:
-    #    known_folders = {}
 
     for item in folder.iterdir():
         if item.is_dir() and not item.match("__pycache__"):
-            if item.name in known_folders:
-                ISO3 = known_folders[item.name]
-            else:
-                try:
-                    country = pycountry.countries.search_fuzzy(
-                        item.name.replace("_", " ")
-                    )
-                    if len(country) > 1:
-                        ISO3 = None
-                        for current_country in country:
-                            if current_country.name == item.name.replace("_", " "):
-                                ISO3 = current_country.alpha_3
-                    else:
-                        ISO3 = country[0].alpha_3
-                except:  # noqa: E722
-                    ISO3 = None
+            # known folders (`custom_folders`) are in the country name index used by
+            # get_country_code
+            try:
+                ISO3 = get_country_code(item.name)
+            except ValueError:
+                ISO3 = None
 
             if ISO3 is None:
                 print(f"No match for {item.name}")
@@ -614,7 +1260,104 @@ def create_folder_mapping(folder: str, extracted: bool = False) -> None:  # noqa
         json.dump(dict(sorted(folder_mapping.items())), mapping_file, indent=4)
 
 
-def get_country_submissions(  # noqa: PLR0912
+class FolderMappingIndex:
+    """
+    Process wide index of the folder mappings created by `create_folder_mapping`
+
+    Each `folder_mapping.json` file is read only once. It is read again if the
+    modification time or size of the file changed, e.g. because the mapping was
+    recreated. The folders for a country are always returned as a list, also if
+    the file contains only a single folder name for the country.
+
+    Examples
+    --------
+    >>> folder_mapping_index.get_folders(downloaded_data_path_UNFCCC, "ARG")
+    ['Argentina']
+    """
+
+    def __init__(self) -> None:
+        # mapping file -> ((mtime, size), mapping)
+        self._mappings = {}
+
+    def get_mapping(self, folder: Path) -> dict[str, list[str]]:
+        """
+        Get the folder mapping of a folder
+
+        Parameters
+        ----------
+        folder
+            folder containing the `folder_mapping.json` file
+
+        Returns
+        -------
+            dict with the ISO3 codes as keys and lists of folder names as values.
+            The dict is shared and must not be changed.
+        """
+        mapping_file = Path(folder) / "folder_mapping.json"
+        stat = mapping_file.stat()
+        file_state = (stat.st_mtime_ns, stat.st_size)
+        cached = self._mappings.get(mapping_file)
+        if cached is None or cached[0] != file_state:
+            with open(mapping_file) as file:
+                folder_mapping = json.load(file)
+            # two concurrent reads of the same file give the same result, so no
+            # locking is needed
+            cached = (
+                file_state,
+                {
+                    country_code: self.normalize_folders(folders)
+                    for country_code, folders in folder_mapping.items()
+                },
+            )
+            self._mappings[mapping_file] = cached
+        return cached[1]
+
+    def get_folders(self, folder: Path, country_code: str) -> list[str]:
+        """
+        Get the folders of a country
+
+        Parameters
+        ----------
+        folder
+            folder containing the `folder_mapping.json` file
+        country_code
+            ISO3 code of the country
+
+        Returns
+        -------
+            list of folder names (relative to `folder`). Empty if the country is
+            not in the mapping
+        """
+        return list(self.get_mapping(folder).get(country_code, []))
+
+    def clear(self) -> None:
+        """Remove all mappings from the index"""
+        self._mappings = {}
+
+    @staticmethod
+    def normalize_folders(folders: str | list) -> list[str]:
+        """
+        Convert the folders of a country from the mapping file to a flat list
+
+        `create_folder_mapping` stores a single folder as a string and nests the
+        lists if there are more than two folders for a country.
+        """
+        if isinstance(folders, str):
+            return [folders]
+        if not isinstance(folders, list):
+            raise TypeError(  # noqa: TRY003
+                "Wrong data type in folder mapping json file. Should be str or list."
+            )
+        folders_flat = []
+        for item in folders:
+            folders_flat = folders_flat + FolderMappingIndex.normalize_folders(item)
+        return folders_flat
+
+
+folder_mapping_index = FolderMappingIndex()
+
+
+def get_country_submissions(
     country_name: str,
     print_sub: bool = True,
 ) -> dict[str, list[str]]:
@@ -657,14 +1400,8 @@ def get_country_submissions(  # noqa: PLR0912
                 print("-" * 80)
                 print(f"Data folder {item.name}")
                 print("-" * 80)
-            with open(item / "folder_mapping.json") as mapping_file:
-                folder_mapping = json.load(mapping_file)
-            if country_code in folder_mapping:
-                country_folders = folder_mapping[country_code]
-                if isinstance(country_folders, str):
-                    # only one folder
-                    country_folders = [country_folders]
-
+            country_folders = folder_mapping_index.get_folders(item, country_code)
+            if country_folders:
                 submission_folders = []
                 for country_folder in country_folders:
                     current_folder = item / country_folder
@@ -789,23 +1526,12 @@ def gather_datasets(  # noqa: PLR0912, PLR0915
                 print("-" * 80)
                 print(f"Data folder {item.name}")
                 print("-" * 80)
-            with open(item / "folder_mapping.json") as mapping_file:
-                folder_mapping = json.load(mapping_file)
-            if country_code not in folder_mapping:
+            country_folders = folder_mapping_index.get_folders(item, country_code)
+            if not country_folders:
                 if print_ds:
                     print("No data available")
                     print("")
             else:
-                country_folders = folder_mapping[country_code]
-                if not isinstance(country_folders, str):
-                    if not isinstance(country_folders, list):
-                        raise TypeError(  # noqa: TRY003
-                            "Wrong data type in folder mapping json file. "
-                            "Should be str."
-                        )
-                else:
-                    country_folders = [country_folders]
-
                 datasets_current_folder = {}
 
                 for folder in country_folders:
@@ -913,15 +1639,14 @@ def get_code_file(
     if print_info:
         print(f"Country name {country_name} maps to ISO code {country_code}")
 
-    with open(UNFCCC_reader_path / "folder_mapping.json") as mapping_file:
-        folder_mapping = json.load(mapping_file)
+    country_folders = folder_mapping_index.get_folders(UNFCCC_reader_path, country_code)
 
-    if country_code not in folder_mapping:
+    if not country_folders:
         if print_info:
             print("No code available")
             print("")
     else:
-        country_folder = UNFCCC_reader_path / folder_mapping[country_code]
+        country_folder = UNFCCC_reader_path / country_folders[0]
         code_file_name_candidate = "read_" + country_code + "_" + submission + "*"
 
         for file in country_folder.iterdir():
@@ -1321,6 +2046,433 @@ def set_to_nan_in_ds(
     return ds_in.where(ds_mask)
 
 
+class DatasetCombiner:
+    """
+    Combine many datasets with `combine_first` semantics
+
+    Combining datasets one by one into a growing dataset
+    (``ds_all = ds_all.combine_first(ds_new)``) aligns and copies the full result
+    for every added dataset, so the run time grows quadratically with the number
+    of datasets and every step holds several aligned copies of the result in
+    memory. The combiner collects the datasets instead and assembles the result
+    once: the coordinates of the result are computed first, the result arrays are
+    allocated once and the values of every dataset are written into them. Apart
+    from the added datasets only the result and temporary arrays of the size of a
+    single added variable are kept in memory.
+
+    The result is identical to combining the datasets one by one in the order they
+    were added, i.e. values from datasets added earlier take precedence.
+
+    Examples
+    --------
+    >>> combiner = DatasetCombiner()
+    >>> for ds in datasets:
+    ...     combiner.add(ds)
+    >>> ds_all = combiner.result()
+    """
+
+    def __init__(self) -> None:
+        # the datasets in the order they were added
+        self._datasets = []
+        # number of datasets added (a result taken in between replaces the
+        # datasets it was combined from)
+        self._n_datasets = 0
+
+    def __len__(self) -> int:
+        """Return the number of datasets added"""
+        return self._n_datasets
+
+    def add(self, ds: xr.Dataset | None) -> None:
+        """
+        Add a dataset to the combination
+
+        Parameters
+        ----------
+        ds
+            The dataset to add. `None` is ignored, so results of functions which
+            return `None` for missing data can be added directly.
+        """
+        if ds is None:
+            return
+        self._datasets.append(ds)
+        self._n_datasets = self._n_datasets + 1
+
+    def result(self) -> xr.Dataset | None:
+        """
+        Get the combined dataset
+
+        Returns
+        -------
+            The combined dataset or `None` if no datasets have been added
+        """
+        if not self._datasets:
+            return None
+        if len(self._datasets) > 1:
+            # the result replaces the datasets, so they can be freed
+            self._datasets = [assemble_combined_dataset(self._datasets)]
+        return self._datasets[0]
+
+
+def assemble_combined_dataset(datasets: list[xr.Dataset]) -> xr.Dataset:  # noqa: PLR0912
+    """
+    Assemble the result of combining datasets with `combine_first` in one step
+
+    The result is identical to
+    ``datasets[0].combine_first(datasets[1]).combine_first(datasets[2])...``
+    but the result arrays are allocated and filled only once. Variables
+    (data variables and non-index coordinates) are filled with the values of the
+    first dataset which has a non-NaN value for the position. pint quantities are
+    converted to the units of the first dataset containing the variable.
+    Non-index coordinates are filled like data variables (`combine_first` only
+    keeps the values of one of the datasets for them).
+
+    Parameters
+    ----------
+    datasets
+        datasets to combine. Values from datasets earlier in the list take
+        precedence.
+
+    Returns
+    -------
+        The combined dataset
+    """
+    # indexes of the result: the union of the indexes in the same order
+    # as the outer joins of sequential combine_first calls
+    indexes = {}
+    for ds in datasets:
+        for dim, index in ds.indexes.items():
+            if dim not in indexes:
+                indexes[dim] = index
+            elif not indexes[dim].equals(index):
+                indexes[dim] = indexes[dim].union(index)
+    dim_sizes = {}
+    for ds in datasets:
+        for dim, size in ds.sizes.items():
+            dim_sizes.setdefault(dim, size)
+    dim_sizes.update({dim: len(index) for dim, index in indexes.items()})
+
+    # dims, attrs and units of the variables from their first occurrence
+    coord_names = {}
+    var_info = {}
+    for ds in datasets:
+        for name in [*ds.coords, *ds.data_vars]:
+            if name in indexes or name in var_info:
+                continue
+            if name in ds.coords:
+                coord_names[name] = None
+            variable = ds.variables[name]
+            units = getattr(variable.data, "units", None)
+            var_info[name] = (variable.dims, variable.attrs, units, variable.data)
+
+    variables = {}
+    for name, (dims, attrs, units, first_data) in var_info.items():
+        values_all = []
+        for ds in datasets:
+            if name not in ds.variables:
+                continue
+            variable = ds.variables[name]
+            # broadcast variables without some of the dims (as the alignment does)
+            variable = variable.set_dims(
+                {dim: ds.sizes.get(dim, dim_sizes[dim]) for dim in dims}
+            ).transpose(*dims)
+            values = variable.data
+            if units is not None:
+                values = values.to(units).magnitude
+            values_all.append((ds, np.asarray(values)))
+
+        dtype = np.result_type(*[values.dtype for _, values in values_all])
+        if dtype.kind in "iu":
+            dtype = np.dtype(float)
+        elif dtype.kind not in "fcmM":
+            dtype = np.dtype(object)
+        result = np.full(
+            [dim_sizes[dim] for dim in dims],
+            np.datetime64("NaT") if dtype.kind in "mM" else np.nan,
+            dtype=dtype,
+        )
+        for ds, values in values_all:
+            # positions of the dataset in the result
+            if dims:
+                region = np.ix_(
+                    *[
+                        indexes[dim].get_indexer(ds.indexes[dim])
+                        if dim in indexes and dim in ds.indexes
+                        else np.arange(dim_sizes[dim])
+                        for dim in dims
+                    ]
+                )
+            else:
+                region = ...
+            result_region = result[region]
+            missing = pd.isna(result_region)
+            result_region[missing] = values[missing]
+            result[region] = result_region
+
+        if units is not None:
+            result = first_data._REGISTRY.Quantity(result, units)
+        variables[name] = xr.Variable(dims, result, attrs)
+
+    # dtype of the index coordinates as in the outer join and attrs from their
+    # first occurrence
+    index_coords = {}
+    for dim, index in indexes.items():
+        coords_dim = [ds[dim] for ds in datasets if dim in ds.indexes]
+        dtype = np.result_type(*[coord.dtype for coord in coords_dim])
+        index_coords[dim] = xr.Variable(
+            dim, index.to_numpy().astype(dtype), coords_dim[0].attrs
+        )
+
+    return xr.Dataset(
+        {name: var for name, var in variables.items() if name not in coord_names},
+        coords={
+            **index_coords,
+            **{name: variables[name] for name in coord_names},
+        },
+        attrs=datasets[0].attrs.copy(),
+    )
+
+
+def combine_datasets(datasets: Iterable[xr.Dataset | None]) -> xr.Dataset | None:
+    """
+    Combine datasets with `combine_first` semantics using a `DatasetCombiner`
+
+    Parameters
+    ----------
+    datasets
+        datasets to combine. Values from datasets earlier in the list take
+        precedence. `None` entries are ignored. If a generator is given the
+        datasets are combined while they are generated.
+
+    Returns
+    -------
+        The combined dataset or `None` if there are no datasets
+    """
+    combiner = DatasetCombiner()
+    for ds in datasets:
+        combiner.add(ds)
+    return combiner.result()
+
+
+def concat_area_datasets(datasets: list[xr.Dataset]) -> xr.Dataset:
+    """
+    Combine datasets for different areas (e.g. countries) along the area dimension
+
+    For datasets which don't overlap in the area dimension the result is the same as
+    for `combine_datasets`. As the datasets are only concatenated and not merged
+    value by value, lazily opened (dask backed) datasets stay lazy and can be
+    written with `write_netcdf_streaming` and `write_interchange_format_streaming`
+    without loading all data into memory.
+
+    Parameters
+    ----------
+    datasets
+        primap2 datasets. Each area may only be present in one of the datasets
+
+    Returns
+    -------
+        The combined dataset sorted by area
+    """
+    area_dim = datasets[0].attrs["area"]
+    areas = [area for ds in datasets for area in ds[area_dim].to_numpy()]
+    if len(areas) != len(set(areas)):
+        raise ValueError(  # noqa: TRY003
+            f"Datasets overlap in the area dimension {area_dim}. Use combine_datasets "
+            f"instead"
+        )
+    # the attrs are taken from the first dataset as in `combine_datasets` and not
+    # from the dataset which comes first after sorting
+    attrs = datasets[0].attrs.copy()
+    datasets = sorted(datasets, key=lambda ds: min(ds[area_dim].values))
+    ds_combined = xr.concat(
+        datasets,
+        dim=area_dim,
+        join="outer",
+        data_vars="all",
+        coords="different",
+        compat="equals",
+        combine_attrs="override",
+    )
+    if not ds_combined.indexes[area_dim].is_monotonic_increasing:
+        ds_combined = ds_combined.sortby(area_dim)
+    ds_combined.attrs = attrs
+    return ds_combined
+
+
+def write_netcdf_streaming(
+    filepath: str | Path,
+    ds: xr.Dataset,
+    encoding: dict[str, dict] | None = None,
+) -> None:
+    """
+    Write a lazily loaded (dask backed) dataset to netCDF chunk by chunk
+
+    The chunks on disk are aligned with the dask chunks, so every dask chunk is
+    written (and compressed) once. The dask chunks are computed one after another
+    so only one chunk has to be in memory at a time. For datasets opened with
+    `pm2.open_dataset(file, chunks=-1)` and combined with `concat_area_datasets`
+    a chunk holds the data of one variable for one area.
+
+    Parameters
+    ----------
+    filepath
+        the netCDF file to write
+    ds
+        primap2 dataset with dask arrays
+    encoding
+        encoding per variable as for `ds.pr.to_netcdf`. The chunk sizes are added
+    """
+    if encoding is None:
+        encoding = {}
+    encoding = {var: dict(encoding.get(var, {})) for var in ds.data_vars}
+    for var in ds.data_vars:
+        if ds[var].chunks is not None:
+            encoding[var]["chunksizes"] = tuple(chunks[0] for chunks in ds[var].chunks)
+
+    with dask.config.set(scheduler="synchronous"):
+        ds.pr.to_netcdf(filepath, encoding=encoding)
+
+
+def write_interchange_format_streaming(
+    filepath: str | Path,
+    ds: xr.Dataset,
+    dim: str | None = None,
+) -> None:
+    """
+    Write a dataset in interchange format one slice at a time
+
+    `ds.pr.to_interchange_format()` builds the interchange format for the whole
+    dataset in memory. Here the dataset is converted and written for one value of
+    `dim` at a time (e.g. country by country), so for lazily loaded (dask backed)
+    datasets only one slice has to be in memory. The result is the same as
+    writing the dataset with `pm2.pm2io.write_interchange_format` as long as the
+    coordinates sorted before `dim` in the interchange format (source, scenario,
+    provenance) have only one value.
+
+    Parameters
+    ----------
+    filepath
+        path and filename stem for the dataset. If a file ending is given it will
+        be ignored and replaced by .csv for the data and .yaml for the metadata
+    ds
+        primap2 dataset to write
+    dim
+        dimension to split the dataset along. Default is the area dimension
+    """
+    if dim is None:
+        dim = ds.attrs["area"]
+    filepath = Path(filepath)
+    data_file = filepath.parent / (filepath.stem + ".csv")
+
+    for idx, value in enumerate(sorted(ds[dim].values)):
+        df_slice = ds.sel({dim: [value]}).load().pr.to_interchange_format()
+        if idx == 0:
+            # write metadata and the header together with the first slice
+            pm2.pm2io.write_interchange_format(filepath, df_slice)
+        else:
+            df_slice.sort_values(list(df_slice.columns)).to_csv(
+                data_file,
+                mode="a",
+                header=False,
+                index=False,
+                quoting=csv.QUOTE_NONNUMERIC,
+            )
+
+
+def get_dataset_hash(
+    ds: xr.Dataset,
+    exclude_coords: Iterable[Hashable] = (),
+    block_size: int = 2**22,
+) -> str:
+    """
+    Calculate a hash of the content of a dataset
+
+    The hash depends on the data, the coordinate values and the attributes of the
+    data variables (e.g. units), but not on the order of the variables, dimensions
+    and coordinate values. Data are hashed block by block along one dimension, so
+    lazily loaded (dask backed) datasets are never loaded completely and no copy of
+    the full data (e.g. in interchange format) is created.
+
+    Parameters
+    ----------
+    ds
+        primap2 dataset
+    exclude_coords
+        coordinates whose values are not part of the hash (e.g. the scenario
+        coordinate if it contains the date the data was read). The data along the
+        dimension is still part of the hash.
+    block_size
+        (maximal) number of values hashed at once
+
+    Returns
+    -------
+        hex digest of the hash (32 characters)
+    """
+    ds = ds.pr.dequantify()
+    exclude_coords = set(exclude_coords)
+    data_hash = hashlib.blake2b(digest_size=16)
+
+    def update_hash(info):
+        data_hash.update(json.dumps(info, sort_keys=True, default=str).encode())
+
+    def to_str(values):
+        # the resolution of time coordinates depends on the pandas version and
+        # backend, so it's unified before converting to strings
+        if np.issubdtype(values.dtype, np.datetime64):
+            values = values.astype("datetime64[ns]")
+        return values.astype(str)
+
+    # order of each dimension sorted by coordinate values. The order of excluded
+    # coordinates is kept
+    sort_order = {}
+    for dim, size in ds.sizes.items():
+        if dim in exclude_coords:
+            sort_order[dim] = slice(None)
+            continue
+        order = np.argsort(to_str(ds[dim].to_numpy()), kind="stable")
+        if (order == np.arange(size)).all():
+            sort_order[dim] = slice(None)
+        else:
+            sort_order[dim] = order
+
+    for name in sorted(ds.coords, key=str):
+        if name in exclude_coords:
+            continue
+        coord = ds.coords[name]
+        dims = sorted(coord.dims, key=str)
+        values = (
+            coord.transpose(*dims)
+            .isel({dim: sort_order[dim] for dim in dims})
+            .to_numpy()
+        )
+        update_hash([str(name), dims, to_str(values).tolist(), coord.attrs])
+
+    for name in sorted(ds.data_vars, key=str):
+        da = ds[name]
+        dims = sorted(da.dims, key=str)
+        da = da.transpose(*dims)
+        update_hash([str(name), dims, str(da.dtype), da.attrs])
+        if not dims:
+            update_hash(str(da.to_numpy()))
+            continue
+        block_dim = dims[0]
+        other_order = {dim: sort_order[dim] for dim in dims[1:]}
+        step = max(1, block_size * da.sizes[block_dim] // max(1, da.size))
+        block_order = np.arange(da.sizes[block_dim])[sort_order[block_dim]]
+        for start in range(0, len(block_order), step):
+            block = da.isel(
+                {block_dim: block_order[start : start + step], **other_order}
+            ).to_numpy()
+            if block.dtype == object:
+                update_hash(to_str(block).tolist())
+                continue
+            if np.issubdtype(block.dtype, np.floating):
+                # all NaN values should lead to the same bytes
+                block = np.where(np.isnan(block), np.nan, block)
+            data_hash.update(np.ascontiguousarray(block).tobytes())
+
+    return data_hash.hexdigest()
+
+
 def assert_values(
     df: pd.DataFrame,
     test_case: tuple[str | float | int],
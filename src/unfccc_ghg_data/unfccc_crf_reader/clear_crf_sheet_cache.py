@@ -0,0 +1,33 @@
+"""
+Clear the cache of parsed CRF/CRT worksheets
+
+Removes all entries from the on-disk cache used when reading CRF / CRT tables with
+`use_cache=True`. If a maximal size is given only the least recently used entries
+are removed until the cache is smaller than the given size.
+"""
+
+import argparse
+
+from unfccc_ghg_data.unfccc_crf_reader.unfccc_crf_reader_cache import (
+    clear_crf_sheet_cache,
+    crf_sheet_cache_path,
+    trim_crf_sheet_cache,
+)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--max_size",
+        help="Only trim the cache to the given size in MB",
+        type=float,
+        default=None,
+    )
+
+    args = parser.parse_args()
+    max_size = args.max_size
+
+    if max_size is None:
+        removed = clear_crf_sheet_cache()
+    else:
+        removed = trim_crf_sheet_cache(max_size=int(max_size * 1024**2))
+    print(f"Removed {removed} files from the cache in {crf_sheet_cache_path}")
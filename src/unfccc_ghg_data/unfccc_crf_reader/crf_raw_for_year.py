@@ -7,6 +7,10 @@ which have not yet been read.
 
 Data are saved in the datasets/UNFCCC/CRFYYYY/CRTX folder.
 
+With --streaming the country datasets are opened lazily and written country by
+country, so only the data of one country has to be in memory at a time instead
+of the full dataset.
+
 TODO: sort importing and move to datasets folder
 TODO: add datalad get to obtain the input files
 """
@@ -18,7 +22,14 @@ from pathlib import Path
 import datalad.api
 import primap2 as pm2
 
-from unfccc_ghg_data.helper import all_countries, dataset_path_UNFCCC
+from unfccc_ghg_data.helper import (
+    DatasetCombiner,
+    all_countries,
+    concat_area_datasets,
+    dataset_path_UNFCCC,
+    write_interchange_format_streaming,
+    write_netcdf_streaming,
+)
 from unfccc_ghg_data.unfccc_crf_reader.unfccc_crf_reader_prod import (
     get_input_and_output_files_for_country,
     submission_has_been_read,
@@ -29,9 +40,15 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--submission_year", help="Submission round to read", type=int)
     parser.add_argument("--type", help="CRF or CRT tables", default="CRF")
+    parser.add_argument(
+        "--streaming",
+        help="Write the dataset country by country to reduce memory use",
+        action="store_true",
+    )
     args = parser.parse_args()
     submission_year = args.submission_year
     submission_type = args.type
+    streaming = args.streaming
 
     if submission_type == "CRF":
         countries = all_crf_countries
@@ -40,7 +57,8 @@ if __name__ == "__main__":
     else:
         raise ValueError("Type must be CRF or CRT")  # noqa: TRY003
 
-    ds_all_CRF = None
+    combiner = DatasetCombiner()
+    ds_countries = []
     outdated_countries = []
     included_countries = []
 
@@ -81,19 +99,26 @@ if __name__ == "__main__":
 
             datalad.api.get(input_files)
 
-            ds_country = pm2.open_dataset(input_files[0])
-
-            # combine per table DS
-            if ds_all_CRF is None:
-                ds_all_CRF = ds_country
+            if streaming:
+                # open lazily with one chunk per variable. The data is only read
+                # when writing the combined dataset
+                ds_countries.append(pm2.open_dataset(input_files[0], chunks=-1))
             else:
-                ds_all_CRF = ds_all_CRF.combine_first(ds_country)
+                ds_country = pm2.open_dataset(input_files[0])
+
+                # combine per country DS
+                combiner.add(ds_country)
 
             included_countries.append(country)
 
         except Exception as ex:
             print(f"Exception {ex} occurred for {country}")
 
+    if streaming:
+        ds_all_CRF = concat_area_datasets(ds_countries)
+    else:
+        ds_all_CRF = combiner.result()
+
     # Update metadata
     # not necessary
 
@@ -109,16 +134,25 @@ if __name__ == "__main__":
     if not output_folder.exists():
         output_folder.mkdir()
 
-    # write data in interchange format
-    pm2.pm2io.write_interchange_format(
-        output_folder / output_filename, ds_all_CRF.pr.to_interchange_format()
-    )
-
-    # write data in native PRIMAP2 format
     encoding = {var: compression for var in ds_all_CRF.data_vars}
-    ds_all_CRF.pr.to_netcdf(
-        output_folder / (output_filename + ".nc"), encoding=encoding
-    )
+    if streaming:
+        # write data in interchange format
+        write_interchange_format_streaming(output_folder / output_filename, ds_all_CRF)
+
+        # write data in native PRIMAP2 format
+        write_netcdf_streaming(
+            output_folder / (output_filename + ".nc"), ds_all_CRF, encoding=encoding
+        )
+    else:
+        # write data in interchange format
+        pm2.pm2io.write_interchange_format(
+            output_folder / output_filename, ds_all_CRF.pr.to_interchange_format()
+        )
+
+        # write data in native PRIMAP2 format
+        ds_all_CRF.pr.to_netcdf(
+            output_folder / (output_filename + ".nc"), encoding=encoding
+        )
 
     # show info
     print(f"The following countries are included in the dataset: {included_countries}")
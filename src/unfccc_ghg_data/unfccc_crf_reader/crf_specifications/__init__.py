@@ -1,21 +1,30 @@
 """
 Define the CRF specifications here for easy access
+
+The specification modules are large, so they are only imported when a
+specification is used for the first time, e.g. with ``crf_specifications.CRT1``
+or ``getattr(crf_specifications, "CRT1")``. Importing the package itself is cheap.
 """
 
-from .crf2021_specification import CRF2021
-from .crf2022_specification import CRF2022
-from .crf2023_aus_specification import CRF2023_AUS
-from .crf2023_specification import CRF2023
-from .crf2024_specification import CRF2024
-from .crt1_ecu_specification import CRT1_ECU
-from .crt1_ind_specification import CRT1_IND
-from .crt1_per_specification import CRT1_PER
-from .crt1_pry_specification import CRT1_PRY
-from .crt1_specification import CRT1
-from .crt1_tun_specification import CRT1_TUN
-from .crt2_specification import CRT2
-from .crtai2025_specification import CRTAI2025
-from .crtai2026_specification import CRTAI2026
+import importlib
+
+# specification name -> module defining it
+specification_modules = {
+    "CRF2021": "crf2021_specification",
+    "CRF2022": "crf2022_specification",
+    "CRF2023": "crf2023_specification",
+    "CRF2023_AUS": "crf2023_aus_specification",
+    "CRF2024": "crf2024_specification",
+    "CRT1": "crt1_specification",
+    "CRT1_ECU": "crt1_ecu_specification",
+    "CRT1_IND": "crt1_ind_specification",
+    "CRT1_PER": "crt1_per_specification",
+    "CRT1_PRY": "crt1_pry_specification",
+    "CRT1_TUN": "crt1_tun_specification",
+    "CRT2": "crt2_specification",
+    "CRTAI2025": "crtai2025_specification",
+    "CRTAI2026": "crtai2026_specification",
+}
 
 __all__ = [
     "CRF2021",
@@ -33,3 +42,18 @@ __all__ = [
     "CRTAI2025",
     "CRTAI2026",
 ]
+
+
+def __getattr__(name: str) -> dict:
+    """Import the module of a specification when it's accessed for the first time"""
+    if name not in specification_modules:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")  # noqa: TRY003
+    module = importlib.import_module(f".{specification_modules[name]}", __name__)
+    specification = getattr(module, name)
+    # store in the module namespace so __getattr__ is not called again
+    globals()[name] = specification
+    return specification
+
+
+def __dir__() -> list[str]:
+    return sorted({*globals(), *specification_modules})
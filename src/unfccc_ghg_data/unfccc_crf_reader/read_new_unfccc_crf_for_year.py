@@ -19,6 +19,12 @@ if __name__ == "__main__":
         "--re_read", help="Read data also if already read before", action="store_true"
     )
     parser.add_argument("--type", help="CRF or CRT tables", default="CRF")
+    parser.add_argument(
+        "--n_workers",
+        help="Number of processes to read countries in parallel",
+        type=int,
+        default=1,
+    )
 
     args = parser.parse_args()
 
@@ -28,10 +34,12 @@ if __name__ == "__main__":
     submission_year = args.submission_year
     re_read = args.re_read
     type = args.type
+    n_workers = args.n_workers
     print(f"!!!!!!!!!!!!!!!!!!!!script: re_read={re_read}")
     read_new_crf_for_year(
         submission_year=int(submission_year),
         #    countries=countries,
         re_read=re_read,
         submission_type=type,
+        n_workers=n_workers,
     )
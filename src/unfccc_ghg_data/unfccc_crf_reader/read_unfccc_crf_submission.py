@@ -22,6 +22,17 @@ if __name__ == "__main__":
         "--re_read", help="Read data also if already read before", action="store_true"
     )
     parser.add_argument("--type", help="CRF or CRT tables", default="CRF")
+    parser.add_argument(
+        "--n_workers",
+        help="Number of processes to read the files for the data years in parallel",
+        type=int,
+        default=1,
+    )
+    parser.add_argument(
+        "--incremental",
+        help="Only read tables where specification or input files changed",
+        action="store_true",
+    )
 
     args = parser.parse_args()
 
@@ -30,6 +41,8 @@ if __name__ == "__main__":
     date_or_version = args.date_or_version
     re_read = args.re_read
     submission_type = args.type
+    n_workers = args.n_workers
+    incremental = args.incremental
     if date_or_version == "None":
         date_or_version = None
 
@@ -39,4 +52,6 @@ if __name__ == "__main__":
         date_or_version=date_or_version,
         re_read=re_read,
         submission_type=submission_type,
+        n_workers=n_workers,
+        incremental=incremental,
     )
@@ -0,0 +1,304 @@
+"""
+On-disk cache for parsed CRF/CRT worksheets
+
+Parsing the xlsx worksheets is the slowest part of reading CRF / CRT data. The input
+files never change (they are git-annex objects with content addressed keys) so the
+raw DataFrames read from the worksheets can be cached and reused when data are
+re-read, e.g. after changing a specification.
+
+Cache entries are keyed by the annex key of the file (or a hash of the file content
+if the file is not in the annex), the worksheet and the rows read. The cache is
+checked before the file is fetched from the annex or opened, so cached worksheets
+don't need the file content. The cache size is bounded and the least recently used
+entries are removed by `trim_crf_sheet_cache` when it grows too large.
+
+The DataFrames are stored as compressed pickle files, as the read worksheets
+contain columns with mixed strings and numbers which can't be stored in columnar
+formats like parquet without changing the data types.
+"""
+
+import functools
+import hashlib
+import os
+import tempfile
+from collections.abc import Callable
+from pathlib import Path
+
+import pandas as pd
+
+from unfccc_ghg_data.helper import cache_path
+
+from ..helper.definitions import nan_values_crf_crt
+
+crf_sheet_cache_path = cache_path / "crf_sheets"
+crf_sheet_cache_max_size = 2 * 1024**3  # bytes
+
+
+def get_crf_file_key(file: Path) -> str:
+    """
+    Get a key identifying the content of a CRF file
+
+    For files in the git-annex the annex key is used (the name of the file the
+    symlink points to). This works without the file content being present. For other
+    files a sha256 hash of the file content is computed. The hash is only computed
+    again if the modification time or size of the file changes.
+
+    Parameters
+    ----------
+    file: Path
+        The xlsx file
+
+    Returns
+    -------
+        str: key for the file content
+
+    """
+    if file.is_symlink():
+        target = Path(os.readlink(file))
+        if ".git" in target.parts and "annex" in target.parts:
+            return target.name
+
+    file_stat = file.stat()
+    return get_crf_file_hash(
+        str(file.resolve()), file_stat.st_mtime_ns, file_stat.st_size
+    )
+
+
+@functools.lru_cache(maxsize=1024)
+def get_crf_file_hash(file: str, mtime_ns: int, size: int) -> str:
+    """
+    Get the sha256 hash of a file's content
+
+    The modification time and size are only used as part of the key of the cache of
+    results.
+
+    Parameters
+    ----------
+    file: str
+        path of the file
+    mtime_ns: int
+        modification time of the file in nanoseconds
+    size: int
+        size of the file in bytes
+
+    Returns
+    -------
+        str: "SHA256-" followed by the hex digest of the file content
+
+    """
+    file_hash = hashlib.sha256()
+    with open(file, "rb") as input_file:
+        for chunk in iter(lambda: input_file.read(1024**2), b""):
+            file_hash.update(chunk)
+    return f"SHA256-{file_hash.hexdigest()}"
+
+
+def get_crf_sheet_cache_file(
+    file: Path,
+    table: str,
+    skiprows: int,
+    nrows: int,
+    cache_folder: Path | None = None,
+) -> Path:
+    """
+    Get the cache file for a worksheet and row range of a CRF file
+
+    Besides the file key, table and rows the pandas version and the NaN values used
+    for reading are part of the key, so changes to them invalidate the cache.
+
+    Parameters
+    ----------
+    file: Path
+        The xlsx file
+    table: str
+        name of the worksheet
+    skiprows: int
+        number of rows skipped at the top of the worksheet
+    nrows: int
+        number of rows read
+    cache_folder: Path (optional)
+        Folder of the cache. Default is `crf_sheet_cache_path`
+
+    Returns
+    -------
+        Path: the cache file (which might not exist)
+
+    """
+    if cache_folder is None:
+        cache_folder = crf_sheet_cache_path
+    key = "|".join(
+        [
+            get_crf_file_key(file),
+            table,
+            str(skiprows),
+            str(nrows),
+            pd.__version__,
+            ",".join(sorted(nan_values_crf_crt)),
+        ]
+    )
+    return cache_folder / f"{hashlib.sha256(key.encode()).hexdigest()}.pkl.gz"
+
+
+def read_crf_sheet(  # noqa: PLR0913
+    excel_input: Path | pd.ExcelFile | Callable[[], Path | pd.ExcelFile],
+    file: Path,
+    table: str,
+    skiprows: int,
+    nrows: int,
+    engine: str | None = None,
+    use_cache: bool = False,
+    cache_folder: Path | None = None,
+) -> pd.DataFrame:
+    """
+    Read the rows of a worksheet of a CRF file, optionally using the cache
+
+    If the cache is used and the worksheet and row range have been read before the
+    DataFrame is taken from the cache. Otherwise, it is read from the xlsx file and
+    stored in the cache. The cache is not trimmed here, use `trim_crf_sheet_cache`
+    after reading.
+
+    Parameters
+    ----------
+    excel_input: Path, pd.ExcelFile, or callable
+        file or opened workbook to read from if the data is not cached. If a
+        callable is given it is only called if the data is not cached and has to
+        return the file or workbook. This way files only have to be fetched from the
+        annex and opened if the data is not cached.
+    file: Path
+        The xlsx file (used to determine the cache key)
+    table: str
+        name of the worksheet
+    skiprows: int
+        number of rows skipped at the top of the worksheet
+    nrows: int
+        number of rows read
+    engine: str (optional)
+        engine for pd.read_excel
+    use_cache: bool default False
+        if False the data is read from the xlsx file and the cache is not used
+    cache_folder: Path (optional)
+        Folder of the cache. Default is `crf_sheet_cache_path`
+
+    Returns
+    -------
+        pd.DataFrame: the data read from the worksheet
+
+    """
+    # we read with user specific NaN treatment as the NaN treatment is part of
+    # the conversion to PRIMAP2 format.
+    read_excel_kwargs = dict(
+        sheet_name=table,
+        skiprows=skiprows,
+        nrows=nrows,
+        engine=engine,
+        na_values=nan_values_crf_crt,
+        keep_default_na=False,
+    )
+    if not use_cache:
+        if callable(excel_input):
+            excel_input = excel_input()
+        return pd.read_excel(excel_input, **read_excel_kwargs)
+
+    if cache_folder is None:
+        cache_folder = crf_sheet_cache_path
+    cache_file = get_crf_sheet_cache_file(
+        file, table, skiprows, nrows, cache_folder=cache_folder
+    )
+
+    if cache_file.exists():
+        try:
+            # the cache only contains files written by this module
+            df_raw = pd.read_pickle(cache_file)  # noqa: S301
+        except Exception as ex:
+            print(f"Could not read cache file {cache_file}, reading {file}: {ex}")
+        else:
+            # mark as recently used
+            os.utime(cache_file)
+            return df_raw
+
+    if callable(excel_input):
+        excel_input = excel_input()
+    df_raw = pd.read_excel(excel_input, **read_excel_kwargs)
+
+    # write to a temporary file first so other processes never see partial files
+    cache_folder.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(
+        dir=cache_folder, suffix=".tmp", delete=False
+    ) as temp_file:
+        temp_path = Path(temp_file.name)
+    try:
+        df_raw.to_pickle(temp_path, compression="gzip")
+        os.replace(temp_path, cache_file)
+    except BaseException:
+        # temporary files are not cache entries, so they would never be removed
+        temp_path.unlink(missing_ok=True)
+        raise
+
+    return df_raw
+
+
+def trim_crf_sheet_cache(
+    max_size: int | None = None,
+    cache_folder: Path | None = None,
+) -> int:
+    """
+    Remove the least recently used cache entries until the cache is small enough
+
+    Parameters
+    ----------
+    max_size: int (optional)
+        maximal size of the cache in bytes. Default is `crf_sheet_cache_max_size`.
+        Use 0 to clear the cache.
+    cache_folder: Path (optional)
+        Folder of the cache. Default is `crf_sheet_cache_path`
+
+    Returns
+    -------
+        int: number of removed cache files
+
+    """
+    if max_size is None:
+        max_size = crf_sheet_cache_max_size
+    if cache_folder is None:
+        cache_folder = crf_sheet_cache_path
+    if not cache_folder.exists():
+        return 0
+
+    cache_files = []
+    for entry in os.scandir(cache_folder):
+        if entry.name.endswith(".pkl.gz"):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                # removed by another process
+                continue
+            cache_files.append((stat.st_mtime, stat.st_size, Path(entry.path)))
+
+    total_size = sum(size for _, size, _ in cache_files)
+    removed = 0
+    # oldest (least recently used) first
+    for _, size, cache_file in sorted(cache_files, key=lambda entry: entry[0]):
+        if total_size <= max_size:
+            break
+        cache_file.unlink(missing_ok=True)
+        total_size = total_size - size
+        removed = removed + 1
+
+    return removed
+
+
+def clear_crf_sheet_cache(cache_folder: Path | None = None) -> int:
+    """
+    Remove all entries from the CRF sheet cache
+
+    Parameters
+    ----------
+    cache_folder: Path (optional)
+        Folder of the cache. Default is `crf_sheet_cache_path`
+
+    Returns
+    -------
+        int: number of removed cache files
+
+    """
+    return trim_crf_sheet_cache(max_size=0, cache_folder=cache_folder)
@@ -6,15 +6,21 @@ Core function are used both for reading for final datasets as
 well as for test-reading to check for new categories etc.
 """
 
+import hashlib
 import json
+import multiprocessing
 import os
 import re
+import tempfile
 from collections import Counter
-from collections.abc import Generator
-from copy import deepcopy
+from collections.abc import Generator, Mapping
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime, timedelta
+from itertools import repeat
 from operator import itemgetter
 from pathlib import Path
+from types import MappingProxyType
 
 import datalad as dl
 import numpy as np
@@ -22,10 +28,16 @@ import pandas as pd
 import primap2 as pm2
 from treelib import Tree
 
-from unfccc_ghg_data.helper import downloaded_data_path_UNFCCC, root_path
+from unfccc_ghg_data.helper import (
+    cache_path,
+    downloaded_data_path_UNFCCC,
+    folder_mapping_index,
+    root_path,
+)
 
-from ..helper.definitions import nan_values_crf_crt, str_value_mapping
+from ..helper.definitions import str_value_mapping
 from . import crf_specifications as crf
+from .unfccc_crf_reader_cache import read_crf_sheet, trim_crf_sheet_cache
 from .util import BTR_urls, NoCRFFilesError
 
 pd.set_option("future.no_silent_downcasting", True)
@@ -226,7 +238,7 @@ def convert_crf_table_to_pm2if(  # noqa: PLR0912, PLR0913, PLR0915
     return df_table_if
 
 
-def read_crf_table(  # noqa: PLR0913, PLR0912, PLR0915
+def read_crf_table(  # noqa: PLR0913
     country_codes: str | list[str],
     table: str,
     submission_year: int,
@@ -235,6 +247,8 @@ def read_crf_table(  # noqa: PLR0913, PLR0912, PLR0915
     folder: str | None = None,
     submission_type: str = "CRF",
     debug: bool = False,
+    n_workers: int = 1,
+    use_cache: bool = False,
 ) -> tuple[pd.DataFrame, list[list], list[list], bool, list[list]]:
     """
     Read CRF table for given year and country/countries
@@ -268,6 +282,10 @@ def read_crf_table(  # noqa: PLR0913, PLR0912, PLR0915
         read CRF or CRT/BTR data
     debug: bool (optional)
         if true print some debug information like column headers
+    n_workers: int default = 1
+        Number of processes used to read the input files in parallel
+    use_cache: bool default = False
+        Use the on-disk cache of parsed worksheets
 
     Returns
     -------
@@ -280,6 +298,89 @@ def read_crf_table(  # noqa: PLR0913, PLR0912, PLR0915
         * The fourth return parameter is true if the worksheet to read in the file
         * the fifth return parameter is a list of skipped files
 
+    """
+    tables_read = read_crf_tables(
+        country_codes=country_codes,
+        tables=[table],
+        submission_year=submission_year,
+        data_year=data_year,
+        date_or_version=date_or_version,
+        folder=folder,
+        submission_type=submission_type,
+        debug=debug,
+        n_workers=n_workers,
+        use_cache=use_cache,
+    )
+    return tables_read[table]
+
+
+def read_crf_tables(  # noqa: PLR0913
+    country_codes: str | list[str],
+    tables: list[str],
+    submission_year: int,
+    data_year: int | list[int] | None = None,
+    date_or_version: str | None = None,
+    folder: str | None = None,
+    submission_type: str = "CRF",
+    debug: bool = False,
+    engine: str = "openpyxl",
+    n_workers: int = 1,
+    use_cache: bool = False,
+) -> dict[str, tuple[pd.DataFrame, list[list], list[list], bool, list[list]]]:
+    """
+    Read several CRF tables for given year and country/countries
+
+    Works like `read_crf_table` but reads a list of tables. Each xlsx file is
+    opened only once and all requested worksheets are parsed from the opened
+    workbook. As CRF / CRT files are large and the tables are spread over many
+    worksheets this is much faster than reading each table from the files
+    individually.
+
+    Parameters
+    ----------
+    country_codes: str or list[str]
+        ISO 3-letter country code or list of country codes
+    tables: list[str]
+        names of the table sheets in the CRF xlsx file
+    submission_year: int
+        Year of the submission of the data
+    data_year: int or List of int (optional)
+        if int a single data year will be read. if a list of ints is given these
+        years will be read. If no nothing is given all data years will be read
+    date_or_version: str (optional, default is None)
+        readonly submission from the given date (CRF) or version (CRT/BTR)
+        use "latest" to read the latest submissions
+    folder: str (optional)
+        Folder that contains the xls files. If not given folders are determined by the
+        submissions_year and country_code variables
+    submission_type: str default = "CRF"
+        read CRF or CRT/BTR data
+    debug: bool (optional)
+        if true print some debug information like column headers
+    engine: str default = "openpyxl"
+        Engine used by pandas to open the xlsx files. Faster engines (e.g.
+        "calamine") can be used if installed, but results should be checked
+        against the openpyxl results when changing the engine.
+    n_workers: int default = 1
+        Number of processes used to read the input files (one per data year) in
+        parallel. If 1 the files are read sequentially in the main process. The
+        files are fetched from the annex before they are read in parallel. In worker
+        processes (e.g. when reading countries in parallel) the files are always
+        read sequentially.
+    use_cache: bool default = False
+        Use the on-disk cache of parsed worksheets. Speeds up reading the same files
+        again, e.g. when testing specifications. See `unfccc_crf_reader_cache`.
+
+    Returns
+    -------
+    Dict with the table names as keys and a tuple of parameters as values. The tuples
+    contain the same information as the return value of `read_crf_table`:
+        * the data as a pandas DataFrame in long format.
+        * a list of unknown categories / row headers.
+        * information on data found in the last read row.
+        * true if the worksheet to read is not present in the file
+        * a list of skipped files
+
     """
     # check type
     if submission_type not in ["CRF", "CRT", "CRTAI"]:
@@ -289,6 +390,254 @@ def read_crf_table(  # noqa: PLR0913, PLR0912, PLR0915
         country_codes = [country_codes]
 
     # get file names and locations
+    input_files = find_crf_input_files(
+        country_codes=country_codes,
+        submission_year=submission_year,
+        data_year=data_year,
+        date_or_version=date_or_version,
+        folder=folder,
+        submission_type=submission_type,
+    )
+
+    # get specification
+    crf_spec_name = get_crf_specification_name(
+        country_codes=country_codes,
+        submission_year=submission_year,
+        submission_type=submission_type,
+    )
+
+    if n_workers > 1 and multiprocessing.parent_process() is not None:
+        # worker processes can't start their own process pools
+        n_workers = 1
+
+    # now read all tables from each file. Files are independent, so they can be
+    # read in parallel
+    if n_workers > 1:
+        # get all files at once here instead of concurrently in the workers
+        get_crf_files_from_annex(input_files)
+        # the workers get the specification by name, so it's not pickled for
+        # every file
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            tables_read_files = list(
+                executor.map(
+                    read_crf_tables_from_file,
+                    input_files,
+                    repeat(tables),
+                    repeat(crf_spec_name),
+                    repeat(debug),
+                    repeat(engine),
+                    repeat(use_cache),
+                )
+            )
+    else:
+        crf_spec = getattr(crf, crf_spec_name)
+        tables_read_files = [
+            read_crf_tables_from_file(
+                file, tables, crf_spec, debug=debug, engine=engine, use_cache=use_cache
+            )
+            for file in input_files
+        ]
+
+    if use_cache:
+        # trim once per run instead of after each cached worksheet
+        trim_crf_sheet_cache()
+
+    # combine the results in the order of the input files
+    tables_read = {}
+    for table in tables:
+        dfs_table = []
+        unknown_rows = []
+        last_row_info = []
+        not_present = False
+        skipped_files = []
+        for tables_read_file in tables_read_files:
+            (
+                df_this_file,
+                unknown_rows_this_file,
+                last_row_info_this_file,
+                not_present_this_file,
+                skipped_files_this_file,
+            ) = tables_read_file[table]
+            if df_this_file is not None:
+                dfs_table.append(df_this_file)
+            unknown_rows = unknown_rows + unknown_rows_this_file
+            last_row_info = last_row_info + last_row_info_this_file
+            not_present = not_present or not_present_this_file
+            skipped_files = skipped_files + skipped_files_this_file
+
+        if dfs_table:
+            # data from later files has always been put first, so keep that order
+            df_all = pd.concat(dfs_table[::-1])
+        else:
+            df_all = None
+        tables_read[table] = (
+            df_all,
+            unknown_rows,
+            last_row_info,
+            not_present,
+            skipped_files,
+        )
+
+    return tables_read
+
+
+def read_crf_tables_from_file(  # noqa: PLR0913
+    file: Path,
+    tables: list[str],
+    crf_spec: dict | str,
+    debug: bool = False,
+    engine: str = "openpyxl",
+    use_cache: bool = False,
+) -> dict[str, tuple[pd.DataFrame | None, list[list], list[list], bool, list[list]]]:
+    """
+    Read several tables from a single CRF file
+
+    The file is opened once and all tables are read from the opened workbook. If
+    the cache is used, the file is only fetched from the annex and opened when the
+    first table which is not in the cache is read.
+    Errors are not raised but logged in the returned skipped files information.
+    This is the unit of work used by `read_crf_tables` for each input file.
+
+    Parameters
+    ----------
+    file: Path
+        xlsx file to read the tables from
+    tables: list[str]
+        names of the table sheets in the CRF xlsx file
+    crf_spec: dict or str
+        CRF / CRT specification containing the specifications for the tables or
+        the name of the specification in `crf_specifications`
+    debug: bool (optional)
+        if true print some debug information like column headers
+    engine: str default = "openpyxl"
+        Engine used by pandas to open the xlsx file
+    use_cache: bool default = False
+        Use the on-disk cache of parsed worksheets
+
+    Returns
+    -------
+    Dict with the table names as keys and a tuple of parameters as values. The tuples
+    contain the data for this file (None if the table could not be read) and the
+    unknown rows, last row info, not present, and skipped files information as
+    returned by `read_crf_table`
+
+    """
+    if isinstance(crf_spec, str):
+        crf_spec = getattr(crf, crf_spec)
+    file_info = get_info_from_crf_filename(file.name)
+    tables_read = {}
+    try:
+        int(file_info["data_year"])
+        workbook = LazyWorkbook(file, engine=engine)
+        if not use_cache:
+            workbook()
+    except Exception as ex:
+        print(f"Error when reading file {file}. Skipping file. Exception: {ex}")
+        for table in tables:
+            tables_read[table] = (
+                None,
+                [],
+                [],
+                False,
+                [[table, file_info["party"], file_info["data_year"], f"{ex}"]],
+            )
+        return tables_read
+
+    with workbook:
+        for table in tables:
+            df_this_file = None
+            unknown_rows = []
+            last_row_info = []
+            not_present = False
+            skipped_files = []
+            try:
+                (
+                    df_this_file,
+                    unknown_rows,
+                    last_row_info,
+                ) = read_crf_table_from_file(
+                    file,
+                    table,
+                    crf_spec[table],
+                    debug=debug,
+                    workbook=workbook,
+                    use_cache=use_cache,
+                )
+            except ValueError as ex:
+                if ex.args[0] == f"Worksheet named '{table}' not found":
+                    print(f"Table {table} not present")
+                    not_present = True
+                else:
+                    print(
+                        f"Error when reading file {file}. Skipping file. "
+                        f"Exception: {ex}"
+                    )
+                    skipped_files.append(
+                        [
+                            table,
+                            file_info["party"],
+                            file_info["data_year"],
+                            f"{ex}",
+                        ]
+                    )
+            except Exception as ex:
+                print(f"Error when reading file {file}. Skipping file. Exception: {ex}")
+                skipped_files.append(
+                    [
+                        table,
+                        file_info["party"],
+                        file_info["data_year"],
+                        f"{ex}",
+                    ]
+                )
+            tables_read[table] = (
+                df_this_file,
+                unknown_rows,
+                last_row_info,
+                not_present,
+                skipped_files,
+            )
+
+    return tables_read
+
+
+def find_crf_input_files(  # noqa: PLR0913
+    country_codes: list[str],
+    submission_year: int,
+    data_year: int | list[int] | None = None,
+    date_or_version: str | None = None,
+    folder: str | None = None,
+    submission_type: str = "CRF",
+) -> list[Path]:
+    """
+    Find the input files to read for the given country / countries
+
+    Wrapper around `get_crf_files` which also considers the case of CRF submissions
+    where the export ran overnight and not all files have the same date. If files
+    can't be found a NoCRFFilesError is raised.
+
+    Parameters
+    ----------
+    country_codes: list[str]
+        List of ISO 3-letter country codes
+    submission_year: int
+        Year of the submission of the data
+    data_year: int or List of int (optional)
+        if int a single data year will be read. if a list of ints is given these
+        years will be read. If no nothing is given all data years will be read
+    date_or_version: str (optional, default is None)
+        readonly submission from the given date (CRF) or version (CRT/BTR)
+        use "latest" to read the latest submissions
+    folder: str (optional)
+        Folder that contains the xls files. If not given folders are determined by the
+        submissions_year and country_code variables
+    submission_type: str default = "CRF"
+        read CRF or CRT/BTR data
+
+    Returns
+    -------
+        List[Path]: list of Path objects for the files
+    """
     try:
         input_files = get_crf_files(
             country_codes=country_codes,
@@ -344,91 +693,152 @@ def read_crf_table(  # noqa: PLR0913, PLR0912, PLR0915
             f"folder={folder}."
         ) from ex
 
-    # get specification
-    # if we only have a single country check if we might have a country specific
-    # specification (currently only Australia, 2023)
+    return input_files
+
+
+def get_crf_specification_name(
+    country_codes: list[str],
+    submission_year: int,
+    submission_type: str = "CRF",
+) -> str:
+    """
+    Get the name of the CRF / CRT specification to use for reading
+
+    If we only have a single country check if we have a country specific
+    specification (e.g. Australia, 2023). Otherwise, the general specification for
+    the submission year / round is used.
+
+    Parameters
+    ----------
+    country_codes: list[str]
+        List of ISO 3-letter country codes
+    submission_year: int
+        Year of the submission of the data
+    submission_type: str default = "CRF"
+        read CRF or CRT/BTR data
+
+    Returns
+    -------
+        Name of the specification in `crf_specifications`
+    """
     if len(country_codes) == 1:
-        try:
-            crf_spec = getattr(
-                crf, f"{submission_type}{submission_year}_{country_codes[0]}"
-            )
-            print(
-                f"Using country specific specification: "
-                f"{submission_type}{submission_year}_{country_codes[0]}"
-            )
-        except:  # noqa: E722
-            # no country specific specification, check for general specification
+        crf_spec_name = f"{submission_type}{submission_year}_{country_codes[0]}"
+        if hasattr(crf, crf_spec_name):
+            print(f"Using country specific specification: {crf_spec_name}")
+            return crf_spec_name
+
+    # no country specific specification, check for general specification
+    crf_spec_name = f"{submission_type}{submission_year}"
+    if not hasattr(crf, crf_spec_name):
+        raise ValueError(  # noqa: TRY003
+            f"No terminology exists for submission year {submission_year}"
+        )
+    return crf_spec_name
+
+
+def get_crf_file_from_annex(
+    file: Path,
+) -> None:
+    """
+    Get the file content using datalad if the file is not present
+
+    Parameters
+    ----------
+    file: Path
+        file to check and get
+    """
+    # TODO: fix such that it also follows links (if the target of the link is a link
+    #  check if that exists and if not download)
+    if file.is_symlink():
+        if not file.exists():
+            dlds = dl.api.Dataset(root_path)
+            dlds.get(file.relative_to(root_path))
+
+
+class LazyWorkbook:
+    """
+    xlsx workbook which is fetched from the annex and opened on first use
+
+    Calling the object returns the opened workbook. Errors from fetching or opening
+    the file are raised again on subsequent calls without trying again. Can be used
+    as a context manager which closes the workbook if it has been opened.
+
+    Parameters
+    ----------
+    file
+        the xlsx file
+    engine
+        Engine used by pandas to open the xlsx file
+    """
+
+    def __init__(self, file: Path, engine: str = "openpyxl") -> None:
+        self.file = file
+        self.engine = engine
+        self._workbook = None
+        self._error = None
+
+    def __call__(self) -> pd.ExcelFile:
+        """Get the workbook, fetching and opening the file if necessary"""
+        if self._error is not None:
+            raise self._error
+        if self._workbook is None:
             try:
-                crf_spec = getattr(crf, f"{submission_type}{submission_year}")
+                get_crf_file_from_annex(self.file)
+                self._workbook = pd.ExcelFile(self.file, engine=self.engine)
             except Exception as ex:
-                raise ValueError(  # noqa: TRY003
-                    f"No terminology exists for submission year {submission_year}"
-                ) from ex
-    else:
-        try:
-            crf_spec = getattr(crf, f"{submission_type}{submission_year}")
-        except Exception as ex:
-            raise ValueError(  # noqa: TRY003
-                f"No terminology exists for submission year {submission_year}"
-            ) from ex
-
-    # now loop over files and read them
-    df_all = None
-    unknown_rows = []
-    last_row_info = []
-    not_present = False
-    skipped_files = []
-    for file in input_files:
-        file_info = get_info_from_crf_filename(file.name)
+                self._error = ex
+                raise
+        return self._workbook
+
+    def close(self) -> None:
+        """Close the workbook if it has been opened"""
+        if self._workbook is not None:
+            self._workbook.close()
+            self._workbook = None
+
+    def __enter__(self) -> "LazyWorkbook":
+        """Return the lazy workbook"""
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        """Close the workbook"""
+        self.close()
+
+
+def get_crf_files_from_annex(
+    files: list[Path],
+) -> None:
+    """
+    Get the content of all files which are not present using datalad
+
+    All missing files are fetched with a single datalad call. Errors are printed
+    and not raised, files which could not be fetched are skipped when reading.
+
+    Parameters
+    ----------
+    files: list[Path]
+        files to check and get
+    """
+    missing_files = [
+        file.relative_to(root_path)
+        for file in files
+        if file.is_symlink() and not file.exists()
+    ]
+    if missing_files:
         try:
-            int(file_info["data_year"])
-            (
-                df_this_file,
-                unknown_rows_this_file,
-                last_row_info_this_file,
-            ) = read_crf_table_from_file(file, table, crf_spec[table], debug=debug)
-            if df_all is None:
-                df_all = df_this_file.copy(deep=True)
-                unknown_rows = unknown_rows_this_file
-                last_row_info = last_row_info_this_file
-            else:
-                df_all = pd.concat([df_this_file, df_all])
-                unknown_rows = unknown_rows + unknown_rows_this_file
-                last_row_info = last_row_info + last_row_info_this_file
-        except ValueError as ex:
-            if ex.args[0] == f"Worksheet named '{table}' not found":
-                print(f"Table {table} not present")
-                not_present = True
-                pass
-            else:
-                print(f"Error when reading file {file}. Skipping file. Exception: {ex}")
-                skipped_files.append(
-                    [
-                        table,
-                        file_info["party"],
-                        file_info["data_year"],
-                        f"{ex}",
-                    ]
-                )
+            dlds = dl.api.Dataset(root_path)
+            dlds.get(missing_files)
         except Exception as ex:
-            print(f"Error when reading file {file}. Skipping file. Exception: {ex}")
-            skipped_files.append(
-                [
-                    table,
-                    file_info["party"],
-                    file_info["data_year"],
-                    f"{ex}",
-                ]
-            )
-
-    return df_all, unknown_rows, last_row_info, not_present, skipped_files
+            print(f"Error when getting files from the annex: {ex}")
 
 
-def read_crf_table_from_file(  # noqa: PLR0912, PLR0915
+def read_crf_table_from_file(  # noqa: PLR0912, PLR0913, PLR0915
     file: Path,
     table: str,
     table_spec: dict[str, dict],
     debug: bool = False,
+    workbook: pd.ExcelFile | LazyWorkbook | None = None,
+    use_cache: bool = False,
 ) -> tuple[pd.DataFrame, list[list], list[list]]:
     """
     Read single crf table from file
@@ -446,6 +856,13 @@ def read_crf_table_from_file(  # noqa: PLR0912, PLR0915
         Specification for the given table, e.g. CRF2021["Table4"]
     debug: bool (optional)
         if true print some debug information like column headers
+    workbook: pd.ExcelFile or LazyWorkbook (optional)
+        The already opened xlsx file or a `LazyWorkbook` which opens it when the data
+        is not cached. If given the table is read from the workbook instead of
+        opening the file again. Used to read several tables from one file.
+    use_cache: bool (optional, default False)
+        if true the worksheet is read from the on-disk cache of parsed worksheets if
+        present and added to the cache otherwise. See `unfccc_crf_reader_cache`.
 
     Returns
     -------
@@ -457,44 +874,29 @@ def read_crf_table_from_file(  # noqa: PLR0912, PLR0915
           be adapted as country submitted tables are longer than expected.
 
     """
-    # check if file exists and if not download
-    # TODO: fix such that it also follows links (if the target of the link is a link
-    #  check if that exists and if not download)
-    if file.is_symlink():
-        if not file.exists():
-            dlds = dl.api.Dataset(root_path)
-            dlds.get(file.relative_to(root_path))
+    if workbook is None:
+        # check if file exists and if not download. Only done if the data is not
+        # cached
+        def excel_input() -> Path:
+            get_crf_file_from_annex(file)
+            return file
+
+        engine = "openpyxl"
+    else:
+        # the engine is already set in the opened workbook
+        excel_input = workbook
+        engine = None
 
     table_properties = table_spec["table"]
     file_info = get_info_from_crf_filename(file.name)
 
-    # find non-unique categories in mapping
-    all_cats_mapping = deepcopy(table_spec["sector_mapping"])
-    # prep specification
-    all_cats_mapping = prep_specification(
-        specification=all_cats_mapping, country=file_info["party"]
+    # get the country specific mapping information (computed once per country)
+    compiled_spec = get_compiled_table_specification(
+        table_spec, table, file_info["party"]
     )
-    all_cats = [cat[0][0] for cat in all_cats_mapping]
-
-    unique_cats = [cat for (cat, count) in Counter(all_cats).items() if count == 1]
-    unique_cat_tuples = [
-        mapping for mapping in all_cats_mapping if mapping[0][0] in unique_cats
-    ]
-    unique_mapping = dict(
-        zip(
-            [tup[0][0] for tup in unique_cat_tuples],
-            [tup[1] for tup in unique_cat_tuples],
-        )
-    )
-    non_unique_cats = [cat for (cat, count) in Counter(all_cats).items() if count > 1]
-
-    # prepare the sector hierarchy
-    if non_unique_cats:
-        # if we have non-unique categories present we need the information on
-        # levels within the category hierarchy
-        category_tree = create_category_tree(
-            all_cats_mapping, table, file_info["party"]
-        )
+    unique_mapping = compiled_spec.unique_mapping
+    non_unique_cats = compiled_spec.non_unique_cats
+    category_index = compiled_spec.category_index
 
     # prepare index colum information
     cat_col = table_properties["col_for_categories"]
@@ -509,14 +911,14 @@ def read_crf_table_from_file(  # noqa: PLR0912, PLR0915
     )  # read one row more to check if we reached the end
     # we read with user specific NaN treatment as the NaN treatment is part of
     # the conversion to PRIMAP2 format.
-    df_raw = pd.read_excel(
+    df_raw = read_crf_sheet(
+        excel_input,
         file,
-        sheet_name=table,
+        table,
         skiprows=skiprows,
         nrows=nrows,
-        engine="openpyxl",
-        na_values=nan_values_crf_crt,
-        keep_default_na=False,
+        engine=engine,
+        use_cache=use_cache,
     )
 
     # first drop empty rows
@@ -532,14 +934,14 @@ def read_crf_table_from_file(  # noqa: PLR0912, PLR0915
             table_properties["lastrow"] - skiprows + 1
         )  # read one row more to check if we reached the end
 
-        df_raw = pd.read_excel(
+        df_raw = read_crf_sheet(
+            excel_input,
             file,
-            sheet_name=table,
+            table,
             skiprows=skiprows,
             nrows=nrows,
-            engine="openpyxl",
-            na_values=nan_values_crf_crt,
-            keep_default_na=False,
+            engine=engine,
+            use_cache=use_cache,
         )
 
         df_raw = df_raw.dropna(axis=0, how="all")
@@ -644,51 +1046,48 @@ def read_crf_table_from_file(  # noqa: PLR0912, PLR0915
         df_current[col] = df_current[col].str.strip()
         df_current[col] = df_current[col].replace("\\s+", " ", regex=True)
 
-    # prepare for sector mapping by initializing result lists and
-    # variables
-    new_cats = [[""] * len(table_properties["categories"])] * len(df_current)
+    # get the row headers as strings. The first row holds the units
+    row_headers = [str(value) for value in df_current[cat_col].tolist()]
+    n_rows = len(row_headers)
 
+    # find the end of the table and remove all further rows
+    stop_rows = np.flatnonzero(
+        pd.Series(row_headers[1:]).isin(table_properties["stop_cats"]).to_numpy()
+    )
+    if len(stop_rows) > 0:
+        n_rows_table = stop_rows[0] + 1
+        df_current = df_current.iloc[0:n_rows_table]
+        row_headers = row_headers[0:n_rows_table]
+
+    # prepare for sector mapping by initializing result lists.
     # copy the header rows which are not part of the index (unit)
-    new_cats[0] = [df_current.iloc[0][cat_col]] * len(table_properties["categories"])
+    n_cat_cols = len(table_properties["categories"])
+    header_cats = (df_current[cat_col].iloc[0],) * n_cat_cols
+    new_cats = [header_cats] + [("",) * n_cat_cols] * (len(row_headers) - 1)
 
     # do the sector mapping here as we need to keep track of unmapped categories
     # and also need to consider the order of elements for the mapping
     unknown_categories = []
     info_last_row = []
-    used_ids = []
+    used_ids = set()
     if non_unique_cats:
         # need to initialize the tree parsing.
-        last_parent = category_tree.get_node("root")
-        all_nodes = set(
-            [category_tree.get_node(node).tag for node in category_tree.nodes]
-        )
-
-        for idx in range(1, len(df_current)):
-            current_cat = str(df_current.iloc[idx][cat_col])
-            if current_cat in table_properties["stop_cats"]:
-                # we've reached the end of the table, so stop processing
-                # and remove all further rows
-                df_current = df_current.drop(df_current.index[idx:])
-                new_cats = new_cats[0:idx]
-                break
+        last_parent = "root"
 
+        for idx in range(1, len(row_headers)):
+            current_cat = row_headers[idx]
             # check if current category is a child of the last node
-            children = dict(
-                [
-                    [child.tag, child.identifier]
-                    for child in category_tree.children(last_parent.identifier)
-                ]
-            )
-            if current_cat in children.keys():
+            children = category_index.children[last_parent]
+            if current_cat in children:
                 # the current category is a child of the current parent
-                node = category_tree.get_node(children[current_cat])
+                node = children[current_cat]
                 # check if it has been used already
-                if node.identifier in used_ids:
+                if node in used_ids:
                     # save as unknown
                     print(
                         f"Unknown category '{current_cat}' found in {table} for "
                         f"{file_info['party']}, {file_info['data_year']} "
-                        f"(last parent: {last_parent.tag})."
+                        f"(last parent: {category_index.tags[last_parent]})."
                     )
                     unknown_categories.append(
                         [
@@ -697,16 +1096,15 @@ def read_crf_table_from_file(  # noqa: PLR0912, PLR0915
                             current_cat,
                             file_info["data_year"],
                             idx,
-                            last_parent.tag,
+                            category_index.tags[last_parent],
                         ]
                     )
                 else:
                     # do the mapping
-                    new_cats[idx] = node.data[1]
-                    used_ids.append(node.identifier)
+                    new_cats[idx] = category_index.codes[node]
+                    used_ids.add(node)
                     # check if the node has children
-                    new_children = category_tree.children(node.identifier)
-                    if new_children:
+                    if category_index.children[node]:
                         last_parent = node
 
             # two other possibilities
@@ -714,32 +1112,21 @@ def read_crf_table_from_file(  # noqa: PLR0912, PLR0915
             # 2. It's missing in the hierarchy
             # we have to first move up the hierarchy
             # first check if category is present at all
-            elif current_cat in all_nodes:
+            elif current_cat in category_index.all_tags:
                 old_parent = last_parent
 
-                while (current_cat not in children.keys()) and (
-                    last_parent.identifier != "root"
-                ):
-                    last_parent = category_tree.get_node(
-                        last_parent.predecessor(category_tree.identifier)
-                    )
-                    children = dict(
-                        [
-                            [child.tag, child.identifier]
-                            for child in category_tree.children(last_parent.identifier)
-                        ]
-                    )
+                while (current_cat not in children) and (last_parent != "root"):
+                    last_parent = category_index.parents[last_parent]
+                    children = category_index.children[last_parent]
 
-                if (last_parent.identifier == "root") and (
-                    current_cat not in children.keys()
-                ):
+                if (last_parent == "root") and (current_cat not in children):
                     # we have not found the category as direct child of any of the
                     # predecessors. Thus it is missing in the specification in
                     # that place
                     print(
                         f"Unknown category '{current_cat}' found in {table} for "
                         f"{file_info['party']}, {file_info['data_year']} "
-                        f"(last parent: {old_parent.tag})."
+                        f"(last parent: {category_index.tags[old_parent]})."
                     )
                     unknown_categories.append(
                         [
@@ -748,18 +1135,17 @@ def read_crf_table_from_file(  # noqa: PLR0912, PLR0915
                             current_cat,
                             file_info["data_year"],
                             idx,
-                            last_parent.identifier,
+                            last_parent,
                         ]
                     )
                     # copy back the parent info to continue with next category
                     last_parent = old_parent
                 else:
                     # do the mapping
-                    node = category_tree.get_node(children[current_cat])
-                    new_cats[idx] = node.data[1]
+                    node = children[current_cat]
+                    new_cats[idx] = category_index.codes[node]
                     # check if the node has children
-                    new_children = category_tree.children(node.identifier)
-                    if new_children:
+                    if category_index.children[node]:
                         last_parent = node
             else:
                 print(
@@ -773,48 +1159,48 @@ def read_crf_table_from_file(  # noqa: PLR0912, PLR0915
                         current_cat,
                         file_info["data_year"],
                         idx,
-                        last_parent.identifier,
+                        last_parent,
                     ]
                 )
     else:
-        for idx in range(1, len(df_current)):
-            current_cat = str(df_current.iloc[idx][cat_col])
-            if current_cat in table_properties["stop_cats"]:
-                # we've reached the end of the table, so stop processing
-                # and remove all further rows
-                df_current = df_current.drop(df_current.index[idx:])
-                new_cats = new_cats[0:idx]
-                break
-            else:
-                if idx == len(df_current) - 1:
-                    print(
-                        f"found information in last row: category {current_cat}, "
-                        f"row {idx}"
-                    )
-                    info_last_row.append(
-                        [table, file_info["party"], current_cat, file_info["data_year"]]
-                    )
-                if current_cat in all_cats:
-                    new_cats[idx] = unique_mapping[current_cat]
+        for idx in range(1, len(row_headers)):
+            current_cat = row_headers[idx]
+            if idx == n_rows - 1:
+                print(
+                    f"found information in last row: category {current_cat}, "
+                    f"row {idx}"
+                )
+                info_last_row.append(
+                    [table, file_info["party"], current_cat, file_info["data_year"]]
+                )
+            if current_cat in unique_mapping:
+                new_cats[idx] = unique_mapping[current_cat]
 
-                else:
-                    print(
-                        f"Unknown category '{current_cat}' found in {table} for "
-                        f"{file_info['party']}, {file_info['data_year']}."
-                    )
-                    unknown_categories.append(
-                        [
-                            table,
-                            file_info["party"],
-                            current_cat,
-                            file_info["data_year"],
-                            idx,
-                            "root",
-                        ]
-                    )
+            else:
+                print(
+                    f"Unknown category '{current_cat}' found in {table} for "
+                    f"{file_info['party']}, {file_info['data_year']}."
+                )
+                unknown_categories.append(
+                    [
+                        table,
+                        file_info["party"],
+                        current_cat,
+                        file_info["data_year"],
+                        idx,
+                        "root",
+                    ]
+                )
 
-    for idx, col in enumerate(table_properties["categories"]):
-        df_current.insert(loc=idx, column=col, value=[cat[idx] for cat in new_cats])
+    # add the category columns in front of the data columns
+    df_cats = pd.DataFrame(
+        {
+            col: [cat[idx] for cat in new_cats]
+            for idx, col in enumerate(table_properties["categories"])
+        },
+        index=df_current.index,
+    )
+    df_current = pd.concat([df_cats, df_current], axis=1)
 
     # set index
     df_current = df_current.set_index(index_cols)
@@ -915,34 +1301,36 @@ def get_crf_files(  # noqa: PLR0912, PLR0913
                     for country in country_codes:
                         file_filter = file_filter_template.copy()
                         file_filter["party"] = country
-                        dates = get_submission_dates(folder, file_filter)
+                        dates = get_submission_dates(input_folder_path, file_filter)
                         file_filter["date"] = find_latest_date(dates)
-                        input_files = input_files + filter_filenames(
-                            input_folder_path.glob("*.xlsx"), **file_filter
+                        input_files = input_files + crf_file_index.filter_files(
+                            input_folder_path, **file_filter
                         )
                 else:
                     file_filter = file_filter_template.copy()
                     if date_or_version is not None:
                         file_filter["date"] = date_or_version
-                    input_files = input_files + filter_filenames(
-                        input_folder_path.glob("*.xlsx"), **file_filter
+                    input_files = input_files + crf_file_index.filter_files(
+                        input_folder_path, **file_filter
                     )
             elif submission_type in ["CRT", "CRTAI"]:
                 if date_or_version == "latest":
                     for country in country_codes:
                         file_filter = file_filter_template.copy()
                         file_filter["party"] = country
-                        versions = get_submission_versions(folder, file_filter)
+                        versions = get_submission_versions(
+                            input_folder_path, file_filter
+                        )
                         file_filter["version"] = find_latest_version(versions)
-                        input_files = input_files + filter_filenames(
-                            input_folder_path.glob("*.xlsx"), **file_filter
+                        input_files = input_files + crf_file_index.filter_files(
+                            input_folder_path, **file_filter
                         )
                 else:
                     file_filter = file_filter_template.copy()
                     if date_or_version is not None:
                         file_filter["version"] = date_or_version
-                    input_files = input_files + filter_filenames(
-                        input_folder_path.glob("*.xlsx"), **file_filter
+                    input_files = input_files + crf_file_index.filter_files(
+                        input_folder_path, **file_filter
                     )
             else:
                 raise ValueError(  # noqa: TRY003
@@ -997,24 +1385,15 @@ def get_country_folders(
     data_folder = downloaded_data_path_UNFCCC
     submission_folder = f"{type_folder}{submission_year}"
 
-    with open(data_folder / "folder_mapping.json") as mapping_file:
-        folder_mapping = json.load(mapping_file)
+    folder_mapping = folder_mapping_index.get_mapping(data_folder)
 
     country_folders = []
     for country_code in country_codes:
         if country_code in folder_mapping:
-            new_country_folders = folder_mapping[country_code]
-            if isinstance(new_country_folders, str):
-                # only one folder
-                country_folders = [
-                    *country_folders,
-                    data_folder / new_country_folders / submission_folder,
-                ]
-            else:
-                country_folders = country_folders + [
-                    data_folder / folder / submission_folder
-                    for folder in new_country_folders
-                ]
+            country_folders = country_folders + [
+                data_folder / folder / submission_folder
+                for folder in folder_mapping[country_code]
+            ]
         else:
             raise ValueError(  # noqa: TRY003
                 f"No data folder found for country {country_code}. "
@@ -1211,10 +1590,206 @@ def check_crf_file_info(  # noqa: PLR0911, PLR0912
     return True
 
 
+class CRFFileIndex:
+    """
+    Index of the CRF / CRT files in submission folders
+
+    The file names of the xlsx files in a folder are parsed with
+    `get_info_from_crf_filename` once and the file info is kept in memory, so
+    repeated queries for the same folder (e.g. finding the latest submission and
+    the files of the submission) don't list the folder and parse the file names
+    again. A folder is scanned again if its modification time changed, which
+    happens when files are added, removed, or renamed.
+
+    `scan` indexes all submission folders in one pass. If a `cache_file` is given
+    the index is stored there by `scan` and loaded on first use, so the index can
+    be reused by other processes (e.g. the worker processes or the following doit
+    tasks) which then only have to check the modification times of the folders.
+
+    Parameters
+    ----------
+    cache_file
+        json file to store the index in. If `None` the index is only kept in
+        memory
+    """
+
+    def __init__(self, cache_file: Path | None = None) -> None:
+        self.cache_file = cache_file
+        # folder -> {"mtime_ns": int, "files": [[filename, file_info], ...]}
+        self._folders = None
+
+    def get_file_infos(self, folder: Path) -> list[tuple[Path, dict]]:
+        """
+        Get the files in a folder with their file info
+
+        Parameters
+        ----------
+        folder
+            The folder. It has to exist.
+
+        Returns
+        -------
+            list of the xlsx files in the folder which follow the CRF / CRT file
+            name conventions together with the file info as returned by
+            `get_info_from_crf_filename`
+        """
+        folder = Path(folder)
+        entry = self.get_folder_entry(folder)
+        return [
+            (folder / filename, file_info) for filename, file_info in entry["files"]
+        ]
+
+    def filter_files(self, folder: Path, **file_filter) -> list[Path]:
+        """
+        Get the files in a folder matching a filter
+
+        Returns the same files as `filter_filenames(folder.glob("*.xlsx"),
+        **file_filter)`.
+
+        Parameters
+        ----------
+        folder
+            The folder. It has to exist.
+        file_filter
+            Filter as for `filter_filenames` (keys "party", "data_year",
+            "submission_year", "date", and "version")
+
+        Returns
+        -------
+            list with pathlib Path objects for the files matching the filter
+        """
+        return [
+            file
+            for file, file_info in self.get_file_infos(folder)
+            if check_crf_file_info(file_info, file_filter)
+        ]
+
+    def get_values(
+        self,
+        folder: Path,
+        field: str,
+        file_filter: dict[str, str | int | list],
+    ) -> list:
+        """
+        Get the unique values of a file info field for files matching a filter
+
+        Parameters
+        ----------
+        folder
+            The folder. It has to exist.
+        field
+            The field of the file info, e.g. "date" or "party"
+        file_filter
+            Filter as for `filter_filenames`
+
+        Returns
+        -------
+            list of the unique values
+        """
+        return list(
+            {
+                file_info[field]
+                for _, file_info in self.get_file_infos(folder)
+                if check_crf_file_info(file_info, file_filter)
+            }
+        )
+
+    def get_folder_entry(self, folder: Path) -> dict:
+        """Get the index entry of a folder, (re-)scanning the folder if necessary"""
+        if self._folders is None:
+            self.load()
+        mtime_ns = folder.stat().st_mtime_ns
+        entry = self._folders.get(str(folder))
+        if entry is None or entry["mtime_ns"] != mtime_ns:
+            files = []
+            with os.scandir(folder) as entries:
+                for dir_entry in entries:
+                    if not dir_entry.name.endswith(".xlsx") or dir_entry.is_dir():
+                        continue
+                    try:
+                        file_info = get_info_from_crf_filename(dir_entry.name)
+                    except ValueError:
+                        continue
+                    files.append([dir_entry.name, file_info])
+            entry = {"mtime_ns": mtime_ns, "files": files}
+            self._folders[str(folder)] = entry
+        return entry
+
+    def scan(self, data_folder: Path | None = None) -> int:
+        """
+        Index all submission folders and store the index in the cache file
+
+        The submission folders are the `CRF*`, `CRT*`, and `BTR*` subfolders of the
+        country folders. Folders which have not changed since they were indexed
+        are not scanned again.
+
+        Parameters
+        ----------
+        data_folder
+            Folder with the country folders. Default is
+            `downloaded_data_path_UNFCCC`
+
+        Returns
+        -------
+            number of indexed files
+        """
+        if data_folder is None:
+            data_folder = downloaded_data_path_UNFCCC
+        if self._folders is None:
+            self.load()
+        folders_present = {
+            str(folder)
+            for folder in data_folder.glob("*/*")
+            if folder.name.startswith(("CRF", "CRT", "BTR")) and folder.is_dir()
+        }
+        # remove folders which don't exist any more
+        for folder in list(self._folders):
+            if Path(folder).parent.parent == data_folder and (
+                folder not in folders_present
+            ):
+                del self._folders[folder]
+        n_files = 0
+        for folder in sorted(folders_present):
+            n_files = n_files + len(self.get_folder_entry(Path(folder))["files"])
+        self.save()
+        return n_files
+
+    def load(self) -> None:
+        """Load the index from the cache file (if present)"""
+        self._folders = {}
+        if self.cache_file is None or not self.cache_file.exists():
+            return
+        try:
+            with open(self.cache_file) as index_file:
+                self._folders = json.load(index_file)["folders"]
+        except Exception as ex:
+            print(f"Could not read CRF file index {self.cache_file}: {ex}")
+
+    def save(self) -> None:
+        """Store the index in the cache file (if given)"""
+        if self.cache_file is None or self._folders is None:
+            return
+        # write to a temporary file first so other processes never see partial files
+        self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+            "w", dir=self.cache_file.parent, suffix=".tmp", delete=False
+        ) as temp_file:
+            json.dump({"folders": self._folders}, temp_file)
+        os.replace(temp_file.name, self.cache_file)
+
+    def clear(self) -> None:
+        """Remove all folders from the index (the cache file is not changed)"""
+        self._folders = {}
+
+
+crf_file_index = CRFFileIndex(cache_file=cache_path / "crf_file_index.json")
+
+
 def create_category_tree(
     specification: list[list],
     table: str,
     country: str | None = None,
+    prepared: bool = False,
 ) -> Tree:
     """
     Create a category hierarchy tree from a CRF table specification
@@ -1239,6 +1814,10 @@ def create_category_tree(
         To include them in the tree the country name has to be specified. If no
         country name is given the generic tree will be built.
 
+    prepared: bool (optional, default False)
+        If True the specification has already been prepared for the country by
+        `prep_specification` and is used as is.
+
     """
     # small sanity check on the specification
     if len(specification[0]) < 3:  # noqa: PLR2004
@@ -1263,9 +1842,12 @@ def create_category_tree(
     }
 
     # prep mappings
-    specification_list = prep_specification(
-        specification=specification, country=country
-    )
+    if prepared:
+        specification_list = specification
+    else:
+        specification_list = prep_specification(
+            specification=specification, country=country
+        )
 
     # build a tree from specification
     # when looping over the categories present in the table
@@ -1331,6 +1913,275 @@ def create_category_tree(
     return category_tree
 
 
+@dataclass(frozen=True)
+class CompiledTableSpecification:
+    """
+    Country specific mapping information derived from a table specification
+
+    Attributes
+    ----------
+    sector_mapping
+        The `sector_mapping` of the table specification prepared by
+        `prep_specification` for the country
+    unique_mapping
+        Mapping from category names which are unique in the table to the category
+        codes
+    non_unique_cats
+        Category names which are present more than once in the table
+    category_index
+        The compiled category hierarchy (only if non-unique categories are present,
+        None otherwise)
+    """
+
+    sector_mapping: tuple[tuple, ...]
+    unique_mapping: Mapping[str, tuple]
+    non_unique_cats: frozenset[str]
+    category_index: "CategoryIndex | None"
+
+
+compiled_table_specification_cache: dict[
+    tuple[str, str | None, str], CompiledTableSpecification
+] = {}
+compiled_table_specification_cache_max_size = 1024
+
+
+def get_specification_digest(specification: list[list]) -> str:
+    """
+    Get a digest of the content of a `sector_mapping` specification
+
+    Parameters
+    ----------
+    specification: List[List]
+        The `sector_mapping` of a table specification
+
+    Returns
+    -------
+        sha256 hex digest of the representation of the specification
+    """
+    return hashlib.sha256(repr(specification).encode()).hexdigest()
+
+
+def get_compiled_table_specification(
+    table_spec: dict[str, dict],
+    table: str,
+    country: str | None = None,
+) -> CompiledTableSpecification:
+    """
+    Get the country specific mapping information for a table specification
+
+    The country filtered mapping, the unique category mapping, the set of non-unique
+    categories, and the category hierarchy only depend on the specification, the
+    table and the country. They are computed once and cached, so they are shared
+    for all files and years read for a country.
+
+    The cache is keyed by the content of the `sector_mapping` of the table
+    specification (see `get_specification_digest`), so changed specifications are
+    compiled again. If the cache holds more than
+    `compiled_table_specification_cache_max_size` entries the oldest are removed.
+
+    Parameters
+    ----------
+    table_spec: Dict[str, Dict]
+        Specification for the given table, e.g. CRF2021["Table4"]
+    table: str
+        Name of the table
+    country: str (optional)
+        Country to compile the specification for
+
+    Returns
+    -------
+        CompiledTableSpecification for the table and country
+
+    """
+    specification = table_spec["sector_mapping"]
+    key = (table, country, get_specification_digest(specification))
+    compiled_spec = compiled_table_specification_cache.get(key)
+    if compiled_spec is None:
+        compiled_spec = compile_table_specification(specification, table, country)
+        cache_compiled_table_specification(key, compiled_spec)
+    return compiled_spec
+
+
+def cache_compiled_table_specification(
+    key: tuple[str, str | None, str],
+    compiled_spec: CompiledTableSpecification,
+) -> None:
+    """Add a compiled specification to the cache and remove the oldest entries"""
+    compiled_table_specification_cache.pop(key, None)
+    while (
+        len(compiled_table_specification_cache)
+        >= compiled_table_specification_cache_max_size
+    ):
+        del compiled_table_specification_cache[
+            next(iter(compiled_table_specification_cache))
+        ]
+    compiled_table_specification_cache[key] = compiled_spec
+
+
+def compile_table_specification(
+    specification: list[list],
+    table: str,
+    country: str | None = None,
+    with_category_index: bool = False,
+) -> CompiledTableSpecification:
+    """
+    Compile the country specific mapping information for a table specification
+
+    Use `get_compiled_table_specification` to get cached results.
+
+    Parameters
+    ----------
+    specification: List[List]
+        The `sector_mapping` of a table specification
+    table: str
+        Name of the table
+    country: str (optional)
+        Country to compile the specification for
+    with_category_index: bool (optional, default False)
+        If True the category index is also created if all categories are unique
+
+    Returns
+    -------
+        CompiledTableSpecification for the table and country
+
+    """
+    specification_list = prep_specification(
+        specification=specification, country=country
+    )
+    cat_counts = Counter([mapping[0][0] for mapping in specification_list])
+    unique_mapping = {
+        mapping[0][0]: tuple(mapping[1])
+        for mapping in specification_list
+        if cat_counts[mapping[0][0]] == 1
+    }
+    non_unique_cats = frozenset(cat for (cat, count) in cat_counts.items() if count > 1)
+
+    if non_unique_cats or with_category_index:
+        # if we have non-unique categories present we need the information on
+        # levels within the category hierarchy
+        category_tree = create_category_tree(
+            specification_list, table, country, prepared=True
+        )
+        category_index = create_category_index(category_tree)
+    else:
+        category_index = None
+
+    return CompiledTableSpecification(
+        sector_mapping=tuple(tuple(mapping) for mapping in specification_list),
+        unique_mapping=MappingProxyType(unique_mapping),
+        non_unique_cats=non_unique_cats,
+        category_index=category_index,
+    )
+
+
+@dataclass(frozen=True)
+class CategoryIndex:
+    """
+    Compiled category hierarchy of a CRF table specification
+
+    Lookup tables derived from the category tree created by `create_category_tree`.
+    They are used to parse the row headers of tables with non-unique categories
+    without walking the tree for every row. Node identifiers are the same as in the
+    category tree (the position in the specification and "root" for the root node).
+
+    Attributes
+    ----------
+    children
+        For each node a mapping from the category names (tags) of its children to
+        their identifiers
+    parents
+        The parent identifier for each node except the root node
+    tags
+        The category name for each node
+    codes
+        The category codes the row header of each node is mapped to
+    all_tags
+        Category names of all nodes in the tree
+    """
+
+    children: Mapping[int | str, Mapping[str, int]]
+    parents: Mapping[int, int | str]
+    tags: Mapping[int | str, str]
+    codes: Mapping[int, tuple]
+    all_tags: frozenset[str]
+
+
+def create_category_index(category_tree: Tree) -> CategoryIndex:
+    """
+    Compile a category tree into a `CategoryIndex`
+
+    Parameters
+    ----------
+    category_tree: Tree
+        category tree as created by `create_category_tree`
+
+    Returns
+    -------
+        CategoryIndex with lookup tables for the tree
+
+    """
+    children = {}
+    parents = {}
+    tags = {}
+    codes = {}
+    for identifier, node in category_tree.nodes.items():
+        # if several children have the same tag the last one is used
+        children[identifier] = MappingProxyType(
+            {
+                child.tag: child.identifier
+                for child in category_tree.children(identifier)
+            }
+        )
+        tags[identifier] = node.tag
+        if identifier != category_tree.root:
+            parents[identifier] = node.predecessor(category_tree.identifier)
+            codes[identifier] = tuple(node.data[1])
+
+    return CategoryIndex(
+        children=MappingProxyType(children),
+        parents=MappingProxyType(parents),
+        tags=MappingProxyType(tags),
+        codes=MappingProxyType(codes),
+        all_tags=frozenset(tags.values()),
+    )
+
+
+def get_category_index(
+    specification: list[list],
+    table: str,
+    country: str | None = None,
+) -> CategoryIndex:
+    """
+    Get the compiled category hierarchy for a table specification and country
+
+    The `CategoryIndex` is part of the compiled table specification and shares its
+    cache (see `get_compiled_table_specification`), so it's created once for each
+    combination of specification, table and country.
+
+    Parameters
+    ----------
+    specification: List[List]
+        The `sector_mapping` dict of a table specification
+    table: str
+        Name of the table
+    country: str (optional)
+        Country to build the category hierarchy for
+
+    Returns
+    -------
+        CategoryIndex for the specification
+
+    """
+    key = (table, country, get_specification_digest(specification))
+    compiled_spec = compiled_table_specification_cache.get(key)
+    if compiled_spec is None or compiled_spec.category_index is None:
+        compiled_spec = compile_table_specification(
+            specification, table, country, with_category_index=True
+        )
+        cache_compiled_table_specification(key, compiled_spec)
+    return compiled_spec.category_index
+
+
 def prep_specification(
     specification: list[list],
     country: str | None = None,
@@ -1370,9 +2221,14 @@ def prep_specification(
 
 
 def listify(mapping: list) -> list:
-    """Make sure first item of mapping is a list"""
+    """
+    Make sure first item of mapping is a list
+
+    The mapping is not modified. If the first item has to be converted, a new
+    mapping is returned.
+    """
     if isinstance(mapping[0], str):
-        mapping[0] = [mapping[0]]
+        mapping = [[mapping[0]], *mapping[1:]]
     elif isinstance(mapping[0], list):
         pass
     else:
@@ -1459,8 +2315,7 @@ def get_latest_date_for_country(
     -------
         str: string with date_or_version / version
     """
-    with open(downloaded_data_path_UNFCCC / "folder_mapping.json") as mapping_file:
-        folder_mapping = json.load(mapping_file)
+    folder_mapping = folder_mapping_index.get_mapping(downloaded_data_path_UNFCCC)
 
     if country_code in folder_mapping:
         file_filter = {
@@ -1487,12 +2342,12 @@ def get_latest_date_for_country(
             raise ValueError("Type must be CRF, CRT, or CRTAI")  # noqa: TRY003
 
         country_folders = folder_mapping[country_code]
-        if isinstance(country_folders, str):
+        if len(country_folders) == 1:
             # only one folder
             submission_date = find_latest_date(
                 get_submission_dates(
                     downloaded_data_path_UNFCCC
-                    / country_folders
+                    / country_folders[0]
                     / f"{type_folder}{submission_year}",
                     file_filter,
                 ),
@@ -1540,8 +2395,7 @@ def get_latest_version_for_country(
     -------
         str: string with date_or_version / version
     """
-    with open(downloaded_data_path_UNFCCC / "folder_mapping.json") as mapping_file:
-        folder_mapping = json.load(mapping_file)
+    folder_mapping = folder_mapping_index.get_mapping(downloaded_data_path_UNFCCC)
 
     if country_code in folder_mapping:
         file_filter = {
@@ -1555,11 +2409,11 @@ def get_latest_version_for_country(
             subfolder = f"CRT{submission_round}"
         else:
             raise ValueError("Type must be CRT or CRTAI")  # noqa: TRY003
-        if isinstance(country_folders, str):
+        if len(country_folders) == 1:
             # only one folder
             submission_version = find_latest_version(
                 get_submission_versions(
-                    downloaded_data_path_UNFCCC / country_folders / subfolder,
+                    downloaded_data_path_UNFCCC / country_folders[0] / subfolder,
                     file_filter,
                 ),
             )
@@ -1608,13 +2462,10 @@ def get_submission_dates(
         )
 
     if folder.exists():
-        files = filter_filenames(folder.glob("*.xlsx"), **file_filter)
+        dates = crf_file_index.get_values(folder, "date", file_filter)
     else:
         raise ValueError(f"Folder {folder} does not exist")  # noqa: TRY003
 
-    dates = [get_info_from_crf_filename(file.name)["date"] for file in files]
-    dates = list(set(dates))
-
     return dates
 
 
@@ -1656,14 +2507,11 @@ def get_submission_versions(
         )
 
     if folder.exists():
-        files = filter_filenames(folder.glob("*.xlsx"), **file_filter)
+        versions = crf_file_index.get_values(folder, "version", file_filter)
     else:
         raise ValueError(f"Folder {folder} does not exist")  # noqa: TRY003
 
-    dates = [get_info_from_crf_filename(file.name)["version"] for file in files]
-    dates = list(set(dates))
-
-    return dates
+    return versions
 
 
 def get_submission_parties(
@@ -1693,13 +2541,10 @@ def get_submission_parties(
         )
 
     if folder.exists():
-        files = filter_filenames(list(folder.glob("*.xlsx")), **file_filter)
+        parties = crf_file_index.get_values(folder, "party", file_filter)
     else:
         raise ValueError(f"Folder {folder} does not exist")  # noqa: TRY003
 
-    parties = [get_info_from_crf_filename(file.name)["party"] for file in files]
-    parties = list(set(parties))
-
     return parties
 
 
@@ -15,7 +15,12 @@ import pandas as pd
 import primap2 as pm2
 import xarray as xr
 
-from unfccc_ghg_data.helper import all_countries, get_country_name, log_path
+from unfccc_ghg_data.helper import (
+    DatasetCombiner,
+    all_countries,
+    get_country_name,
+    log_path,
+)
 
 from . import crf_specifications as crf
 from .unfccc_crf_reader_core import (
@@ -27,12 +32,13 @@ from .unfccc_crf_reader_core import (
 from .util import all_crf_countries
 
 
-def read_year_to_test_specs(  # noqa: PLR0912, PLR0915
+def read_year_to_test_specs(  # noqa: PLR0912, PLR0913, PLR0915
     submission_year: int,
     data_year: int | None = None,
     submission_type: str = "CRF",
     totest: bool | None = False,
     country_code: str | None = None,
+    use_cache: bool = True,
 ) -> xr.Dataset:
     """
     Read on file per country
@@ -52,6 +58,10 @@ def read_year_to_test_specs(  # noqa: PLR0912, PLR0915
         if true only read tables with "totest" status
     country_code
         country to read. If not given all countries will be read
+    use_cache
+        if true (default) use the on-disk cache of parsed worksheets, so
+        re-reading after changing a specification doesn't have to parse the xlsx
+        files again
 
     Returns
     -------
@@ -77,7 +87,7 @@ def read_year_to_test_specs(  # noqa: PLR0912, PLR0915
     empty_tables = []
     missing_worksheets = []
     skipped_files = []
-    ds_all = None
+    combiner = DatasetCombiner()
     print(
         f"{submission_type} test reading for {submission_type}{submission_year}. "
         f"Using data year {data_year}"
@@ -188,6 +198,7 @@ def read_year_to_test_specs(  # noqa: PLR0912, PLR0915
                         data_year=[data_year],
                         debug=True,
                         submission_type=submission_type,
+                        use_cache=use_cache,
                     )
 
                     # collect messages on unknown rows etc
@@ -291,10 +302,7 @@ def read_year_to_test_specs(  # noqa: PLR0912, PLR0915
                                 ds_table_pm2["CH4"].attrs["entity"] = "CH4"
 
                             # combine per table DS
-                            if ds_all is None:
-                                ds_all = ds_table_pm2
-                            else:
-                                ds_all = ds_all.combine_first(ds_table_pm2)
+                            combiner.add(ds_table_pm2)
                         else:
                             empty_tables.append(
                                 [table, current_country_code, data_year]
@@ -318,6 +326,8 @@ def read_year_to_test_specs(  # noqa: PLR0912, PLR0915
                     exceptions.append(f"Error: {country_name}: {message}")
                     pass
 
+    ds_all = combiner.result()
+
     # process log messages.
     today = date.today()
     output_folder = log_path / f"test_read_{submission_type}{submission_year}"
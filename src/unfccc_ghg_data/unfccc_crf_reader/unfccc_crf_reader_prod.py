@@ -2,16 +2,29 @@
 Functions for CRF/CRT reading - productions functions for full reading
 """
 
+import contextlib
+import hashlib
+import io
+import json
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 from datetime import date
+from itertools import repeat
+from pathlib import Path
 from typing import Optional, Union
 
 import datalad.api
+import numpy as np
+import pandas as pd
 import primap2 as pm2
 import xarray as xr
 
 from unfccc_ghg_data.helper import (
+    DatasetCombiner,
     all_countries,
     code_path,
+    compression,
     custom_country_mapping,
     extracted_data_path_UNFCCC,
     get_country_code,
@@ -21,12 +34,15 @@ from unfccc_ghg_data.helper import (
 )
 
 from . import crf_specifications as crf
+from .unfccc_crf_reader_cache import get_crf_file_key
 from .unfccc_crf_reader_core import (
     convert_crf_table_to_pm2if,
+    crf_file_index,
+    find_crf_input_files,
     get_crf_files,
     get_latest_date_for_country,
     get_latest_version_for_country,
-    read_crf_table,
+    read_crf_tables,
 )
 from .unfccc_crf_reader_devel import (
     save_empty_tables_info,
@@ -36,6 +52,15 @@ from .unfccc_crf_reader_devel import (
 )
 from .util import NoCRFFilesError, all_crf_countries
 
+# log information collected per table
+crf_table_logs = [
+    "unknown_categories",
+    "last_row_info",
+    "skipped_files",
+    "empty_tables",
+    "missing_worksheets",
+]
+
 # functions:
 # * testing fucntions
 # ** read one or more table(s) for all countries
@@ -58,6 +83,8 @@ def read_crf_for_country(  # noqa: PLR0912, PLR0913, PLR0915
     re_read: Optional[bool] = True,
     submission_type: str = "CRF",
     debug: bool = False,
+    n_workers: int = 1,
+    incremental: bool = False,
 ) -> xr.Dataset:
     """
     Read for given submission year and country.
@@ -98,6 +125,15 @@ def read_crf_for_country(  # noqa: PLR0912, PLR0913, PLR0915
         Read CRF, CRT, or CRTAI
     debug: bool, default False
         Debug output
+    n_workers: int, default 1
+        Number of processes used to read the input files (one per data year) in
+        parallel
+    incremental: bool, default False
+        Store the result for each table and only read tables again where the
+        specification or the input files have changed since they were last read.
+        The per table results are stored in the folder
+        '<country_code>_<type><year>_<date_or_version>_tables' next to the
+        output files
 
     Returns
     -------
@@ -172,130 +208,110 @@ def read_crf_for_country(  # noqa: PLR0912, PLR0913, PLR0915
         empty_tables = []
         missing_worksheets = []
         skipped_files = []
-        for table in tables:
-            # read table for all years
-            (
-                ds_table,
-                new_unknown_categories,
-                new_last_row_info,
-                not_present,
-                new_skipped_files,
-            ) = read_crf_table(
+        if submission_type == "CRF":
+            meta_data_input = {
+                "title": f"CRF data submitted in {submission_year} to the "
+                f"UNFCCC in the {type_name} ({submission_type}) by "
+                f"{country_name}. "
+                f"Submission date: {date_or_version}"
+            }
+        elif submission_type == "CRT":
+            meta_data_input = {
+                "title": f"Data submitted for round {submission_year} "
+                f"to the UNFCCC in the {type_name} ({submission_type}) by "
+                f"{country_name}. Submission version: {date_or_version}"
+            }
+        else:
+            meta_data_input = {
+                "title": f"National Invetory data submitted in "
+                f"{submission_year} to the UNFCCC in the {type_name} "
+                f"({submission_type}) by {country_name}. "
+                f"Submission version: {date_or_version}"
+            }
+
+        # for incremental reading we only read the tables where the specification
+        # or input files changed since they were last read
+        tables_to_read = tables
+        if incremental:
+            table_folder = get_crf_table_folder(
                 country_code,
-                table,
-                submission_year,
+                country_name,
+                submission_year=submission_year,
                 date_or_version=date_or_version,
                 submission_type=submission_type,
             )
-
-            # collect messages on unknown rows etc
-            unknown_categories = unknown_categories + new_unknown_categories
-            last_row_info = last_row_info + new_last_row_info
-            skipped_files = skipped_files + new_skipped_files
-
-            if ds_table is not None:
-                # convert to PRIMAP2 IF
-                # first drop the orig_cat_name col as it can have multiple values for
-                # one category
-                ds_table = ds_table.drop(columns=["orig_cat_name"])
-
-                # if we need to map entities pass this info to the conversion function
-                if "entity_mapping" in crf_spec[table]:
-                    entity_mapping = crf_spec[table]["entity_mapping"]
-                else:
-                    entity_mapping = None
-                if submission_type == "CRF":
-                    meta_data_input = {
-                        "title": f"CRF data submitted in {submission_year} to the "
-                        f"UNFCCC in the {type_name} ({submission_type}) by "
-                        f"{country_name}. "
-                        f"Submission date: {date_or_version}"
-                    }
-                elif submission_type == "CRT":
-                    meta_data_input = {
-                        "title": f"Data submitted for round {submission_year} "
-                        f"to the UNFCCC in the {type_name} ({submission_type}) by "
-                        f"{country_name}. Submission version: {date_or_version}"
-                    }
-                else:
-                    meta_data_input = {
-                        "title": f"National Invetory data submitted in "
-                        f"{submission_year} to the UNFCCC in the {type_name} "
-                        f"({submission_type}) by {country_name}. "
-                        f"Submission version: {date_or_version}"
-                    }
-                if "decimal_sep" in crf_spec[table]["table"]:
-                    decimal_sep = crf_spec[table]["table"]["decimal_sep"]
-                else:
-                    decimal_sep = "."
-                if "thousands_sep" in crf_spec[table]["table"]:
-                    thousands_sep = crf_spec[table]["table"]["thousands_sep"]
-                else:
-                    thousands_sep = ","
-
-                ds_table_if = convert_crf_table_to_pm2if(
-                    ds_table,
-                    submission_year,
-                    meta_data_input=meta_data_input,
-                    entity_mapping=entity_mapping,
-                    submission_type=submission_type,
-                    decimal_sep=decimal_sep,
-                    thousands_sep=thousands_sep,
+            input_files = find_crf_input_files(
+                country_codes=[country_code],
+                submission_year=submission_year,
+                date_or_version=date_or_version,
+                submission_type=submission_type,
+            )
+            # the file keys (with the file hashes) are the same for all tables
+            input_files_key = get_crf_input_files_key(input_files)
+            fingerprints = {
+                table: get_crf_table_fingerprint(
+                    crf_spec[table], input_files_key, meta_data_input
+                )
+                for table in tables
+            }
+            table_info = load_crf_table_info(table_folder)
+            tables_to_read = [
+                table
+                for table in tables
+                if not crf_table_is_up_to_date(
+                    table, fingerprints[table], table_info, table_folder
                 )
+            ]
+            print(
+                f"Reading {len(tables_to_read)} of {len(tables)} tables. "
+                f"Tables to read: {tables_to_read}"
+            )
 
-                # skip empty tables
-                if (
-                    not ds_table_if.set_index(ds_table_if.attrs["dimensions"]["*"])
-                    .isna()
-                    .all(axis=None)
-                ):
-                    # now convert to native PRIMAP2 format
-                    ds_table_pm2 = pm2.pm2io.from_interchange_format(ds_table_if)
-
-                    # if individual data for emissions and removals / recovery exist
-                    # combine them
-                    if (
-                        ("CO2 removals" in ds_table_pm2.data_vars)
-                        and ("CO2 emissions" in ds_table_pm2.data_vars)
-                        and "CO2" not in ds_table_pm2.data_vars
-                    ):
-                        # we can just sum to CO2 as we made sure that it doesn't exist.
-                        # If we have CO2 and removals but not emissions, CO2 already has
-                        # removals subtracted and we do nothing here
-                        ds_table_pm2["CO2"] = ds_table_pm2[
-                            ["CO2 emissions", "CO2 removals"]
-                        ].pr.sum(dim="entity", skipna=True, min_count=1)
-                        ds_table_pm2["CO2"].attrs["entity"] = "CO2"
-
-                    if (
-                        ("CH4 removals" in ds_table_pm2.data_vars)
-                        and ("CH4 emissions" in ds_table_pm2.data_vars)
-                        and "CH4" not in ds_table_pm2.data_vars
-                    ):
-                        # we can just sum to CH4 as we made sure that it doesn't exist.
-                        # If we have CH4 and removals but not emissions, CH4 already has
-                        # removals subtracted and we do nothing here
-                        ds_table_pm2["CH4"] = ds_table_pm2[
-                            ["CH4 emissions", "CH4 removals"]
-                        ].pr.sum(dim="entity", skipna=True, min_count=1)
-                        ds_table_pm2["CH4"].attrs["entity"] = "CH4"
-
-                    # combine per table DS
-                    if ds_all is None:
-                        ds_all = ds_table_pm2
-                    else:
-                        ds_all = ds_all.combine_first(ds_table_pm2)
-                else:
-                    # log that table is empty
-                    empty_tables.append([table, country_code, ""])
-            elif not_present:
-                # log that table is not present
-                missing_worksheets.append([table, country_code, ""])
+        # read all tables for all years. Each input file is opened only once
+        if tables_to_read:
+            tables_read = read_crf_tables(
+                country_code,
+                tables_to_read,
+                submission_year,
+                date_or_version=date_or_version,
+                submission_type=submission_type,
+                n_workers=n_workers,
+            )
+        combiner = DatasetCombiner()
+        for table in tables:
+            if table not in tables_to_read:
+                # use the stored results from the last reading
+                table_result = load_crf_table_result(table, table_info, table_folder)
             else:
-                print(
-                    f"Empty DataFrame returned for table {table}, "
-                    f"country {country_code}. Check log for errors."
+                table_result = process_crf_table(
+                    tables_read[table],
+                    table,
+                    crf_spec[table],
+                    country_code,
+                    submission_year=submission_year,
+                    submission_type=submission_type,
+                    meta_data_input=meta_data_input,
                 )
+                if incremental:
+                    save_crf_table_result(
+                        table,
+                        table_result,
+                        fingerprints[table],
+                        table_info,
+                        table_folder,
+                    )
+
+            # collect messages on unknown rows etc
+            unknown_categories = unknown_categories + table_result["unknown_categories"]
+            last_row_info = last_row_info + table_result["last_row_info"]
+            skipped_files = skipped_files + table_result["skipped_files"]
+            empty_tables = empty_tables + table_result["empty_tables"]
+            missing_worksheets = missing_worksheets + table_result["missing_worksheets"]
+
+            # combine per table DS
+            combiner.add(table_result["data"])
+
+        ds_all = combiner.result()
 
         # check if there were log messages.
         save_data = True
@@ -368,7 +384,6 @@ def read_crf_for_country(  # noqa: PLR0912, PLR0913, PLR0915
             save_skipped_files_info(skipped_files, log_location)
 
         if save_data:
-            compression = dict(zlib=True, complevel=9)
             output_folder = extracted_data_path_UNFCCC / country_name.replace(" ", "_")
             # TODO: function that creates the filename so if we modify something it's
             #  modified everywhere (but will break old data, so better keep file name)
@@ -394,12 +409,403 @@ def read_crf_for_country(  # noqa: PLR0912, PLR0913, PLR0915
     return ds_all
 
 
-def read_crf_for_country_datalad(
+def process_crf_table(  # noqa: PLR0912, PLR0913
+    table_read: tuple[pd.DataFrame | None, list[list], list[list], bool, list[list]],
+    table: str,
+    table_spec: dict[str, dict],
+    country_code: str,
+    submission_year: int,
+    submission_type: str,
+    meta_data_input: dict[str, str],
+) -> dict:
+    """
+    Convert a read CRF table to the native PRIMAP2 format and collect log information
+
+    Parameters
+    ----------
+    table_read: tuple
+        Return value of `read_crf_table` (or the value for the table in the result of
+        `read_crf_tables`)
+    table: str
+        Name of the table
+    table_spec: Dict[str, Dict]
+        Specification for the given table, e.g. CRF2021["Table4"]
+    country_code: str
+        ISO 3-letter country code
+    submission_year: int
+        Year of the submission of the data
+    submission_type: str
+        CRF, CRT, or CRTAI
+    meta_data_input: dict[str, str]
+        Meta data passed to `convert_crf_table_to_pm2if`
+
+    Returns
+    -------
+        dict with the data in native PRIMAP2 format ("data", None if there is no
+        data) and the log information ("unknown_categories", "last_row_info",
+        "skipped_files", "empty_tables", and "missing_worksheets")
+
+    """
+    (
+        ds_table,
+        unknown_categories,
+        last_row_info,
+        not_present,
+        skipped_files,
+    ) = table_read
+
+    ds_table_pm2 = None
+    empty_tables = []
+    missing_worksheets = []
+    if ds_table is not None:
+        # convert to PRIMAP2 IF
+        # first drop the orig_cat_name col as it can have multiple values for
+        # one category
+        ds_table = ds_table.drop(columns=["orig_cat_name"])
+
+        # if we need to map entities pass this info to the conversion function
+        if "entity_mapping" in table_spec:
+            entity_mapping = table_spec["entity_mapping"]
+        else:
+            entity_mapping = None
+        if "decimal_sep" in table_spec["table"]:
+            decimal_sep = table_spec["table"]["decimal_sep"]
+        else:
+            decimal_sep = "."
+        if "thousands_sep" in table_spec["table"]:
+            thousands_sep = table_spec["table"]["thousands_sep"]
+        else:
+            thousands_sep = ","
+
+        ds_table_if = convert_crf_table_to_pm2if(
+            ds_table,
+            submission_year,
+            meta_data_input=meta_data_input,
+            entity_mapping=entity_mapping,
+            submission_type=submission_type,
+            decimal_sep=decimal_sep,
+            thousands_sep=thousands_sep,
+        )
+
+        # skip empty tables
+        if (
+            not ds_table_if.set_index(ds_table_if.attrs["dimensions"]["*"])
+            .isna()
+            .all(axis=None)
+        ):
+            # now convert to native PRIMAP2 format
+            ds_table_pm2 = pm2.pm2io.from_interchange_format(ds_table_if)
+
+            # if individual data for emissions and removals / recovery exist
+            # combine them
+            if (
+                ("CO2 removals" in ds_table_pm2.data_vars)
+                and ("CO2 emissions" in ds_table_pm2.data_vars)
+                and "CO2" not in ds_table_pm2.data_vars
+            ):
+                # we can just sum to CO2 as we made sure that it doesn't exist.
+                # If we have CO2 and removals but not emissions, CO2 already has
+                # removals subtracted and we do nothing here
+                ds_table_pm2["CO2"] = ds_table_pm2[
+                    ["CO2 emissions", "CO2 removals"]
+                ].pr.sum(dim="entity", skipna=True, min_count=1)
+                ds_table_pm2["CO2"].attrs["entity"] = "CO2"
+
+            if (
+                ("CH4 removals" in ds_table_pm2.data_vars)
+                and ("CH4 emissions" in ds_table_pm2.data_vars)
+                and "CH4" not in ds_table_pm2.data_vars
+            ):
+                # we can just sum to CH4 as we made sure that it doesn't exist.
+                # If we have CH4 and removals but not emissions, CH4 already has
+                # removals subtracted and we do nothing here
+                ds_table_pm2["CH4"] = ds_table_pm2[
+                    ["CH4 emissions", "CH4 removals"]
+                ].pr.sum(dim="entity", skipna=True, min_count=1)
+                ds_table_pm2["CH4"].attrs["entity"] = "CH4"
+        else:
+            # log that table is empty
+            empty_tables.append([table, country_code, ""])
+    elif not_present:
+        # log that table is not present
+        missing_worksheets.append([table, country_code, ""])
+    else:
+        print(
+            f"Empty DataFrame returned for table {table}, "
+            f"country {country_code}. Check log for errors."
+        )
+
+    return {
+        "data": ds_table_pm2,
+        "unknown_categories": unknown_categories,
+        "last_row_info": last_row_info,
+        "skipped_files": skipped_files,
+        "empty_tables": empty_tables,
+        "missing_worksheets": missing_worksheets,
+    }
+
+
+def get_crf_table_folder(
+    country_code: str,
+    country_name: str,
+    submission_year: int,
+    date_or_version: str,
+    submission_type: str = "CRF",
+) -> Path:
+    """
+    Get the folder for the per table results used for incremental reading
+
+    Parameters
+    ----------
+    country_code: str
+        3 letter country code
+    country_name: str
+        Name of the country
+    submission_year: int
+        year of submissions for CRF or submission round for CRT
+    date_or_version
+        date of submission (CRF) or version (CRT/BTR) (as in the filename)
+    submission_type: str: default "CRF"
+        CRF or CRT
+
+    Returns
+    -------
+        Path of the folder (which might not exist)
+
+    """
+    output_folder = extracted_data_path_UNFCCC / country_name.replace(" ", "_")
+    return (
+        output_folder
+        / f"{country_code}_{submission_type}{submission_year}_{date_or_version}_tables"
+    )
+
+
+def get_crf_input_files_key(input_files: list[Path]) -> list[str]:
+    """
+    Get the keys identifying the content of the input files of a country
+
+    The keys are computed once per country and used for the fingerprints of all
+    tables (see `get_crf_table_fingerprint`).
+
+    Parameters
+    ----------
+    input_files: list[Path]
+        The xlsx files the tables are read from
+
+    Returns
+    -------
+        list[str]: sorted list of file name and key (see `get_crf_file_key`)
+
+    """
+    return sorted(f"{file.name}:{get_crf_file_key(file)}" for file in input_files)
+
+
+def get_crf_table_fingerprint(
+    table_spec: dict[str, dict],
+    input_files_key: list[str],
+    meta_data_input: dict[str, str],
+) -> str:
+    """
+    Compute a fingerprint for reading a CRF table
+
+    The fingerprint changes if the table specification, the content of any of the
+    input files or the meta data changes.
+
+    Parameters
+    ----------
+    table_spec: Dict[str, Dict]
+        Specification for the given table, e.g. CRF2021["Table4"]
+    input_files_key: list[str]
+        Keys of the xlsx files the table is read from as returned by
+        `get_crf_input_files_key`
+    meta_data_input: dict[str, str]
+        Meta data passed to `convert_crf_table_to_pm2if`
+
+    Returns
+    -------
+        str: sha256 hash of the information
+
+    """
+    fingerprint_input = "|".join(
+        [repr(table_spec), repr(input_files_key), repr(meta_data_input)]
+    )
+    return hashlib.sha256(fingerprint_input.encode()).hexdigest()
+
+
+def load_crf_table_info(table_folder: Path) -> dict[str, dict]:
+    """
+    Load the fingerprints and log information of the stored per table results
+
+    Parameters
+    ----------
+    table_folder: Path
+        folder with the per table results (see `get_crf_table_folder`)
+
+    Returns
+    -------
+        dict with the table names as keys and dicts with the fingerprint and log
+        information as values. Empty if no tables have been stored.
+
+    """
+    info_file = table_folder / "tables.json"
+    if not info_file.exists():
+        return {}
+    with open(info_file) as table_info_file:
+        return json.load(table_info_file)
+
+
+def crf_table_is_up_to_date(
+    table: str,
+    fingerprint: str,
+    table_info: dict[str, dict],
+    table_folder: Path,
+) -> bool:
+    """
+    Check if the stored result for a table can be used
+
+    Parameters
+    ----------
+    table: str
+        Name of the table
+    fingerprint: str
+        fingerprint for the table computed with `get_crf_table_fingerprint`
+    table_info: dict[str, dict]
+        information on stored tables as returned by `load_crf_table_info`
+    table_folder: Path
+        folder with the per table results
+
+    Returns
+    -------
+        True if the stored result has been read with the same fingerprint
+
+    """
+    if table not in table_info:
+        return False
+    if table_info[table]["fingerprint"] != fingerprint:
+        return False
+    if table_info[table]["has_data"]:
+        return (table_folder / table_info[table]["file"]).exists()
+    return True
+
+
+def save_crf_table_result(
+    table: str,
+    table_result: dict,
+    fingerprint: str,
+    table_info: dict[str, dict],
+    table_folder: Path,
+) -> None:
+    """
+    Save the result for a single table for incremental reading
+
+    The data is stored as netcdf file, the fingerprint and the log information
+    are added to `table_info` which is written to tables.json in `table_folder`.
+
+    Parameters
+    ----------
+    table: str
+        Name of the table
+    table_result: dict
+        result of `process_crf_table`
+    fingerprint: str
+        fingerprint for the table computed with `get_crf_table_fingerprint`
+    table_info: dict[str, dict]
+        information on stored tables as returned by `load_crf_table_info`.
+        Updated in place.
+    table_folder: Path
+        folder with the per table results
+
+    """
+    table_folder.mkdir(parents=True, exist_ok=True)
+    table_file = f"{table.replace(' ', '_')}.nc"
+    if table_result["data"] is not None:
+        encoding = {var: compression for var in table_result["data"].data_vars}
+        table_result["data"].pr.to_netcdf(table_folder / table_file, encoding=encoding)
+    else:
+        (table_folder / table_file).unlink(missing_ok=True)
+
+    table_info[table] = {
+        "fingerprint": fingerprint,
+        "has_data": table_result["data"] is not None,
+        "file": table_file,
+    }
+    for log in crf_table_logs:
+        table_info[table][log] = convert_to_json_types(table_result[log])
+    with open(table_folder / "tables.json", "w") as table_info_file:
+        json.dump(table_info, table_info_file, indent=4)
+
+
+def convert_to_json_types(value):
+    """
+    Convert numpy values in (nested) lists and dicts to native python types
+
+    The log information of the tables contains values taken from the input files
+    (e.g. row numbers) which can be numpy types. They are converted to the
+    corresponding python types so they are stored as numbers in json and are
+    equal to the original values when loaded again.
+
+    Parameters
+    ----------
+    value
+        value to convert. Lists and tuples are converted to lists.
+
+    Returns
+    -------
+        the value with all numpy values converted to python types
+
+    """
+    if isinstance(value, dict):
+        return {key: convert_to_json_types(item) for key, item in value.items()}
+    if isinstance(value, list | tuple):
+        return [convert_to_json_types(item) for item in value]
+    if isinstance(value, np.ndarray):
+        return convert_to_json_types(value.tolist())
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def load_crf_table_result(
+    table: str,
+    table_info: dict[str, dict],
+    table_folder: Path,
+) -> dict:
+    """
+    Load the stored result for a single table
+
+    Parameters
+    ----------
+    table: str
+        Name of the table
+    table_info: dict[str, dict]
+        information on stored tables as returned by `load_crf_table_info`
+    table_folder: Path
+        folder with the per table results
+
+    Returns
+    -------
+        dict in the same format as returned by `process_crf_table`
+
+    """
+    print(f"Using stored data for table {table}")
+    if table_info[table]["has_data"]:
+        data = pm2.open_dataset(table_folder / table_info[table]["file"])
+    else:
+        data = None
+    table_result = {"data": data}
+    for log in crf_table_logs:
+        table_result[log] = table_info[table][log]
+    return table_result
+
+
+def read_crf_for_country_datalad(  # noqa: PLR0913
     country_code: str,
     submission_year: int,
     date_or_version: Optional[str] = "latest",
     re_read: Optional[bool] = True,
     type: str = "CRF",
+    n_workers: int = 1,
+    incremental: bool = False,
 ) -> None:
     """
     Prepare input for read_crf_for_country
@@ -419,6 +825,11 @@ def read_crf_for_country_datalad(
         If not specified latest data will be read
     type: str default "CRF"
         Read CRF or CRT
+    n_workers: int default 1
+        Number of processes used to read the input files in parallel
+    incremental: bool default False
+        Only read tables where the specification or input files changed since
+        they were last read (see `read_crf_for_country`)
 
     """
     # check type
@@ -454,6 +865,23 @@ def read_crf_for_country_datalad(
     )
     if re_read:
         cmd = cmd + " --re_read"
+    if n_workers > 1:
+        cmd = cmd + f" --n_workers={n_workers}"
+    if incremental:
+        cmd = cmd + " --incremental"
+        if type == "CRF":
+            info_date_or_version = country_info["date"]
+        else:
+            info_date_or_version = country_info["version"]
+        # the stored per table results are read and (partially) rewritten
+        table_folder = get_crf_table_folder(
+            country_code,
+            country_info["name"],
+            submission_year=submission_year,
+            date_or_version=info_date_or_version,
+            submission_type=type,
+        )
+        country_info["output"].append(table_folder.as_posix())
     datalad.api.run(
         cmd=cmd,
         dataset=root_path,
@@ -466,11 +894,12 @@ def read_crf_for_country_datalad(
     )
 
 
-def read_new_crf_for_year(  # noqa: PLR0912
+def read_new_crf_for_year(
     submission_year: int,
     countries: list[str] | None = None,
     re_read: bool | None = False,
     submission_type: str = "CRF",
+    n_workers: int = 1,
 ) -> dict:
     """
     Read CRF for given countries
@@ -500,6 +929,14 @@ def read_new_crf_for_year(  # noqa: PLR0912
         If true data will be read even if already read before.
     submission_type: str default "CRF"
         Read CRF or CRT
+    n_workers: int default 1
+        Number of processes used to read countries in parallel. Countries are
+        independent of each other, so they can be read concurrently. If 1 countries
+        are read sequentially in the main process. The output of the workers is
+        printed while reading with the country code as prefix.
+
+    The output of all countries and the overview are written to the run log
+    'read_<type><year>_<date>.log' in the log folder of the submission.
 
     TODO: write log with failed countries and what has been read
     TODO: not all unknown categories are saved
@@ -518,22 +955,187 @@ def read_new_crf_for_year(  # noqa: PLR0912
     else:
         raise ValueError("Type must be CRF or CRT")  # noqa: TRY003
 
-    read_countries = {}
-    for country in countries:
+    # index all submission files in one pass. The index is stored, so the worker
+    # processes don't have to scan the folders again
+    crf_file_index.scan()
+
+    log_folder = log_path / f"{submission_type}{submission_year}"
+    log_folder.mkdir(parents=True, exist_ok=True)
+    # each country writes its output to its own log file. They are merged into the
+    # run log in the order of the countries
+    with tempfile.TemporaryDirectory(dir=log_folder) as worker_log_folder:
+        country_logs = [
+            Path(worker_log_folder) / f"{country}.log" for country in countries
+        ]
+        if n_workers > 1:
+            with ProcessPoolExecutor(max_workers=n_workers) as executor:
+                statuses = list(
+                    executor.map(
+                        read_crf_for_country_status,
+                        countries,
+                        repeat(submission_year),
+                        repeat(re_read),
+                        repeat(submission_type),
+                        country_logs,
+                        repeat(True),
+                    )
+                )
+        else:
+            statuses = [
+                read_crf_for_country_status(
+                    country,
+                    submission_year,
+                    re_read=re_read,
+                    submission_type=submission_type,
+                    log_file=country_log,
+                )
+                for country, country_log in zip(countries, country_logs)
+            ]
+        read_countries = dict(zip(countries, statuses))
+
+        # print overview
+        successful_countries = [
+            country for country in read_countries if read_countries[country] == "read"
+        ]
+        skipped_countries = [
+            country
+            for country in read_countries
+            if read_countries[country] == "skipped"
+        ]
+        failed_countries = [
+            country for country in read_countries if read_countries[country] == "failed"
+        ]
+        no_data_countries = [
+            country
+            for country in read_countries
+            if read_countries[country] == "no data"
+        ]
+        overview = [
+            f"Read data for countries {successful_countries}",
+            f"Skipped countries {skipped_countries}",
+            f"No data for countries {no_data_countries}",
+            f"!!!!! Reading failed for {failed_countries}. Check why",
+        ]
+        for line in overview:
+            print(line)
+
+        today = date.today().strftime("%Y-%m-%d")
+        run_log = log_folder / f"read_{submission_type}{submission_year}_{today}.log"
+        with open(run_log, "w") as run_log_file:
+            for country, country_log in zip(countries, country_logs):
+                run_log_file.write(f"##### {country}: {read_countries[country]}\n")
+                if country_log.exists():
+                    run_log_file.write(country_log.read_text())
+            run_log_file.write("##### Overview\n")
+            run_log_file.write("\n".join(overview) + "\n")
+        print(f"Run log written to {run_log}")
+
+    return read_countries
+
+
+class PrefixedOutput(io.TextIOBase):
+    """
+    Text stream writing to a log file and line by line with a prefix to a stream
+
+    Used for the output of worker processes, so the output is shown while reading
+    and lines from different workers can be told apart.
+
+    Parameters
+    ----------
+    log_file
+        opened text file to write the output to
+    prefix
+        prefix for each line written to `stream`
+    stream
+        stream to write the prefixed lines to. Default is `sys.stdout`
+    """
+
+    def __init__(
+        self, log_file: io.TextIOBase, prefix: str, stream: io.TextIOBase | None = None
+    ) -> None:
+        self.log_file = log_file
+        self.prefix = prefix
+        self.stream = sys.stdout if stream is None else stream
+        self._line = ""
+
+    def write(self, text: str) -> int:
+        """Write text to the log file and complete lines to the stream"""
+        self.log_file.write(text)
+        *lines, self._line = (self._line + text).split("\n")
+        if lines:
+            self.stream.write("".join(f"{self.prefix}{line}\n" for line in lines))
+            self.stream.flush()
+        return len(text)
+
+    def close(self) -> None:
+        """Write the last incomplete line and flush the log file and stream"""
+        if self._line:
+            self.stream.write(f"{self.prefix}{self._line}\n")
+            self._line = ""
+        self.log_file.flush()
+        self.stream.flush()
+        super().close()
+
+
+def read_crf_for_country_status(  # noqa: PLR0913
+    country: str,
+    submission_year: int,
+    re_read: bool | None = False,
+    submission_type: str = "CRF",
+    log_file: Path | None = None,
+    prefix_output: bool = False,
+) -> str:
+    """
+    Read CRF data for a country and return the reading status
+
+    Wrapper around `read_crf_for_country` used by `read_new_crf_for_year`. Errors
+    are not raised but converted to a status string, so the function can be used
+    in worker processes.
+
+    Parameters
+    ----------
+    country: str
+        ISO 3-letter country code
+    submission_year: int
+        Year of the submission of the data
+    re_read: bool (optional, default=False)
+        If true data will be read even if already read before.
+    submission_type: str default "CRF"
+        Read CRF or CRT
+    log_file: Path (optional)
+        If given, everything printed while reading is also written to this file
+    prefix_output: bool default False
+        If True, the country code is put in front of each printed line. Used when
+        countries are read in parallel. Only used if `log_file` is given.
+
+    Returns
+    -------
+        str: status ("read", "skipped", "no data", or "failed")
+
+    """
+    with contextlib.ExitStack() as stack:
+        if log_file is not None:
+            output_file = stack.enter_context(open(log_file, "w"))
+            prefix = f"{country}: " if prefix_output else ""
+            output = stack.enter_context(PrefixedOutput(output_file, prefix=prefix))
+            stack.enter_context(contextlib.redirect_stdout(output))
         try:
+            # countries are read in parallel, so the files of a country are read
+            # sequentially
             country_df = read_crf_for_country(
                 country,
                 submission_year,
                 re_read=re_read,
                 submission_type=submission_type,
+                n_workers=1,
             )
             if country_df is None:
-                read_countries[country] = "skipped"
+                status = "skipped"
             else:
-                read_countries[country] = "read"
+                status = "read"
         except NoCRFFilesError:
             print(f"No {submission_type} data for country {country}, {submission_year}")
-            read_countries[country] = "no data"
+            status = "no data"
         except ValueError as ve:
             if (
                 ("does not exist" in repr(ve))
@@ -544,41 +1146,23 @@ def read_new_crf_for_year(  # noqa: PLR0912
                     f"No {submission_type} data for country {country}, "
                     f"{submission_year}."
                 )
-                read_countries[country] = "no data"
+                status = "no data"
             else:
                 print(
                     f"{submission_type} data for country {country}, "
                     f"{submission_year} could not be read:"
                 )
                 print(f"The following error occurred: {ve}")
-                read_countries[country] = "failed"
+                status = "failed"
         except Exception as ex:
             print(
                 f"{submission_type} data for country {country}, "
                 f"{submission_year} could not be read:"
             )
             print(f"The following error occurred: {ex}")
-            read_countries[country] = "failed"
+            status = "failed"
 
-    # print overview
-    successful_countries = [
-        country for country in read_countries if read_countries[country] == "read"
-    ]
-    skipped_countries = [
-        country for country in read_countries if read_countries[country] == "skipped"
-    ]
-    failed_countries = [
-        country for country in read_countries if read_countries[country] == "failed"
-    ]
-    no_data_countries = [
-        country for country in read_countries if read_countries[country] == "no data"
-    ]
-
-    print(f"Read data for countries {successful_countries}")
-    print(f"Skipped countries {skipped_countries}")
-    print(f"No data for countries {no_data_countries}")
-    print(f"!!!!! Reading failed for {failed_countries}. Check why")
-    return read_countries
+    return status
 
 
 def read_new_crf_for_year_datalad(  # noqa: PLR0912
@@ -586,6 +1170,7 @@ def read_new_crf_for_year_datalad(  # noqa: PLR0912
     countries: Optional[list[str]] = None,
     re_read: Optional[bool] = False,
     type: str = "CRF",
+    n_workers: int = 1,
 ) -> None:
     """
     Prepare input for read_crf_for_year
@@ -604,6 +1189,8 @@ def read_new_crf_for_year_datalad(  # noqa: PLR0912
         If true data will be read even if already read before.
     type: str default "CRF"
         Read CRF or CRT
+    n_workers: int default 1
+        Number of processes used to read countries in parallel
 
     """
     if countries is not None:
@@ -634,6 +1221,9 @@ def read_new_crf_for_year_datalad(  # noqa: PLR0912
 
     input_files = []
     output_files = []
+    # index all submission files in one pass. The index is stored and reused when
+    # the data is read
+    crf_file_index.scan()
     # loop over countries to collect input and output files
     print("Collect input and output files to pass to datalad")
     for country in countries:
@@ -676,6 +1266,8 @@ def read_new_crf_for_year_datalad(  # noqa: PLR0912
 
     if re_read:
         cmd = cmd + " --re_read"
+    if n_workers > 1:
+        cmd = cmd + f" --n_workers={n_workers}"
     datalad.api.run(
         cmd=cmd,
         dataset=root_path,
@@ -20,6 +20,7 @@ from .unfccc_di_reader_proc import (
     process_and_save_UNFCCC_DI_for_country,
     process_UNFCCC_DI_for_country,
     process_UNFCCC_DI_for_country_group,
+    profile_UNFCCC_DI_processing,
 )
 
 __all__ = [
@@ -31,6 +32,7 @@ __all__ = [
     "process_UNFCCC_DI_for_country",
     "process_UNFCCC_DI_for_country_group",
     "process_and_save_UNFCCC_DI_for_country",
+    "profile_UNFCCC_DI_processing",
     "read_DI_for_country_datalad",
     "read_DI_for_country_group_datalad",
     "read_UNFCCC_DI_for_country",
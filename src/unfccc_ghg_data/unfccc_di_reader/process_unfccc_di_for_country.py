@@ -6,7 +6,9 @@ function such that it can be called from datalad
 """
 
 import argparse
+import contextlib
 
+from unfccc_ghg_data.helper import ProcessingProfiler
 from unfccc_ghg_data.unfccc_di_reader import process_and_save_UNFCCC_DI_for_country
 
 if __name__ == "__main__":
@@ -18,6 +20,12 @@ if __name__ == "__main__":
         "given latest data will be used",
         default=None,
     )
+    parser.add_argument(
+        "--profile",
+        help="Write the run time and memory use of the processing steps to the "
+        "log folder",
+        action="store_true",
+    )
     args = parser.parse_args()
 
     country_code = args.country
@@ -26,7 +34,14 @@ if __name__ == "__main__":
     if date_str == "None":
         date_str = None
 
-    process_and_save_UNFCCC_DI_for_country(
-        country_code=country_code,
-        date_str=date_str,
-    )
+    if args.profile:
+        profiling = ProcessingProfiler(f"DI_{country_code}")
+    else:
+        profiling = contextlib.nullcontext()
+
+    with profiling as profiler:
+        process_and_save_UNFCCC_DI_for_country(
+            country_code=country_code,
+            date_str=date_str,
+            profiler=profiler,
+        )
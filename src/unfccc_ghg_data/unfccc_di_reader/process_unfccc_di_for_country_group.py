@@ -21,13 +21,21 @@ if __name__ == "__main__":
         help="date of input data to use (default is None to read latest data)",
         default=None,
     )
+    parser.add_argument(
+        "--n_workers",
+        help="Number of processes to process countries in parallel",
+        type=int,
+        default=1,
+    )
     args = parser.parse_args()
     annexI = args.annexI
     date_str = args.date
+    n_workers = args.n_workers
     if date_str == "None":
         date_str = None
 
     process_UNFCCC_DI_for_country_group(
         annexI=annexI,
         date_str=date_str,
+        n_workers=n_workers,
     )
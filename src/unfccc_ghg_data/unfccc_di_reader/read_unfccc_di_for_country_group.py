@@ -16,9 +16,46 @@ if __name__ == "__main__":
         help="read for AnnexI countries (default is for non-AnnexI)",
         action="store_true",
     )
+    parser.add_argument(
+        "--streaming",
+        help="Combine the countries on disk to limit memory use",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--no_zenodo",
+        help="read from the DI API instead of the Zenodo dataset",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--n_workers",
+        help="Number of DI API queries run in parallel",
+        type=int,
+        default=1,
+    )
+    parser.add_argument(
+        "--rate_limit",
+        help="Maximal number of DI API queries per second (default is no limit)",
+        type=float,
+        default=None,
+    )
+    parser.add_argument(
+        "--use_cache",
+        help="Cache the DI API query results to resume interrupted reads",
+        action="store_true",
+    )
     args = parser.parse_args()
     annexI = args.annexI
+    streaming = args.streaming
+    use_zenodo = not args.no_zenodo
+    n_workers = args.n_workers
+    rate_limit = args.rate_limit
+    use_cache = args.use_cache
 
     read_UNFCCC_DI_for_country_group(
         annexI=annexI,
+        use_zenodo=use_zenodo,
+        streaming=streaming,
+        n_workers=n_workers,
+        rate_limit=rate_limit,
+        use_cache=use_cache,
     )
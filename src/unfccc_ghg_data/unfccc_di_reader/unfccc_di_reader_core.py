@@ -2,19 +2,29 @@
 Core functions for the UNFCCC DI reader
 """
 
+import contextlib
 import copy
 import itertools
+import tempfile
+from collections.abc import Callable
 from copy import deepcopy
 from datetime import date
+from pathlib import Path
 from typing import Optional
 
+import numpy as np
 import pandas as pd
 import primap2 as pm2
 import pycountry
 import unfccc_di_api
 import xarray as xr
 
-from unfccc_ghg_data.helper import AI_countries, nAI_countries
+from unfccc_ghg_data.helper import (
+    AI_countries,
+    cache_path,
+    concat_area_datasets,
+    nAI_countries,
+)
 
 from .unfccc_di_reader_config import (
     cat_code_regexp,
@@ -22,6 +32,7 @@ from .unfccc_di_reader_config import (
     di_to_pm2if_template_ai,
     di_to_pm2if_template_nai,
 )
+from .unfccc_di_reader_fetch import fetch_DI_queries
 from .unfccc_di_reader_io import save_DI_country_data, save_DI_dataset
 from .util import DI_date_format
 
@@ -36,6 +47,10 @@ def read_UNFCCC_DI_for_country(  # noqa: PLR0913
     use_gwp: Optional[str] = None,
     debug: Optional[bool] = False,
     use_zenodo: Optional[bool] = True,
+    zenodo_data: pd.DataFrame | None = None,
+    n_workers: int = 1,
+    rate_limit: float | None = None,
+    use_cache: bool = False,
 ) -> xr.Dataset:
     """
     Read DI data for single country
@@ -83,6 +98,19 @@ def read_UNFCCC_DI_for_country(  # noqa: PLR0913
         output debug information
     use_zenodo
         Read from zenodo datasets instead of UNFCCC DI api.
+    zenodo_data
+        Data for the country from the Zenodo dataset as returned by
+        `get_zenodo_DI_data_by_party`. If given, the Zenodo dataset is not loaded
+        again. Only used if `use_zenodo` is `True`.
+    n_workers
+        Number of DI API queries run in parallel. Only used if `use_zenodo` is
+        `False`.
+    rate_limit
+        Maximal number of DI API queries per second. Only used if `use_zenodo` is
+        `False`.
+    use_cache
+        Cache the results of DI API queries on disk. Only used if `use_zenodo` is
+        `False`.
 
     Returns
     -------
@@ -96,6 +124,7 @@ def read_UNFCCC_DI_for_country(  # noqa: PLR0913
             category_groups=category_groups,
             read_subsectors=read_subsectors,
             debug=debug,
+            zenodo_data=zenodo_data,
         )
     else:
         data_df = read_UNFCCC_DI_for_country_df(
@@ -103,6 +132,9 @@ def read_UNFCCC_DI_for_country(  # noqa: PLR0913
             category_groups=category_groups,
             read_subsectors=read_subsectors,
             debug=debug,
+            n_workers=n_workers,
+            rate_limit=rate_limit,
+            use_cache=use_cache,
         )
 
     # set date_str if not given
@@ -131,11 +163,14 @@ def read_UNFCCC_DI_for_country(  # noqa: PLR0913
     return data_pm2
 
 
-def read_UNFCCC_DI_for_country_df(  # noqa: PLR0912, PLR0915
+def read_UNFCCC_DI_for_country_df(  # noqa: PLR0912, PLR0913, PLR0915
     country_code: str,
     category_groups: Optional[dict] = None,
     read_subsectors: bool = False,
     debug: Optional[bool] = False,
+    n_workers: int = 1,
+    rate_limit: float | None = None,
+    use_cache: bool = False,
 ) -> pd.DataFrame:
     """
     Read UNFCCC DI data for a given country.
@@ -167,6 +202,13 @@ def read_UNFCCC_DI_for_country_df(  # noqa: PLR0912, PLR0915
         category_groups.
     debug (default: False)
         output debug information
+    n_workers (default: 1)
+        Number of queries (one per category group) run in parallel
+    rate_limit (optional)
+        Maximal number of queries per second. Default is no limit
+    use_cache (default: False)
+        Cache the results of the queries on disk and use cached results if present
+        (see `unfccc_di_reader_fetch`)
 
     Returns
     -------
@@ -174,6 +216,11 @@ def read_UNFCCC_DI_for_country_df(  # noqa: PLR0912, PLR0915
 
     """
     reader = unfccc_di_api.UNFCCCApiReader()
+    fetch_options = dict(
+        n_workers=n_workers,
+        rate_limit=rate_limit,
+        use_cache=use_cache,
+    )
 
     # template for the query to the DI API
     query_template = {"party_codes": [country_code], "normalize_gas_names": True}
@@ -201,14 +248,25 @@ def read_UNFCCC_DI_for_country_df(  # noqa: PLR0912, PLR0915
             query["gases"] = list(set(all_gases) - {"No gas"})
             if debug:
                 print(f"Using query: {query}")
-            di_data = reader.annex_one_reader.query(**query)
+            di_data = fetch_DI_queries(
+                reader.annex_one_reader, [query], **fetch_options
+            )[0]
         else:
             all_gases = reader.non_annex_one_reader.gases["name"]
             query = query_template
             query["gases"] = list(set(all_gases) - {"No gas"})
             if debug:
                 print(f"Using query: {query}")
-            di_data = reader.non_annex_one_reader.query(**query)
+            di_data = fetch_DI_queries(
+                reader.non_annex_one_reader, [query], **fetch_options
+            )[0]
+        if di_data is None:
+            # the fetch functions return None for queries without data (also
+            # when read from the cache). Raise the error of a direct query, so
+            # callers can handle countries without data
+            raise unfccc_di_api.NoDataError(
+                party_codes=query["party_codes"], gases=query["gases"]
+            )
     else:
         # detailed query per category (could also be just the top level cat)
 
@@ -220,9 +278,9 @@ def read_UNFCCC_DI_for_country_df(  # noqa: PLR0912, PLR0915
             categories = reader.non_annex_one_reader.category_tree.all_nodes()
             measures = reader.non_annex_one_reader.measure_tree.all_nodes()
 
-            # set data to none so we have the variable for the first category
-        di_data = None
-
+        # create the queries for all category groups first, so they can be run
+        # in parallel
+        queries = []
         for category in category_groups:
             if debug:
                 print(f"Working on {category}")
@@ -272,27 +330,34 @@ def read_UNFCCC_DI_for_country_df(  # noqa: PLR0912, PLR0915
                 query["measure_ids"] = [node.identifier for node in measure_nodes]
             if debug:
                 print(query)
+            queries.append(query)
 
-            # read the data. If no data is available for the query the error is
-            # caught and a message is printed
-            try:
-                if ai_country:
-                    data_new = reader.annex_one_reader.query(**query)
-                else:
-                    data_new = reader.non_annex_one_reader.query(**query)
+        # read the data. If no data is available for a query `None` is returned
+        # and a message is printed
+        if ai_country:
+            data_read = fetch_DI_queries(
+                reader.annex_one_reader, queries, **fetch_options
+            )
+        else:
+            data_read = fetch_DI_queries(
+                reader.non_annex_one_reader, queries, **fetch_options
+            )
 
-                n_points = len(data_new)
-                n_countries = len(data_new["party"].unique())
-                if debug:
-                    print(
-                        f"Collected {n_points} data points for {n_countries} countries"
-                    )
-                if di_data is None:
-                    di_data = data_new
-                else:
-                    di_data = pd.concat([di_data, data_new])
-            except unfccc_di_api.NoDataError:
+        data_present = []
+        for category, data_new in zip(category_groups, data_read):
+            if data_new is None:
                 print(f"No data for {category}")
+                continue
+            n_points = len(data_new)
+            n_countries = len(data_new["party"].unique())
+            if debug:
+                print(f"Collected {n_points} data points for {n_countries} countries")
+            data_present.append(data_new)
+
+        if data_present:
+            di_data = pd.concat(data_present)
+        else:
+            di_data = None
 
     # if data has been collected print some information and save the data
     if di_data is None:
@@ -325,6 +390,7 @@ def read_UNFCCC_DI_for_country_df_zenodo(
     category_groups: Optional[dict] = None,
     read_subsectors: bool = False,
     debug: Optional[bool] = False,
+    zenodo_data: pd.DataFrame | None = None,
 ) -> pd.DataFrame:
     """
     Read UNFCCC DI data for a given country.
@@ -357,6 +423,10 @@ def read_UNFCCC_DI_for_country_df_zenodo(
         category_groups.
     debug (default: False)
         output debug information
+    zenodo_data: pd.DataFrame (optional)
+        Data for the country from the Zenodo dataset as returned by
+        `get_zenodo_DI_data_by_party`. If not given the Zenodo dataset is loaded
+        and queried for the country.
 
     Returns
     -------
@@ -368,9 +438,11 @@ def read_UNFCCC_DI_for_country_df_zenodo(
             "Subsector reading is not possible with the Zenodo reader yet"
         )
 
-    reader = unfccc_di_api.ZenodoReader()
-
-    di_data = reader.query(party_code=country_code)
+    if zenodo_data is None:
+        reader = unfccc_di_api.ZenodoReader()
+        di_data = reader.query(party_code=country_code)
+    else:
+        di_data = zenodo_data
 
     # remove the "no_gas" data
     di_data = di_data[di_data["gas"] != "No gas"]
@@ -404,6 +476,100 @@ def read_UNFCCC_DI_for_country_df_zenodo(
     return di_data
 
 
+def get_zenodo_DI_data_by_party(
+    parties: list[str] | None = None,
+) -> dict[str, pd.DataFrame]:
+    """
+    Load the Zenodo DI dataset once and split it by party
+
+    `unfccc_di_api.ZenodoReader.query` selects the data for a party by scanning the
+    full dataset. When reading many countries it is much faster to load the dataset
+    once and split it in a single groupby.
+
+    Parameters
+    ----------
+    parties: list[str] (optional)
+        ISO3 codes of the parties to keep. If not given data for all parties is
+        returned.
+
+    Returns
+    -------
+    dict with the party codes as keys and the data for each party in the format
+    returned by `unfccc_di_api.ZenodoReader.query` as values. Parties without data
+    are not included.
+
+    """
+    reader = unfccc_di_api.ZenodoReader()
+    di_data = reader.df
+    # "No gas" data is removed for every country anyway, so we remove it once
+    # here before splitting the data
+    di_data = di_data[di_data["gas"] != "No gas"]
+    if parties is not None:
+        di_data = di_data[di_data["party"].isin(parties)]
+
+    di_data_by_party = {
+        party: data_party for party, data_party in di_data.groupby("party", sort=False)
+    }
+    del reader
+
+    return di_data_by_party
+
+
+def recode_categorical(codes: np.ndarray, values: pd.Series) -> pd.Categorical:
+    """
+    Create a categorical from codes pointing to possibly non-unique values
+
+    Parameters
+    ----------
+    codes
+        integer codes of the rows pointing into `values`. -1 is used for missing
+        values
+    values
+        values for the codes
+
+    Returns
+    -------
+    categorical with the value of each row
+    """
+    value_codes, categories = pd.factorize(values)
+    return pd.Categorical.from_codes(
+        np.where(codes >= 0, value_codes[codes], -1), categories=categories
+    )
+
+
+def map_categories(
+    data: pd.Series,
+    func: Callable[[pd.Series], pd.Series],
+) -> pd.Series:
+    """
+    Apply a function to the unique values of a categorical column
+
+    The function is applied to the categories only and the result is mapped back to
+    the rows using the codes. This is much faster than applying e.g. string
+    operations to all rows if the column has only few unique values.
+
+    Parameters
+    ----------
+    data
+        categorical column
+    func
+        function mapping a Series of values to a Series of new values of the same
+        length. The new values don't have to be unique.
+
+    Returns
+    -------
+    categorical column with the new values
+    """
+    return pd.Series(
+        recode_categorical(
+            data.cat.codes.to_numpy(),
+            func(data.cat.categories.to_series(index=None)),
+        ),
+        index=data.index,
+        name=data.name,
+    )
+
+
 def convert_DI_data_to_pm2_if(  # noqa: PLR0912, PLR0915
     data: pd.DataFrame,
     pm2if_specifications: Optional[dict] = None,
@@ -443,19 +609,10 @@ def convert_DI_data_to_pm2_if(  # noqa: PLR0912, PLR0915
     """
     print("Convert data to PRIMAP2 interchange format")
 
-    # create a copy of the data to avoid data altering the original data
-    # this will be done inside the *convert_to_long_dataframe* function
-    # in the future. Thus it can be removed here once the category column
-    # copy workaround is no longer necessary
-    data_temp = data.copy(deep=True)
-
     # check which country group we have
-    parties_present_ai = [
-        party for party in data_temp["party"].unique() if party in AI_countries
-    ]
-    parties_present_nai = [
-        party for party in data_temp["party"].unique() if party in nAI_countries
-    ]
+    parties = data["party"].unique()
+    parties_present_ai = [party for party in parties if party in AI_countries]
+    parties_present_nai = [party for party in parties if party in nAI_countries]
     if len(parties_present_ai) > 0:
         if len(parties_present_nai) > 0:
             raise ValueError(  # noqa: TRY003
@@ -508,35 +665,59 @@ def convert_DI_data_to_pm2_if(  # noqa: PLR0912, PLR0915
         pm2if_specifications["meta_data"]["comment"] + f" Data read on {date_str}."
     )
 
-    # remove baseyear
-    idx_base_year = data_temp["year"] == "Base year"
-    data_temp = data_temp.drop(data_temp.index[idx_base_year])
+    # The string columns are converted to categoricals and the string operations
+    # are applied once per unique value instead of once per row. A new DataFrame
+    # is built from the rows without the base year, so the input data is not
+    # altered and no deep copy of it is needed.
+    rows_keep = (data["year"] != "Base year").to_numpy()
+    data_temp = {}
+    for column in data.columns:
+        if column == "stringValue":
+            continue
+        elif column in ["party", "category", "unit", "gas"]:
+            data_temp[column] = data[column].astype("category")[rows_keep]
+        else:
+            data_temp[column] = data[column][rows_keep]
 
     # add GWP to entities where necessary
-    data_temp["unit"] = data_temp["unit"].replace(
-        to_replace=r"(.*) CO2 equivalent", value=r"\1CO2eq", regex=True
+    data_temp["unit"] = map_categories(
+        data_temp["unit"],
+        lambda units: units.str.replace(r"(.*) CO2 equivalent", r"\1CO2eq", regex=True),
     )
-    row_idx_co2eq = data_temp["unit"].str.endswith("CO2eq")
     if use_gwp is not None:
         # convert all with GWPs given in input
-        data_temp.loc[row_idx_co2eq, "gas"] = (
-            data_temp.loc[row_idx_co2eq, "gas"] + f" ({use_gwp})"
-        )
+        gwp_suffix = f" ({use_gwp})"
     elif ai_dataset:
         # convert with AR4
-        data_temp.loc[row_idx_co2eq, "gas"] = (
-            data_temp.loc[row_idx_co2eq, "gas"] + " (AR4GWP100)"
-        )
+        gwp_suffix = " (AR4GWP100)"
     else:
         # convert with SAR
-        data_temp.loc[row_idx_co2eq, "gas"] = (
-            data_temp.loc[row_idx_co2eq, "gas"] + " (SARGWP100)"
-        )
+        gwp_suffix = " (SARGWP100)"
+    # the gas categories are doubled: the second half has the GWP suffix and is
+    # used for the rows with CO2eq units
+    unit_co2eq = data_temp["unit"].cat.categories.str.endswith("CO2eq")
+    unit_codes = data_temp["unit"].cat.codes.to_numpy()
+    row_idx_co2eq = unit_co2eq[unit_codes] & (unit_codes >= 0)
+    gases = data_temp["gas"].cat.categories.to_series(index=None)
+    gas_codes = data_temp["gas"].cat.codes.to_numpy()
+    data_temp["gas"] = pd.Series(
+        recode_categorical(
+            np.where(
+                row_idx_co2eq & (gas_codes >= 0), gas_codes + len(gases), gas_codes
+            ),
+            pd.concat([gases, gases + gwp_suffix], ignore_index=True),
+        ),
+        index=data_temp["gas"].index,
+        name="gas",
+    )
 
     # combine numeric and string values
-    nan_idx = data_temp["numberValue"].isna()
-    data_temp.loc[nan_idx, "numberValue"] = data_temp.loc[nan_idx, "stringValue"]
-    data_temp = data_temp.drop(columns=["stringValue"])
+    number_value = data_temp["numberValue"]
+    nan_idx = number_value.isna()
+    if nan_idx.any():
+        data_temp["numberValue"] = number_value.astype(object).where(
+            ~nan_idx, data["stringValue"][rows_keep]
+        )
 
     # Currently in primap2 a data reading a column can only be used once.
     # We want to use the category column both for the primap2 "category"
@@ -550,8 +731,19 @@ def convert_DI_data_to_pm2_if(  # noqa: PLR0912, PLR0915
     def repl(m):
         return m.group("code")
 
-    data_temp["category"] = data_temp["category"].str.replace(
-        cat_code_regexp, repl, regex=True
+    data_temp["category"] = map_categories(
+        data_temp["category"],
+        lambda categories: categories.str.replace(cat_code_regexp, repl, regex=True),
+    )
+    # primap2 changes values in the columns, so they have to be converted back
+    # from categoricals
+    data_temp = pd.DataFrame(
+        {
+            column: values.astype(values.cat.categories.dtype)
+            if isinstance(values.dtype, pd.CategoricalDtype)
+            else values
+            for column, values in data_temp.items()
+        }
     )
 
     # convert to pm2 interchange format
@@ -598,8 +790,14 @@ def convert_DI_IF_data_to_pm2(
 
 
 ## functions for multiple country reading
-def read_UNFCCC_DI_for_country_group(
+def read_UNFCCC_DI_for_country_group(  # noqa: PLR0913, PLR0915
     annexI: bool = False,
+    use_zenodo: bool = True,
+    compression: dict | None = None,
+    streaming: bool = False,
+    n_workers: int = 1,
+    rate_limit: float | None = None,
+    use_cache: bool = False,
 ) -> xr.Dataset:
     """
     Read UNFCCC DI data for all countries in a country group
@@ -613,6 +811,28 @@ def read_UNFCCC_DI_for_country_group(
     ----------
     annexI (bool, default = False)
         if `True` read for annexI, else for non-AnnexI
+    use_zenodo (bool, default = True)
+        Read from the Zenodo dataset instead of the UNFCCC DI api. The dataset is
+        loaded once and split by country.
+    compression (dict, optional)
+        netCDF encoding for the data variables of the group dataset (see
+        `save_DI_dataset`). Default is zlib level 9
+    streaming (bool, default = False)
+        Keep the peak memory independent of the number of countries. The data of
+        each country is written to a temporary netCDF file. The files are
+        combined lazily along the area dimension and the group dataset is written
+        chunk by chunk and country by country. The saved dataset is returned
+        lazily loaded.
+    n_workers (int, default = 1)
+        Number of DI API queries run in parallel. Only used if `use_zenodo` is
+        `False`.
+    rate_limit (float, optional)
+        Maximal number of DI API queries per second. Only used if `use_zenodo` is
+        `False`.
+    use_cache (bool, default = False)
+        Cache the results of DI API queries on disk, so an interrupted read can be
+        resumed without fetching the data again. Only used if `use_zenodo` is
+        `False`.
 
     Returns
     -------
@@ -631,58 +851,107 @@ def read_UNFCCC_DI_for_country_group(
         countries = nAI_countries
         country_group = "non-AnnexI"
 
-    # read the data
-    for country in countries:
-        print(f"reading DI data for country {country}")
-
-        try:
-            data_country = read_UNFCCC_DI_for_country(
-                country_code=country,
-                category_groups=None,  # read all categories
-                read_subsectors=False,  # not applicable as we read all categories
-                date_str=date_str,
-                pm2if_specifications=None,
-                # automatically use the right specs for AI and NAI
-                use_gwp=None,  # automatically uses right default GWP for AI and NAI
-                debug=False,
+    if use_zenodo:
+        print("Loading the Zenodo DI dataset")
+        di_data_by_party = get_zenodo_DI_data_by_party(parties=countries)
+
+    with contextlib.ExitStack() as stack:
+        if streaming:
+            cache_path.mkdir(parents=True, exist_ok=True)
+            # the temporary files are also removed if reading or saving fails
+            temp_dir = stack.enter_context(
+                tempfile.TemporaryDirectory(dir=cache_path, prefix="di_group_")
             )
+            country_files = []
+
+        # read the data
+        for country in countries:
+            print(f"reading DI data for country {country}")
 
-            if annexI:
-                # annexI data has additional dimensions and unfortunately the xarray
-                # merge function needs some extra memory which is not needed when
-                # converting from IF to pm2
-                if data_all_if is None:
-                    data_all_if = data_country.pr.to_interchange_format()
-                    attrs = data_all_if.attrs
+            try:
+                if use_zenodo:
+                    if country not in di_data_by_party:
+                        print(f"No data for {country} in the Zenodo dataset.")
+                        continue
+                    # the data is not needed any more after conversion
+                    zenodo_data = di_data_by_party.pop(country)
                 else:
-                    data_all_if = pd.concat(
-                        [data_all_if, data_country.pr.to_interchange_format()]
-                    )
-            elif data_all is None:
-                data_all = data_country
-            else:
-                data_all = data_all.pr.merge(data_country)
-
-        except unfccc_di_api.NoDataError as err:
-            print(f"No data for {country}.")
-            print(err)
-        except ValueError as err:
-            print(f"ValueError for {country}.")
-            print(err)
+                    zenodo_data = None
+                data_country = read_UNFCCC_DI_for_country(
+                    country_code=country,
+                    category_groups=None,  # read all categories
+                    read_subsectors=False,  # not applicable as we read all categories
+                    date_str=date_str,
+                    pm2if_specifications=None,
+                    # automatically use the right specs for AI and NAI
+                    use_gwp=None,  # automatically uses right default GWP for AI and NAI
+                    debug=False,
+                    use_zenodo=use_zenodo,
+                    zenodo_data=zenodo_data,
+                    n_workers=n_workers,
+                    rate_limit=rate_limit,
+                    use_cache=use_cache,
+                )
+
+                if streaming:
+                    # no compression as the files are only read once
+                    country_file = Path(temp_dir) / f"{country}.nc"
+                    data_country.pr.to_netcdf(country_file, encoding={})
+                    country_files.append(country_file)
+                elif annexI:
+                    # annexI data has additional dimensions and unfortunately the xarray
+                    # merge function needs some extra memory which is not needed when
+                    # converting from IF to pm2
+                    if data_all_if is None:
+                        data_all_if = data_country.pr.to_interchange_format()
+                        attrs = data_all_if.attrs
+                    else:
+                        data_all_if = pd.concat(
+                            [data_all_if, data_country.pr.to_interchange_format()]
+                        )
+                elif data_all is None:
+                    data_all = data_country
+                else:
+                    data_all = data_all.pr.merge(data_country)
+
+            except unfccc_di_api.NoDataError as err:
+                print(f"No data for {country}.")
+                print(err)
+            except ValueError as err:
+                print(f"ValueError for {country}.")
+                print(err)
+
+        if streaming:
+            # every chunk holds the data of one country for one variable
+            # the files are closed before the temporary folder is removed
+            data_countries = [
+                stack.enter_context(pm2.open_dataset(file, chunks=-1))
+                for file in country_files
+            ]
+            data_all = concat_area_datasets(data_countries)
+        elif annexI:
+            data_all = pm2.pm2io.from_interchange_format(
+                data_all_if, attrs=attrs, max_array_size=500000000000
+            )
 
-    if annexI:
-        data_all = pm2.pm2io.from_interchange_format(
-            data_all_if, attrs=attrs, max_array_size=500000000000
+        countries_present = list(data_all.coords[data_all.attrs["area"]].values)
+        data_all.attrs["title"] = (
+            f"Data submitted by the following {country_group} "
+            f"countries and available in the DI interface on "
+            f"{date_str}: {', '.join(countries_present)}"
         )
 
-    countries_present = list(data_all.coords[data_all.attrs["area"]].values)
-    data_all.attrs["title"] = (
-        f"Data submitted by the following {country_group} "
-        f"countries and available in the DI interface on "
-        f"{date_str}: {', '.join(countries_present)}"
-    )
+        # save the data
+        saved_file = save_DI_dataset(
+            data_all,
+            raw=True,
+            annexI=annexI,
+            compression=compression,
+            streaming=streaming,
+        )
 
-    # save the data
-    save_DI_dataset(data_all, raw=True, annexI=annexI)
+        if streaming:
+            # return the saved data as the temporary files are removed
+            data_all = pm2.open_dataset(saved_file, chunks={})
 
     return data_all
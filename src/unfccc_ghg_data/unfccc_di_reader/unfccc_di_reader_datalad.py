@@ -122,8 +122,13 @@ def process_DI_for_country_datalad(
         print(ex.message)
 
 
-def read_DI_for_country_group_datalad(
+def read_DI_for_country_group_datalad(  # noqa: PLR0913
     annexI: bool = False,
+    streaming: bool = False,
+    use_zenodo: bool = True,
+    n_workers: int = 1,
+    rate_limit: float | None = None,
+    use_cache: bool = False,
 ) -> None:
     """
     Call datalad which in turn calls a script that reads the DI data for a country group
@@ -138,6 +143,21 @@ def read_DI_for_country_group_datalad(
     date_str: str
         Date of the data to be processed in the format %Y-%m-%d (e.g. 2023-01-30). If
         no date is given the last data read will be processed.
+    streaming: bool (default False)
+        Combine the data of the countries on disk such that the memory use does
+        not depend on the number of countries
+    use_zenodo: bool (default True)
+        Read from the Zenodo dataset instead of the UNFCCC DI api
+    n_workers: int (default 1)
+        Number of DI API queries run in parallel. Only used if `use_zenodo` is
+        `False`
+    rate_limit: float | None (default None)
+        Maximal number of DI API queries per second. Only used if `use_zenodo` is
+        `False`
+    use_cache: bool (default False)
+        Cache the results of DI API queries on disk, so an interrupted read can be
+        resumed without fetching the data again. Only used if `use_zenodo` is
+        `False`
     """
     if annexI:
         country_group = "AnnexI"
@@ -156,6 +176,16 @@ def read_DI_for_country_group_datalad(
     cmd = f"python3 {script.as_posix()} "
     if annexI:
         cmd = cmd + " --annexI"
+    if streaming:
+        cmd = cmd + " --streaming"
+    if not use_zenodo:
+        cmd = cmd + " --no_zenodo"
+        if n_workers > 1:
+            cmd = cmd + f" --n_workers={n_workers}"
+        if rate_limit is not None:
+            cmd = cmd + f" --rate_limit={rate_limit}"
+        if use_cache:
+            cmd = cmd + " --use_cache"
 
     try:
         datalad.api.run(
@@ -177,6 +207,7 @@ def read_DI_for_country_group_datalad(
 def process_DI_for_country_group_datalad(
     annexI: bool = False,
     date_str: Optional[str] = None,
+    n_workers: int = 1,
 ) -> None:
     """
     Call datalad which calls a script that processes the DI data for a country group
@@ -192,6 +223,8 @@ def process_DI_for_country_group_datalad(
     date_str: str (default None)
         Date of the data to be processed in the format %Y-%m-%d (e.g. 2023-01-30). If
         no date is given the last data read will be processed.
+    n_workers: int (default 1)
+        Number of processes used to process countries in parallel
     """
     if annexI:
         country_group = "AnnexI"
@@ -214,6 +247,8 @@ def process_DI_for_country_group_datalad(
         cmd = cmd + f" --date_str={date_str}"
     else:
         date_str = "latest"
+    if n_workers > 1:
+        cmd = cmd + f" --n_workers={n_workers}"
 
     try:
         datalad.api.run(
@@ -0,0 +1,326 @@
+"""
+Concurrent fetching of data from the UNFCCC DI API
+
+Reading data for a country from the DI API needs one query per category group.
+The functions in this module run these queries concurrently in a thread pool with
+a limit on the number of queries per second, retry failed queries with
+exponential backoff, and optionally cache the query results on disk.
+
+Cache entries are keyed by a hash of the normalized query and the API url, so an
+interrupted read can be resumed without fetching the already read categories
+again. The DI data changes over time, so the cache is not used by default and
+should be cleared (`clear_DI_query_cache`) before reading new data.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+import requests
+import unfccc_di_api
+
+from unfccc_ghg_data.helper import cache_path
+
+di_query_cache_path = cache_path / "di_queries"
+
+
+class RateLimiter:
+    """
+    Thread safe limit for the number of queries per second
+
+    Parameters
+    ----------
+    rate_limit
+        maximal number of queries started per second. If `None` queries are not
+        limited
+    """
+
+    def __init__(self, rate_limit: float | None = None):
+        self.min_interval = 0.0 if rate_limit is None else 1.0 / rate_limit
+        self._lock = threading.Lock()
+        self._next_time = time.monotonic()
+
+    def wait(self) -> None:
+        """Wait until the next query may be started"""
+        with self._lock:
+            now = time.monotonic()
+            start_time = max(now, self._next_time)
+            self._next_time = start_time + self.min_interval
+        if start_time > now:
+            time.sleep(start_time - now)
+
+
+def normalize_DI_query(query: dict) -> dict:
+    """
+    Normalize a DI query such that equivalent queries are equal
+
+    Parameters are sorted by name, lists are sorted and parameters which are `None`
+    are removed.
+
+    Parameters
+    ----------
+    query
+        keyword arguments for `UNFCCCSingleCategoryApiReader.query`
+
+    Returns
+    -------
+    normalized query
+
+    """
+    query_normalized = {}
+    for key in sorted(query.keys()):
+        value = query[key]
+        if value is None:
+            continue
+        if isinstance(value, list | tuple | set | pd.Series):
+            value = sorted(value)
+        query_normalized[key] = value
+    return query_normalized
+
+
+def get_DI_query_cache_file(
+    query: dict,
+    base_url: str,
+    cache_folder: Path | None = None,
+) -> Path:
+    """
+    Get the cache file for a DI query
+
+    Parameters
+    ----------
+    query
+        keyword arguments for `UNFCCCSingleCategoryApiReader.query`
+    base_url
+        url of the DI API
+    cache_folder
+        Folder of the cache. Default is `di_query_cache_path`
+
+    Returns
+    -------
+    the cache file (which might not exist)
+
+    """
+    if cache_folder is None:
+        cache_folder = di_query_cache_path
+    key = json.dumps(
+        {"base_url": base_url, "query": normalize_DI_query(query)},
+        sort_keys=True,
+        default=str,
+    )
+    return cache_folder / f"{hashlib.sha256(key.encode()).hexdigest()}.pkl.gz"
+
+
+def query_DI_with_retry(
+    reader: unfccc_di_api.UNFCCCSingleCategoryApiReader,
+    query: dict,
+    max_retries: int = 3,
+    backoff: float = 1.0,
+    rate_limiter: RateLimiter | None = None,
+) -> pd.DataFrame | None:
+    """
+    Run a DI query and retry it if it fails
+
+    Connection errors, HTTP errors and invalid responses (e.g. when access is
+    blocked temporarily) are retried with exponential backoff.
+
+    Parameters
+    ----------
+    reader
+        reader for annexI or non-annexI data
+    query
+        keyword arguments for `reader.query`
+    max_retries
+        number of retries before the error is raised
+    backoff
+        waiting time before the first retry in seconds. The waiting time is doubled
+        for each further retry.
+    rate_limiter
+        limits the number of queries per second (also for retries)
+
+    Returns
+    -------
+    DataFrame with the data or `None` if the query returned no data
+
+    """
+    for attempt in range(max_retries + 1):
+        if rate_limiter is not None:
+            rate_limiter.wait()
+        try:
+            return reader.query(**query)
+        except unfccc_di_api.NoDataError:
+            return None
+        except requests.RequestException as ex:
+            if attempt == max_retries:
+                raise
+            wait_time = backoff * 2**attempt
+            print(f"Query failed ({ex}). Retrying in {wait_time} s")
+            time.sleep(wait_time)
+
+
+def fetch_DI_query(  # noqa: PLR0913
+    reader: unfccc_di_api.UNFCCCSingleCategoryApiReader,
+    query: dict,
+    max_retries: int = 3,
+    backoff: float = 1.0,
+    rate_limiter: RateLimiter | None = None,
+    use_cache: bool = False,
+    cache_folder: Path | None = None,
+) -> pd.DataFrame | None:
+    """
+    Run a DI query using the cache
+
+    Results are cached including queries which returned no data.
+
+    Parameters
+    ----------
+    reader
+        reader for annexI or non-annexI data
+    query
+        keyword arguments for `reader.query`
+    max_retries
+        number of retries of failed queries
+    backoff
+        waiting time before the first retry in seconds
+    rate_limiter
+        limits the number of queries per second
+    use_cache
+        if `True` the result is taken from the cache if present and stored in the
+        cache otherwise
+    cache_folder
+        Folder of the cache. Default is `di_query_cache_path`
+
+    Returns
+    -------
+    DataFrame with the data or `None` if the query returned no data
+
+    """
+    if not use_cache:
+        return query_DI_with_retry(
+            reader,
+            query,
+            max_retries=max_retries,
+            backoff=backoff,
+            rate_limiter=rate_limiter,
+        )
+
+    if cache_folder is None:
+        cache_folder = di_query_cache_path
+    cache_file = get_DI_query_cache_file(
+        query, reader.base_url, cache_folder=cache_folder
+    )
+    if cache_file.exists():
+        # the cache only contains files written by this function
+        return pd.read_pickle(cache_file)  # noqa: S301
+
+    data = query_DI_with_retry(
+        reader,
+        query,
+        max_retries=max_retries,
+        backoff=backoff,
+        rate_limiter=rate_limiter,
+    )
+
+    # write to a temporary file first so other threads never see partial files
+    cache_folder.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(
+        dir=cache_folder, suffix=".tmp", delete=False
+    ) as temp_file:
+        temp_path = Path(temp_file.name)
+    try:
+        pd.to_pickle(data, temp_path, compression="gzip")
+        os.replace(temp_path, cache_file)
+    except BaseException:
+        # temporary files are not cache entries, so they would never be removed
+        temp_path.unlink(missing_ok=True)
+        raise
+
+    return data
+
+
+def fetch_DI_queries(  # noqa: PLR0913
+    reader: unfccc_di_api.UNFCCCSingleCategoryApiReader,
+    queries: list[dict],
+    n_workers: int = 1,
+    rate_limit: float | None = None,
+    max_retries: int = 3,
+    backoff: float = 1.0,
+    use_cache: bool = False,
+    cache_folder: Path | None = None,
+) -> list[pd.DataFrame | None]:
+    """
+    Run several DI queries concurrently
+
+    Parameters
+    ----------
+    reader
+        reader for annexI or non-annexI data
+    queries
+        list of keyword arguments for `reader.query`
+    n_workers
+        number of queries run in parallel
+    rate_limit
+        maximal number of queries started per second. Default is no limit
+    max_retries
+        number of retries of failed queries
+    backoff
+        waiting time before the first retry in seconds
+    use_cache
+        use the on-disk cache for the query results
+    cache_folder
+        Folder of the cache. Default is `di_query_cache_path`
+
+    Returns
+    -------
+    list with the results of the queries in the order of the queries. Queries which
+    returned no data have `None` as result.
+
+    """
+    rate_limiter = RateLimiter(rate_limit)
+
+    def fetch(query: dict) -> pd.DataFrame | None:
+        return fetch_DI_query(
+            reader,
+            query,
+            max_retries=max_retries,
+            backoff=backoff,
+            rate_limiter=rate_limiter,
+            use_cache=use_cache,
+            cache_folder=cache_folder,
+        )
+
+    if n_workers > 1:
+        with ThreadPoolExecutor(max_workers=n_workers) as executor:
+            return list(executor.map(fetch, queries))
+    else:
+        return [fetch(query) for query in queries]
+
+
+def clear_DI_query_cache(cache_folder: Path | None = None) -> int:
+    """
+    Remove all entries from the DI query cache
+
+    Parameters
+    ----------
+    cache_folder
+        Folder of the cache. Default is `di_query_cache_path`
+
+    Returns
+    -------
+    number of removed cache files
+
+    """
+    if cache_folder is None:
+        cache_folder = di_query_cache_path
+    if not cache_folder.exists():
+        return 0
+    removed = 0
+    for cache_file in cache_folder.glob("*.pkl.gz"):
+        cache_file.unlink(missing_ok=True)
+        removed = removed + 1
+    return removed
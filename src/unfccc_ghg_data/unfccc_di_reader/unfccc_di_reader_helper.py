@@ -5,18 +5,21 @@ The helper functions find the latest read data, determine the filename from coun
 code and other parameters of a dataset, find present data based on hashes etc.
 """
 
-import json
 import re
 from datetime import date
 from pathlib import Path
 from typing import Optional, Union
 
+import xarray as xr
+
 from unfccc_ghg_data.helper import (
     custom_country_mapping,
     dataset_path_UNFCCC,
     extracted_data_path_UNFCCC,
+    folder_mapping_index,
     get_country_code,
     get_country_name,
+    get_dataset_hash,
     root_path,
 )
 from unfccc_ghg_data.unfccc_crf_reader.unfccc_crf_reader_core import find_latest_date
@@ -51,16 +54,16 @@ def determine_filename(
 
     """
     # get the country folder
-    with open(extracted_data_path_UNFCCC / "folder_mapping.json") as mapping_file:
-        folder_mapping = json.load(mapping_file)
+    country_folders = folder_mapping_index.get_folders(
+        extracted_data_path_UNFCCC, country_code
+    )
 
-    if country_code in folder_mapping:
+    if country_folders:
         file_filter = {}
         file_filter["party"] = country_code
-        country_folders = folder_mapping[country_code]
-        if isinstance(country_folders, str):
+        if len(country_folders) == 1:
             # only one folder
-            country_folder = extracted_data_path_UNFCCC / country_folders
+            country_folder = extracted_data_path_UNFCCC / country_folders[0]
         else:
             raise ValueError(  # noqa: TRY003
                 "More than one output folder for country "
@@ -240,16 +243,16 @@ def get_present_hashes_for_country_DI(
         regex_hash = regex_hash + "hash\\.nc"
 
     # get the country folder
-    with open(extracted_data_path_UNFCCC / "folder_mapping.json") as mapping_file:
-        folder_mapping = json.load(mapping_file)
+    country_folders = folder_mapping_index.get_folders(
+        extracted_data_path_UNFCCC, country_code
+    )
 
-    if country_code in folder_mapping:
+    if country_folders:
         file_filter = {}
         file_filter["party"] = country_code
-        country_folders = folder_mapping[country_code]
-        if isinstance(country_folders, str):
+        if len(country_folders) == 1:
             # only one folder
-            country_folder = extracted_data_path_UNFCCC / country_folders
+            country_folder = extracted_data_path_UNFCCC / country_folders[0]
         else:
             raise ValueError(  # noqa: TRY003
                 "More than one output folder for country "
@@ -277,6 +280,29 @@ def get_present_hashes_for_country_DI(
         return []
 
 
+def get_DI_data_hash(
+    data_pm2: xr.Dataset,
+) -> str:
+    """
+    Get the hash of DI data used in the filenames to detect changed data
+
+    The scenario coordinate (which contains the date the data was read or
+    processed) is not part of the hash. The hash is calculated from the native
+    primap2 data without converting it to interchange format (see
+    `unfccc_ghg_data.helper.get_dataset_hash`)
+
+    Parameters
+    ----------
+    data_pm2
+        DI data in primap2 native format
+
+    Returns
+    -------
+        the hash (32 hex characters)
+    """
+    return get_dataset_hash(data_pm2, exclude_coords=[data_pm2.attrs["scen"]])
+
+
 def find_latest_DI_data(
     country_code: str,
     raw: bool = True,
@@ -291,16 +317,16 @@ def find_latest_DI_data(
         # regex = f"{country_code}_DI_{regex_date}" + r"\.nc"
 
     # get the country folder
-    with open(extracted_data_path_UNFCCC / "folder_mapping.json") as mapping_file:
-        folder_mapping = json.load(mapping_file)
+    country_folders = folder_mapping_index.get_folders(
+        extracted_data_path_UNFCCC, country_code
+    )
 
-    if country_code in folder_mapping:
+    if country_folders:
         file_filter = {}
         file_filter["party"] = country_code
-        country_folders = folder_mapping[country_code]
-        if isinstance(country_folders, str):
+        if len(country_folders) == 1:
             # only one folder
-            country_folder = extracted_data_path_UNFCCC / country_folders
+            country_folder = extracted_data_path_UNFCCC / country_folders[0]
         else:
             raise ValueError(  # noqa: TRY003
                 "More than one output folder for country "
@@ -4,20 +4,31 @@ Input and output functions for the DI reader
 Saving single country datasets and country groups datasets
 """
 
+from pathlib import Path
+
 import datalad.api
 import primap2 as pm2
 import xarray as xr
-from dask.base import tokenize
 
-from unfccc_ghg_data.helper import root_path
+from unfccc_ghg_data.helper import compression as default_compression
+from unfccc_ghg_data.helper import (
+    root_path,
+    write_interchange_format_streaming,
+    write_netcdf_streaming,
+)
 
-from .unfccc_di_reader_helper import determine_dataset_filename, determine_filename
+from .unfccc_di_reader_helper import (
+    determine_dataset_filename,
+    determine_filename,
+    get_DI_data_hash,
+)
 
 
 def save_DI_country_data(
     data_pm2: xr.Dataset,
     raw: bool = True,
-):
+    compression: dict | None = None,
+) -> Path:
     """
     Save primap2 and IF data to country folder
 
@@ -29,16 +40,16 @@ def save_DI_country_data(
         Data to be saved
     raw (bool: default = True)
         True if the data in raw, false if it is processed data
+    compression (dict: optional)
+        Encoding used for all data variables in the netCDF file. Default is
+        `unfccc_ghg_data.helper.compression` (zlib level 9)
 
     Returns
     -------
-    nothing
+    Path of the saved primap2 native format (netCDF) file
     """
-    # preparations
-    data_if = data_pm2.pr.to_interchange_format()
-
     ## get country
-    countries = data_if[data_pm2.attrs["area"]].unique()
+    countries = data_pm2.coords[data_pm2.attrs["area"]].to_numpy()
     if len(countries) > 1:
         raise ValueError(  # noqa: TRY003
             f"More than one country in input data. This function can only"
@@ -49,7 +60,7 @@ def save_DI_country_data(
 
     ## get timestamp
     scenario_col = data_pm2.attrs["scen"]
-    scenarios = data_if[scenario_col].unique()
+    scenarios = data_pm2.coords[scenario_col].to_numpy()
     if len(scenarios) > 1:
         raise ValueError(  # noqa: TRY003
             f"More than one scenario in input data. This function can only"
@@ -61,39 +72,15 @@ def save_DI_country_data(
     date_str = scenario[2:]
 
     # calculate the hash of the data to see if it's identical to present data
-    data_for_token = data_if.drop(columns=[scenario_col])
-    token = tokenize(data_for_token)
+    token = get_DI_data_hash(data_pm2)
 
     # get the filename with the hash and check if it exists (separate for pm2 format
     # and IF to fix broken datasets if necessary)
     filename_hash = root_path / determine_filename(country_code, token, raw, hash=True)
 
-    # primap2 native format
-    filename_hash_nc = filename_hash.parent / (filename_hash.name + ".nc")
-    if not (filename_hash_nc.exists() or filename_hash_nc.is_symlink()):
-        # if parent dir does not exist create it
-        if not filename_hash.parent.exists():
-            filename_hash.parent.mkdir()
-        # save the data
-        print(f"Data has changed. Save to {filename_hash_nc.name}")
-        compression = dict(zlib=True, complevel=9)
-        encoding = {var: compression for var in data_pm2.data_vars}
-        data_pm2.pr.to_netcdf(filename_hash_nc, encoding=encoding)
-    elif not filename_hash_nc.exists() and filename_hash_nc.is_symlink():
-        # This means that we have a broken symlink and need to download the data
-        datalad.api.get(filename_hash_nc)
-
-    # primap2 IF
-    filename_hash_csv = filename_hash.parent / (filename_hash.name + ".csv")
-    if not (filename_hash_csv.exists() or filename_hash_csv.is_symlink()):
-        # save the data
-        print(f"Data has changed. Save to {filename_hash.name + '.csv/.yaml'}")
-        pm2.pm2io.write_interchange_format(filename_hash, data_if)
-    else:
-        print(f"Data unchanged for {country_code}. Create symlinks.")
-        if not filename_hash_csv.exists() and filename_hash_csv.is_symlink():
-            # This means that we have a broken symlink and need to download the data
-            datalad.api.get(filename_hash_csv)
+    filename_hash_nc = write_DI_data_files(
+        data_pm2, filename_hash, name=country_code, compression=compression
+    )
 
     # get the filename with the date
     filename_date = root_path / determine_filename(country_code, date_str, raw)
@@ -107,12 +94,16 @@ def save_DI_country_data(
             file_date.unlink()
         file_date.symlink_to(file_hash)
 
+    return filename_hash_nc
+
 
 def save_DI_dataset(
     data_pm2: xr.Dataset,
     raw: bool = True,
     annexI: bool = False,
-):
+    compression: dict | None = None,
+    streaming: bool = False,
+) -> Path:
     """
     Save primap2 and IF data to dataset folder
 
@@ -127,17 +118,24 @@ def save_DI_dataset(
     annexI (bool: default = False)
         True if the data to save is from annexI countries, false if it's from
         non-annexi countries
+    compression (dict: optional)
+        Encoding used for all data variables in the netCDF file. Default is
+        `unfccc_ghg_data.helper.compression` (zlib level 9). Faster settings
+        (e.g. a lower level or `{"compression": "lzf"}`) can be used for large
+        datasets
+    streaming (bool: default = False)
+        Write lazily loaded (dask backed) data chunk by chunk and country by country
+        without loading it into memory (see `write_DI_data_files`)
 
     Returns
     -------
-    nothing
+    Path of the saved primap2 native format (netCDF) file
     """
     """
     save primap2 and IF data to dataset folder
     can be used for raw and processed data but not to save to country folders
     """
     # preparations
-    data_if = data_pm2.pr.to_interchange_format()
     if annexI:
         country_group = "AnnexI"
     else:
@@ -145,7 +143,7 @@ def save_DI_dataset(
 
     ## get timestamp
     scenario_col = data_pm2.attrs["scen"]
-    scenarios = data_if[scenario_col].unique()
+    scenarios = data_pm2.coords[scenario_col].to_numpy()
     if len(scenarios) > 1:
         raise ValueError(  # noqa: TRY003
             f"More than one scenario in input data. This function can only"
@@ -157,26 +155,93 @@ def save_DI_dataset(
     date_str = scenario[2:]
 
     # calculate the hash of the data to see if it's identical to present data
-    data_for_token = data_if.drop(columns=[scenario_col])
-    token = tokenize(data_for_token)
+    token = get_DI_data_hash(data_pm2)
 
     # get the filename with the hash and check if it exists (separate for pm2 format
     # and IF to fix broken datasets if necessary)
     filename_hash = root_path / determine_dataset_filename(
         token, raw, annexI=annexI, hash=True
     )
+    filename_hash_nc = write_DI_data_files(
+        data_pm2,
+        filename_hash,
+        name=country_group,
+        compression=compression,
+        streaming=streaming,
+    )
+
+    # get the filename with the date
+    filename_date = root_path / determine_dataset_filename(
+        date_str, raw=raw, annexI=annexI, hash=False
+    )
+
+    # create the symlinks to the actual data (with the hash)
+    suffixes = [".nc", ".csv", ".yaml"]
+    for suffix in suffixes:
+        file_date = filename_date.parent / (filename_date.name + suffix)
+        file_hash = filename_hash.name + suffix
+        if file_date.exists():
+            file_date.unlink()
+        file_date.symlink_to(file_hash)
+
+    return filename_hash_nc
+
+
+def write_DI_data_files(
+    data_pm2: xr.Dataset,
+    filename_hash: Path,
+    name: str,
+    compression: dict | None = None,
+    streaming: bool = False,
+) -> Path:
+    """
+    Write DI data in primap2 native format and interchange format
+
+    Files which are already present are not written again (broken symlinks are
+    fixed by getting the data via datalad). The interchange format is only created
+    if the csv file has to be written.
+
+    In streaming mode the netCDF file is written chunk by chunk and the
+    interchange format country by country (see
+    `unfccc_ghg_data.helper.write_netcdf_streaming` and
+    `unfccc_ghg_data.helper.write_interchange_format_streaming`), so lazily
+    loaded data is never completely in memory.
+
+    Parameters
+    ----------
+    data_pm2
+        Data to be saved
+    filename_hash
+        path and filename (including the hash but without suffix)
+    name
+        name of the country or country group used in messages
+    compression
+        Encoding used for all data variables in the netCDF file. Default is
+        `unfccc_ghg_data.helper.compression`
+    streaming
+        Write the data chunk by chunk
+
+    Returns
+    -------
+    Path of the netCDF file
+    """
+    if compression is None:
+        compression = default_compression
+
+    # if parent dir does not exist create it
+    if not filename_hash.parent.exists():
+        filename_hash.parent.mkdir()
+
     # primap2 native format
     filename_hash_nc = filename_hash.parent / (filename_hash.name + ".nc")
     if not (filename_hash_nc.exists() or filename_hash_nc.is_symlink()):
-        # if parent dir does not exist create it
-        # TODO double, also in determine_dataset_filename. same for country data
-        if not filename_hash.parent.exists():
-            filename_hash.parent.mkdir()
         # save the data
         print(f"Data has changed. Save to {filename_hash_nc.name}")
-        compression = dict(zlib=True, complevel=9)
         encoding = {var: compression for var in data_pm2.data_vars}
-        data_pm2.pr.to_netcdf(filename_hash_nc, encoding=encoding)
+        if streaming:
+            write_netcdf_streaming(filename_hash_nc, data_pm2, encoding=encoding)
+        else:
+            data_pm2.pr.to_netcdf(filename_hash_nc, encoding=encoding)
     elif not filename_hash_nc.exists() and filename_hash_nc.is_symlink():
         # This means that we have a broken symlink and need to download the data
         datalad.api.get(filename_hash_nc)
@@ -186,23 +251,15 @@ def save_DI_dataset(
     if not (filename_hash_csv.exists() or filename_hash_csv.is_symlink()):
         # save the data
         print(f"Data has changed. Save to {filename_hash.name + '.csv/.yaml'}")
-        pm2.pm2io.write_interchange_format(filename_hash, data_if)
+        if streaming:
+            write_interchange_format_streaming(filename_hash, data_pm2)
+        else:
+            data_if = data_pm2.pr.to_interchange_format()
+            pm2.pm2io.write_interchange_format(filename_hash, data_if)
     else:
-        print(f"Data unchanged for {country_group}. Create symlinks.")
+        print(f"Data unchanged for {name}. Create symlinks.")
         if not filename_hash_csv.exists() and filename_hash_csv.is_symlink():
             # This means that we have a broken symlink and need to download the data
             datalad.api.get(filename_hash_csv)
 
-    # get the filename with the date
-    filename_date = root_path / determine_dataset_filename(
-        date_str, raw=raw, annexI=annexI, hash=False
-    )
-
-    # create the symlinks to the actual data (with the hash)
-    suffixes = [".nc", ".csv", ".yaml"]
-    for suffix in suffixes:
-        file_date = filename_date.parent / (filename_date.name + suffix)
-        file_hash = filename_hash.name + suffix
-        if file_date.exists():
-            file_date.unlink()
-        file_date.symlink_to(file_hash)
+    return filename_hash_nc
@@ -3,14 +3,25 @@ Functions for the processing of DI data
 """
 
 import re
+import traceback
+from concurrent.futures import ProcessPoolExecutor
 from copy import deepcopy
 from datetime import date
+from itertools import repeat
 from typing import Optional, Union
 
+import pandas as pd
 import primap2 as pm2
 import xarray as xr
 
-from unfccc_ghg_data.helper import gas_baskets, nAI_countries, process_data_for_country
+from unfccc_ghg_data.helper import (
+    ProcessingProfiler,
+    concat_area_datasets,
+    gas_baskets,
+    log_path,
+    nAI_countries,
+    process_data_for_country,
+)
 
 from .unfccc_di_reader_config import cat_conversion, di_processing_info
 from .unfccc_di_reader_helper import determine_filename, find_latest_DI_data
@@ -22,9 +33,12 @@ def process_and_save_UNFCCC_DI_for_country(
     country_code: str,
     date_str: Union[str, None] = None,
     no_save: bool = False,
+    profiler: ProcessingProfiler | None = None,
 ) -> xr.Dataset:
     """
     Process data and save them to disk using default parameters
+
+    If a `ProcessingProfiler` is given, the processing steps are recorded in it.
     """
     # get latest dataset if no date given
     if date_str is None:
@@ -72,6 +86,7 @@ def process_and_save_UNFCCC_DI_for_country(
         # category_conversion=cat_conversion,
         sectors_out=None,
         processing_info_country=processing_info_country,
+        profiler=profiler,
     )
 
     # save
@@ -84,7 +99,7 @@ def process_and_save_UNFCCC_DI_for_country(
     return data_processed
 
 
-def process_UNFCCC_DI_for_country(  # noqa: PLR0913
+def process_UNFCCC_DI_for_country(  # noqa: PLR0912, PLR0913
     data_country: xr.Dataset,
     entities_to_ignore: list[str],
     gas_baskets: dict[str, list[str]],
@@ -92,6 +107,7 @@ def process_UNFCCC_DI_for_country(  # noqa: PLR0913
     category_conversion: dict[str, dict] | None = None,
     sectors_out: list[str] | None = None,
     processing_info_country: dict | None = None,
+    profiler: ProcessingProfiler | None = None,
 ) -> xr.Dataset:
     """
     Process data from DI interface (where necessary).
@@ -121,6 +137,9 @@ def process_UNFCCC_DI_for_country(  # noqa: PLR0913
         Categories to return
     processing_info_country: dict[str, dict] | None = None
         more detailed processing info TODO: explain format
+    profiler: ProcessingProfiler | None = None
+        If given, the run time, memory use and dataset size of each processing step
+        are recorded in the profiler
 
     Returns
     -------
@@ -162,12 +181,16 @@ def process_UNFCCC_DI_for_country(  # noqa: PLR0913
     # fill net emissions from actual emissions where necessary (e.g. 24540 for
     # individual fgases)
     if "Actual emissions" in data_country.coords["measure"].to_numpy():
+        if profiler is not None:
+            profiler.start(data_country)
         data_country = data_country.pr.set(
             "measure",
             "Net emissions/removals",
             data_country.pr.loc[{"measure": "Actual emissions"}],
             existing="fillna",
         )
+        if profiler is not None:
+            profiler.record("fill_net_emissions", data_country)
 
     # 3: map categories
     if country_code in nAI_countries:
@@ -190,18 +213,126 @@ def process_UNFCCC_DI_for_country(  # noqa: PLR0913
         category_conversion=category_conversion,
         sectors_out=sectors_out,
         processing_info_country=processing_info_country_scen,
+        batch_subtract_cats=True,
+        profiler=profiler,
     )
 
     return data_country
 
 
+def profile_UNFCCC_DI_processing(
+    countries: list[str] | None = None,
+    date_str: str | None = None,
+) -> pd.DataFrame:
+    """
+    Profile the processing of DI data for several countries
+
+    The data of each country is processed without saving it and the run time, memory
+    use and dataset size of the processing steps are written to
+    ``log/processing_profiles/DI_<country>.json`` (and .csv) using
+    `ProcessingProfiler`. The steps of all countries are combined in
+    ``log/processing_profiles/DI_all_countries.csv``. If the processing fails for a
+    country the traceback is printed and the profile of the country ends with a
+    step "failed" with the error in the "error" column.
+
+    Parameters
+    ----------
+    countries: list[str] | None = None
+        Country codes of the countries to process. Default: all countries with
+        specific processing info in `di_processing_info`
+    date_str: str | None = None
+        Date of the data to be processed in the format %Y-%m-%d (e.g. 2023-01-30). If
+        no date is given the last data read will be processed.
+
+    Returns
+    -------
+        pd.DataFrame with the processing steps of all countries (empty if no
+        countries are given)
+    """
+    if countries is None:
+        countries = list(di_processing_info)
+    if not countries:
+        return pd.DataFrame()
+
+    profile_folder = log_path / "processing_profiles"
+    profiles = []
+    for country_code in countries:
+        profiler = ProcessingProfiler(f"DI_{country_code}", folder=profile_folder)
+        try:
+            # the profiler records the error if the processing fails
+            with profiler:
+                process_and_save_UNFCCC_DI_for_country(
+                    country_code, date_str=date_str, no_save=True, profiler=profiler
+                )
+        except Exception:
+            print(f"Processing DI data failed for {country_code}:")
+            traceback.print_exc()
+        profile = pd.DataFrame(profiler.records)
+        profile.insert(0, "country", country_code)
+        profiles.append(profile)
+
+    profiles = pd.concat(profiles, ignore_index=True)
+    profile_folder.mkdir(parents=True, exist_ok=True)
+    profiles.to_csv(profile_folder / "DI_all_countries.csv", index=False)
+    return profiles
+
+
+def process_and_save_UNFCCC_DI_for_country_in_group(
+    country_code: str,
+    date_str: str | None = None,
+) -> dict:
+    """
+    Process and save DI data for a country as part of a country group
+
+    Errors are caught, so that the processing of the group can continue for the
+    other countries. Only the location of the saved data is returned (and not the
+    data itself) so the function can run in a separate process without sending the
+    data back.
+
+    Parameters
+    ----------
+    country_code: str
+        ISO 3 letter code of the country
+    date_str: str (default None)
+        Date of the data to be processed in the format %Y-%m-%d (e.g. 2023-01-30). If
+        no date is given the last data read will be processed.
+
+    Returns
+    -------
+        dict with the keys "country", "file" (the netCDF file with the processed data
+        or None if no data is left after processing) and "error" (the error message
+        if an error occurred, else None)
+    """
+    print(f"processing DI data for country {country_code}")
+    result = {"country": country_code, "file": None, "error": None}
+    try:
+        data_country = process_and_save_UNFCCC_DI_for_country(
+            country_code=country_code,
+            date_str=date_str,
+            no_save=True,
+        )
+        if data_country.coords["time"].to_numpy().size > 0:
+            result["file"] = save_DI_country_data(data_country, raw=False)
+        else:
+            print(f"No data left after processing for {country_code}")
+    except Exception as err:
+        result["error"] = str(err)
+    return result
+
+
 def process_UNFCCC_DI_for_country_group(
     annexI: bool = False,
     date_str: Optional[str] = None,
+    n_workers: int = 1,
+    compression: dict | None = None,
 ) -> xr.Dataset:
     """
     Process DI data for all countries in a group (annexI or non-AnnexI)
 
+    The countries are processed and saved individually (in parallel if `n_workers`
+    is larger than 1). Afterwards, the processed data is combined along the area
+    dimension in one step.
+
     Parameters
     ----------
     annexI: bool (default False)
@@ -210,6 +341,11 @@ def process_UNFCCC_DI_for_country_group(
     date_str: str (default None)
         Date of the data to be processed in the format %Y-%m-%d (e.g. 2023-01-30). If
         no date is given the last data read will be processed.
+    n_workers: int (default 1)
+        Number of processes used to process countries in parallel
+    compression: dict (optional)
+        netCDF encoding for the data variables of the group dataset (see
+        `save_DI_dataset`). Default is zlib level 9
 
     Returns
     -------
@@ -227,19 +363,34 @@ def process_UNFCCC_DI_for_country_group(
         # country_group = "AnnexI"
     else:
         countries = nAI_countries
-        data_all = None
         country_group = "non-AnnexI"
 
-    # read the data
-    exception_countries = []
-    for country in countries:
-        print(f"processing DI data for country {country}")
-
-        try:
-            data_country = process_and_save_UNFCCC_DI_for_country(
-                country_code=country,
-                date_str=date_str,
+    # process and save the data for the individual countries
+    if n_workers > 1:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            results = list(
+                executor.map(
+                    process_and_save_UNFCCC_DI_for_country_in_group,
+                    countries,
+                    repeat(date_str),
+                )
             )
+    else:
+        results = [
+            process_and_save_UNFCCC_DI_for_country_in_group(country, date_str)
+            for country in countries
+        ]
+
+    # read the processed data
+    exception_countries = []
+    data_countries = []
+    for result in results:
+        if result["error"] is not None:
+            exception_countries.append(result["country"])
+            print(f"Error occurred when processing data for {result['country']}.")
+            print(result["error"])
+        elif result["file"] is not None:
+            data_country = pm2.open_dataset(result["file"])
 
             # change the scenario to today's date
             data_country = data_country.assign_coords(
@@ -248,15 +399,10 @@ def process_UNFCCC_DI_for_country_group(
             scen_dim = data_country.attrs["scen"]
             data_country.attrs["scen"] = "scenario (Process_Date)"
             data_country = data_country.rename({scen_dim: data_country.attrs["scen"]})
+            data_countries.append(data_country)
 
-            if data_all is None:
-                data_all = data_country
-            else:
-                data_all = data_all.pr.merge(data_country)
-        except Exception as err:
-            exception_countries.append(country)
-            print(f"Error occurred when processing data for {country}.")
-            print(err)
+    # countries don't overlap, so they can be concatenated instead of merged
+    data_all = concat_area_datasets(data_countries)
 
     # update metadata
     countries_present = list(data_all.coords[data_all.attrs["area"]].values)
@@ -269,7 +415,7 @@ def process_UNFCCC_DI_for_country_group(
     )
 
     # save the data
-    save_DI_dataset(data_all, raw=False, annexI=annexI)
+    save_DI_dataset(data_all, raw=False, annexI=annexI, compression=compression)
     print(data_all.coords["scenario (Process_Date)"].values)
     print(f"Errors occured for countries: {exception_countries}")
     return data_all
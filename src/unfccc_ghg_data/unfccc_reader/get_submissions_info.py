@@ -5,12 +5,12 @@ helper functions to get information on available submissions
 and data reading functions for a given country
 """
 
-import json
 from pathlib import Path
 
 from unfccc_ghg_data.helper import (
     downloaded_data_path,
     extracted_data_path,
+    folder_mapping_index,
     get_country_code,
     root_path,
 )
@@ -53,20 +53,11 @@ def get_possible_inputs(
     input_files = []
     for item in data_folder.iterdir():
         if item.is_dir():
-            with open(item / "folder_mapping.json") as mapping_file:
-                folder_mapping = json.load(mapping_file)
-
-            if country_code in folder_mapping:
-                country_folders = folder_mapping[country_code]
-                if isinstance(country_folders, str):
-                    # only one folder
-                    country_folders = [country_folders]
-
-                for country_folder in country_folders:
-                    input_folder = item / country_folder / submission
-                    if input_folder.exists():
-                        for filepath in input_folder.glob("*"):
-                            input_files.append(filepath.relative_to(root_path))
+            for country_folder in folder_mapping_index.get_folders(item, country_code):
+                input_folder = item / country_folder / submission
+                if input_folder.exists():
+                    for filepath in input_folder.glob("*"):
+                        input_files.append(filepath.relative_to(root_path))
 
     if print_info:
         if input_files:
@@ -112,22 +103,13 @@ def get_possible_outputs(
     output_files = []
     for item in data_folder.iterdir():
         if item.is_dir():
-            with open(item / "folder_mapping.json") as mapping_file:
-                folder_mapping = json.load(mapping_file)
-
-            if country_code in folder_mapping:
-                country_folders = folder_mapping[country_code]
-                if isinstance(country_folders, str):
-                    # only one folder
-                    country_folders = [country_folders]
-
-                for country_folder in country_folders:
-                    output_folder = item / country_folder
-                    if output_folder.exists():
-                        for filepath in output_folder.glob(
-                            country_code + "_" + submission + "*"
-                        ):
-                            output_files.append(filepath.relative_to(root_path))
+            for country_folder in folder_mapping_index.get_folders(item, country_code):
+                output_folder = item / country_folder
+                if output_folder.exists():
+                    for filepath in output_folder.glob(
+                        country_code + "_" + submission + "*"
+                    ):
+                        output_files.append(filepath.relative_to(root_path))
 
     if print_info:
         if output_files:
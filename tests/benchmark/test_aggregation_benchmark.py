@@ -0,0 +1,105 @@
+"""
+Benchmark for the aggregation of categories in the conversion of DI data
+
+The BURDI categories of the conversion to IPCC2006_PRIMAP used in the DI processing
+are filled with random data and converted with the aggregation planner and with
+PRIMAP2's ``add_aggregates_coordinates``.
+
+Run with `pytest tests/benchmark -m benchmark -s` to see the results.
+"""
+
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+
+from unfccc_ghg_data.helper import add_aggregates_coordinates_planned
+from unfccc_ghg_data.unfccc_di_reader.unfccc_di_reader_config import (
+    cat_conversion,
+    gwp_to_use,
+)
+
+pytestmark = pytest.mark.benchmark
+
+conversion = cat_conversion["BURDI_to_IPCC2006_PRIMAP"]
+
+
+def make_converted_dataset(n_entities, n_years=30):
+    """Random data after mapping the categories to IPCC2006_PRIMAP"""
+    rng = np.random.default_rng(1)
+    # aggregated categories are not in the data, so there are no conflicts
+    categories = [
+        cat
+        for cat in dict.fromkeys(conversion["mapping"].values())
+        if cat not in conversion["aggregate"]
+    ]
+    entities = {
+        "CO2": "Gg CO2 / year",
+        "CH4": "Gg CH4 / year",
+        "N2O": "Gg N2O / year",
+        f"KYOTOGHG ({gwp_to_use})": "Gg CO2 / year",
+    }
+    for idx in range(n_entities - len(entities)):
+        entities[f"HFC{idx}"] = "Gg / year"
+    dims = [
+        "time",
+        "area (ISO3)",
+        "category (IPCC2006_PRIMAP)",
+        "scenario (PRIMAP)",
+        "source",
+    ]
+    shape = (n_years, 1, len(categories), 1, 1)
+    data_vars = {}
+    for entity, unit in entities.items():
+        values = rng.random(shape) * 100
+        values[rng.random(shape) < 0.2] = np.nan
+        attrs = {"units": unit, "entity": entity.split(" (")[0]}
+        if " (" in entity:
+            attrs["gwp_context"] = gwp_to_use
+        data_vars[entity] = (dims, values, attrs)
+    ds = xr.Dataset(
+        data_vars,
+        coords={
+            "time": pd.date_range("1990", periods=n_years, freq="YS"),
+            "area (ISO3)": ["ALB"],
+            "category (IPCC2006_PRIMAP)": categories,
+            "orig_cat_name": (
+                "category (IPCC2006_PRIMAP)",
+                [f"Category {cat}" for cat in categories],
+            ),
+            "scenario (PRIMAP)": ["DI2023-05-24"],
+            "source": ["UNFCCC"],
+        },
+        attrs={
+            "area": "area (ISO3)",
+            "cat": "category (IPCC2006_PRIMAP)",
+            "scen": "scenario (PRIMAP)",
+            "title": "Random data for ALB",
+        },
+    )
+    return ds.pr.quantify()
+
+
+@pytest.mark.parametrize("n_entities", [10, 40])
+@pytest.mark.parametrize("planned", [False, True], ids=["primap2", "planned"])
+def test_benchmark_aggregate_categories(planned, n_entities):
+    ds = make_converted_dataset(n_entities)
+    agg_info = {"category": conversion["aggregate"]}
+
+    start = time.perf_counter()
+    if planned:
+        result = add_aggregates_coordinates_planned(ds, agg_info)
+    else:
+        result = ds.pr.add_aggregates_coordinates(agg_info=agg_info)
+    duration = time.perf_counter() - start
+
+    print(
+        f"\nBURDI_to_IPCC2006_PRIMAP aggregation "
+        f"({'planned' if planned else 'primap2'}), {n_entities} entities: "
+        f"{duration:.2f} s"
+    )
+    assert set(conversion["aggregate"]).issubset(
+        result.indexes["category (IPCC2006_PRIMAP)"]
+    )
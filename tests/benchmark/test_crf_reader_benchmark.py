@@ -0,0 +1,83 @@
+"""
+Benchmarks for the CRF reader
+
+Run with `pytest tests/benchmark -m benchmark -s` to see the results.
+"""
+
+import time
+from copy import deepcopy
+
+import openpyxl
+import pytest
+
+from unfccc_ghg_data.unfccc_crf_reader import crf_specifications as crf
+from unfccc_ghg_data.unfccc_crf_reader import unfccc_crf_reader_cache
+from unfccc_ghg_data.unfccc_crf_reader.crf_specifications.util import unit_info
+from unfccc_ghg_data.unfccc_crf_reader.unfccc_crf_reader_core import (
+    prep_specification,
+    read_crf_table_from_file,
+)
+
+pytestmark = pytest.mark.benchmark
+
+n_years = 35
+
+
+def write_table_from_spec(path, table, specification, country):
+    """Write a sheet with the row headers of a specification in the given order"""
+    mapping = prep_specification(deepcopy(specification), country)
+    row_headers = [cat[0][0] for cat in mapping]
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.title = table
+    sheet.append([f"{table} title"])
+    sheet.append([])
+    sheet.append([None, "CATEGORIES", "CO2", "CH4", "N2O"])
+    sheet.append([None, None, "(kt)", "(kt)", "(kt)"])
+    for idx, row_header in enumerate(row_headers):
+        sheet.append([None, row_header, idx * 1.5, "NO", idx])
+    sheet.append([None, "END OF TABLE", None, None, None])
+    workbook.save(path)
+    return len(row_headers)
+
+
+@pytest.mark.parametrize("table", ["Table1", "Table1.A(a)s4"])
+def test_benchmark_read_crf_table_from_file(monkeypatch, tmp_path, table):
+    # the xlsx parsing is taken from the cache, so we measure the processing of
+    # the table and especially the category mapping
+    monkeypatch.setattr(
+        unfccc_crf_reader_cache, "crf_sheet_cache_path", tmp_path / "cache"
+    )
+    spec = crf.CRT1[table]
+    file = tmp_path / "DEU-CRT-2025-V1.0-2000-20250101-000000.xlsx"
+    n_rows = write_table_from_spec(file, table, spec["sector_mapping"], "DEU")
+    table_spec = {
+        "status": "tested",
+        "table": {
+            "firstrow": 3,
+            "lastrow": n_rows + 10,
+            "header": ["entity", "unit"],
+            "col_for_categories": "CATEGORIES",
+            "categories": spec["table"]["categories"],
+            "cols_to_ignore": [],
+            "stop_cats": ["END OF TABLE"],
+            "unit_info": unit_info["default"],
+        },
+        "sector_mapping": spec["sector_mapping"],
+    }
+    # fill the cache
+    read_crf_table_from_file(file, table, table_spec, use_cache=True)
+
+    start = time.perf_counter()
+    for _ in range(n_years):
+        df_table, unknown_categories, _ = read_crf_table_from_file(
+            file, table, table_spec, use_cache=True
+        )
+    duration = time.perf_counter() - start
+
+    print(
+        f"\n{table}: {n_years * n_rows / duration:.0f} rows/s "
+        f"({n_rows} rows, {n_years} files, {duration:.2f} s)"
+    )
+    assert unknown_categories == []
+    assert len(df_table) == n_rows * 3
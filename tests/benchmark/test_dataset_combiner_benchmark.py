@@ -0,0 +1,110 @@
+"""
+Benchmark for combining per table / per country datasets
+
+Builds a dataset with the structure of a raw CRT1 dataset (all tested CRT1 tables
+for several countries) from synthetic per table datasets, once by combining the
+datasets one by one and once with the `DatasetCombiner`. The combiner has to give
+the same result while only allocating memory for the final dataset.
+
+Run with `pytest tests/benchmark -m benchmark -s` to see the results.
+"""
+
+import time
+import tracemalloc
+
+import numpy as np
+import pytest
+import xarray as xr
+
+from unfccc_ghg_data.helper import DatasetCombiner
+from unfccc_ghg_data.unfccc_crf_reader import crf_specifications as crf
+
+pytestmark = pytest.mark.benchmark
+
+n_countries = 8
+n_years = 35
+entities = ["CO2", "CH4", "N2O"]
+
+
+def make_table_datasets(country):
+    """Synthetic per table datasets with the categories of the CRT1 tables"""
+    rng = np.random.default_rng(len(country))
+    datasets = []
+    for table, table_spec in crf.CRT1.items():
+        if table_spec["status"] != "tested":
+            continue
+        categories = sorted(
+            {".".join(mapping[1]) for mapping in table_spec["sector_mapping"]}
+        )
+        shape = (1, len(categories), n_years)
+        datasets.append(
+            xr.Dataset(
+                {
+                    entity: (
+                        ("area (ISO3)", "category (CRT1)", "time"),
+                        rng.random(shape),
+                        {"entity": entity},
+                    )
+                    for entity in entities
+                },
+                coords={
+                    "area (ISO3)": [country],
+                    "category (CRT1)": categories,
+                    "time": np.arange(1990, 1990 + n_years),
+                },
+            )
+        )
+    return datasets
+
+
+def combine_sequential(datasets):
+    ds_all = None
+    for ds in datasets:
+        if ds_all is None:
+            ds_all = ds
+        else:
+            ds_all = ds_all.combine_first(ds)
+    return ds_all
+
+
+def combine_batched(datasets):
+    combiner = DatasetCombiner()
+    for ds in datasets:
+        combiner.add(ds)
+    return combiner.result()
+
+
+def measure(combine_function, datasets):
+    tracemalloc.start()
+    start = time.perf_counter()
+    ds_all = combine_function(datasets)
+    duration = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return ds_all, duration, peak
+
+
+@pytest.mark.parametrize(
+    "combine_function", [combine_sequential, combine_batched], ids=lambda f: f.__name__
+)
+def test_benchmark_combine_datasets(combine_function):
+    # all tables for all countries are combined into one dataset as in
+    # read_year_to_test_specs
+    countries = [f"A{idx:02d}" for idx in range(n_countries)]
+    datasets = [ds for country in countries for ds in make_table_datasets(country)]
+    input_size = sum(ds.nbytes for ds in datasets)
+
+    ds_all, duration, peak = measure(combine_function, datasets)
+
+    print(
+        f"\n{combine_function.__name__}: {len(datasets)} datasets, "
+        f"{duration:.2f} s, additional peak memory {peak / 1024**2:.0f} MB "
+        f"({peak / ds_all.nbytes:.1f} x final dataset of "
+        f"{ds_all.nbytes / 1024**2:.0f} MB, input {input_size / 1024**2:.0f} MB)"
+    )
+    assert list(ds_all["area (ISO3)"].values) == countries
+    if combine_function is combine_batched:
+        # the result arrays are allocated once (plus temporary arrays of the size
+        # of an added variable)
+        assert peak < 1.5 * ds_all.nbytes
+        xr.testing.assert_identical(ds_all, combine_sequential(datasets))
@@ -0,0 +1,55 @@
+"""
+Benchmark for the creation of the folder mappings
+
+The country folders of the repository are copied (without their content) to a
+temporary folder, so the folder mappings in the repository are not changed.
+
+Run with `pytest tests/benchmark -m benchmark -s` to see the results.
+"""
+
+import json
+import time
+
+import pytest
+
+from unfccc_ghg_data.helper import (
+    create_folder_mapping,
+    get_country_code,
+    root_path,
+)
+from unfccc_ghg_data.helper.functions import get_country_name_index
+
+pytestmark = pytest.mark.benchmark
+
+mapped_folders = [
+    "downloaded_data/UNFCCC",
+    "extracted_data/UNFCCC",
+    "legacy_data/UNFCCC",
+]
+
+
+@pytest.mark.parametrize("folder", mapped_folders)
+def test_benchmark_create_folder_mapping(tmp_path, folder):
+    country_folders = [
+        item.name for item in (root_path / folder).iterdir() if item.is_dir()
+    ]
+    if not country_folders:
+        pytest.skip(f"{folder} has no country folders")
+    for name in country_folders:
+        (tmp_path / name).mkdir()
+
+    for cache in ["cold", "warm"]:
+        if cache == "cold":
+            get_country_code.cache_clear()
+            get_country_name_index.cache_clear()
+        start = time.perf_counter()
+        create_folder_mapping(tmp_path)
+        duration = time.perf_counter() - start
+        print(
+            f"\n{folder} ({cache} cache): {len(country_folders)} folders in "
+            f"{duration:.3f} s"
+        )
+
+    with open(tmp_path / "folder_mapping.json") as mapping_file:
+        folder_mapping = json.load(mapping_file)
+    assert len(folder_mapping) > 0
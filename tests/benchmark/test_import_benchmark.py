@@ -0,0 +1,67 @@
+"""
+Benchmark for the import time of the CRF reader
+
+Each import is run in a new python process (as for `doit list` or the scripts run
+by datalad), once with a fresh bytecode cache and once with the bytecode cache
+written by the first run.
+
+Run with `pytest tests/benchmark -m benchmark -s` to see the results.
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+pytestmark = pytest.mark.benchmark
+
+import_code = """
+import json, sys, time
+start = time.perf_counter()
+import unfccc_ghg_data.unfccc_crf_reader.unfccc_crf_reader_core
+from unfccc_ghg_data.unfccc_crf_reader import crf_specifications as crf
+import_time = time.perf_counter() - start
+start = time.perf_counter()
+if {load_all}:
+    for name in crf.__all__:
+        getattr(crf, name)
+load_time = time.perf_counter() - start
+spec_modules = [
+    module
+    for module in sys.modules
+    if module.startswith(crf.__name__) and module.endswith("_specification")
+]
+print(json.dumps({{
+    "import_time": import_time,
+    "load_time": load_time,
+    "spec_modules": spec_modules,
+}}))
+"""
+
+
+def run_import(load_all, pycache_prefix):
+    env = dict(os.environ, PYTHONPYCACHEPREFIX=str(pycache_prefix))
+    # the bytecode has to be written for the second run
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    command = [sys.executable, "-c", import_code.format(load_all=load_all)]
+    run_options = dict(capture_output=True, text=True, env=env)
+    result = subprocess.run(command, check=True, **run_options)  # noqa: S603
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+@pytest.mark.parametrize("load_all", [False, True], ids=["lazy", "all_specs"])
+def test_benchmark_import_crf_reader(tmp_path, load_all):
+    for cache in ["cold", "warm"]:
+        result = run_import(load_all, tmp_path / "pycache")
+        print(
+            f"\n{'all specifications' if load_all else 'import only'} ({cache} "
+            f"bytecode cache): import {result['import_time']:.2f} s, loading "
+            f"specifications {result['load_time']:.2f} s, "
+            f"{len(result['spec_modules'])} specification modules imported"
+        )
+        if load_all:
+            assert len(result["spec_modules"]) == 14
+        else:
+            assert result["spec_modules"] == []
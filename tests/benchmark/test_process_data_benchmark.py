@@ -0,0 +1,218 @@
+"""
+Benchmark for the country specific processing of DI data
+
+The processing info is taken from `di_processing_info`. The data is random, so only
+the steps which don't depend on consistent data are used (e.g. no downscaling).
+
+Run with `pytest tests/benchmark -m benchmark -s` to see the results.
+"""
+
+import copy
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+
+from unfccc_ghg_data.helper import process_data_for_country
+from unfccc_ghg_data.unfccc_di_reader.unfccc_di_reader_config import (
+    di_processing_info,
+    gwp_to_use,
+)
+
+pytestmark = pytest.mark.benchmark
+
+processing_steps = ["remove_ts", "move_ts", "interpolate_ts", "basket_copy"]
+
+categories = [
+    "1",
+    "1.A",
+    "1.A.1",
+    "1.A.2",
+    "1.A.3",
+    "1.A.4",
+    "1.A.5",
+    "1.B",
+    "1.B.1",
+    "1.B.2",
+    "2",
+    "2.A",
+    "2.B",
+    "2.C",
+    "2.D",
+    "2.E",
+    "2.F",
+    "2.G",
+    "4",
+    "4.A",
+    "4.B",
+    "4.C",
+    "4.D",
+    "4.E",
+    "4.F",
+    "4.G",
+    "5",
+    "6",
+    "14423",
+    "14424",
+    "14637",
+    "15163",
+    "24540",
+]
+
+
+def make_DI_dataset(country, n_entities, n_years=30, categories=categories):
+    """Random data in the format of DI data after conversion to primap2"""
+    rng = np.random.default_rng(1)
+    entities = {
+        "CO2": "Gg CO2 / year",
+        "CH4": "Gg CH4 / year",
+        "N2O": "Gg N2O / year",
+        f"KYOTOGHG ({gwp_to_use})": "Gg CO2 / year",
+        f"UnspMixOfHFCs ({gwp_to_use})": "Gg CO2 / year",
+        f"UnspMixOfPFCs ({gwp_to_use})": "Gg CO2 / year",
+    }
+    for idx in range(n_entities - len(entities)):
+        entities[f"HFC{idx}"] = "Gg / year"
+    dims = ["time", "area (ISO3)", "category (BURDI)", "scenario (PRIMAP)", "source"]
+    shape = (n_years, 1, len(categories), 1, 1)
+    data_vars = {}
+    for entity, unit in entities.items():
+        values = rng.random(shape) * 100
+        values[rng.random(shape) < 0.2] = np.nan
+        attrs = {"units": unit, "entity": entity.split(" (")[0]}
+        if " (" in entity:
+            attrs["gwp_context"] = gwp_to_use
+        data_vars[entity] = (dims, values, attrs)
+    ds = xr.Dataset(
+        data_vars,
+        coords={
+            "time": pd.date_range("1990", periods=n_years, freq="YS"),
+            "area (ISO3)": [country],
+            "category (BURDI)": categories,
+            "scenario (PRIMAP)": ["DI2023-05-24"],
+            "source": ["UNFCCC"],
+        },
+        attrs={
+            "area": "area (ISO3)",
+            "cat": "category (BURDI)",
+            "scen": "scenario (PRIMAP)",
+            "title": f"Random data for {country}",
+        },
+    )
+    return ds.pr.quantify()
+
+
+@pytest.mark.parametrize("n_entities", [10, 40])
+def test_benchmark_process_data_for_country(n_entities):
+    country = "ALB"
+    processing_info = {
+        step: copy.deepcopy(info)
+        for step, info in di_processing_info[country]["DI2023-05-24"].items()
+        if step in processing_steps
+    }
+    # remove data for all entities as well
+    processing_info["remove_ts"]["all_entities"] = {
+        "category": ["2.A", "2.B"],
+        "time": ["2005"],
+    }
+    ds = make_DI_dataset(country, n_entities)
+
+    start = time.perf_counter()
+    result = process_data_for_country(
+        ds, [], {}, processing_info_country=processing_info
+    )
+    duration = time.perf_counter() - start
+
+    print(
+        f"\n{country} ({', '.join(processing_info)}), {n_entities} entities: "
+        f"{duration:.2f} s"
+    )
+    assert "UnspMixOfHFCs (AR6GWP100)" in result.data_vars
+    assert result["CO2"].pr.loc[{"category": "2.A", "time": "2005"}].isnull().all()  # noqa: PD003
+
+
+# categories with data for the generated categories
+categories_generated = [
+    "0",
+    "M.0.EL",
+    "1",
+    "1.A",
+    "1.B",
+    "2",
+    "2.A",
+    "2.B",
+    "3",
+    "3.B",
+    "3.D",
+    "3.C.1",
+    "4",
+    "4.A",
+    "4.B",
+    "5",
+    "15163",
+    "24540",
+]
+
+
+def generated_subtract_cats(n_categories):
+    """Categories generated from the parent and two categories following it"""
+    n = len(categories_generated)
+    return {
+        f"G{idx}": {
+            "parent": categories_generated[idx % n],
+            "subtract": [
+                categories_generated[(idx + 1) % n],
+                categories_generated[(idx + 2) % n],
+            ],
+        }
+        for idx in range(n_categories)
+    }
+
+
+subtract_cats_cases = {
+    # categories depending on each other as in the config for Mexico
+    "mexico": (
+        {
+            "1.A.6": {"parent": "1.A", "subtract": ["1.A.1", "1.A.2", "1.A.3"]},
+            "1.A.7": {"parent": "1.A.6", "subtract": ["1.A.4", "1.A.5"]},
+            "1.B.3": {"parent": "1.B", "subtract": ["1.B.1", "1.B.2"]},
+            "2.H": {"parent": "2", "subtract": ["2.A", "2.B", "2.C", "2.D"]},
+            "2.I": {"parent": "2.H", "subtract": ["2.E", "2.F", "2.G"]},
+            "4.H": {
+                "parent": "4",
+                "subtract": ["4.A", "4.B", "4.C"],
+                "entities": ["CO2"],
+            },
+        },
+        10,
+        categories,
+    ),
+    # many independent categories, the case the batching is made for
+    "generated": (generated_subtract_cats(30), 14, categories_generated),
+}
+
+
+@pytest.mark.parametrize("case", list(subtract_cats_cases))
+@pytest.mark.parametrize("batched", [False, True], ids=["sequential", "batched"])
+def test_benchmark_subtract_cats(batched, case):
+    country = "ALB"
+    subtract_cats, n_entities, case_categories = subtract_cats_cases[case]
+    ds = make_DI_dataset(country, n_entities, categories=case_categories)
+
+    start = time.perf_counter()
+    result = process_data_for_country(
+        ds,
+        [],
+        {},
+        processing_info_country={"subtract_cats": copy.deepcopy(subtract_cats)},
+        batch_subtract_cats=batched,
+    )
+    duration = time.perf_counter() - start
+
+    print(
+        f"\n{country} subtract_cats ({'batched' if batched else 'sequential'}), "
+        f"{len(subtract_cats)} categories, {n_entities} entities: {duration:.2f} s"
+    )
+    assert set(subtract_cats).issubset(result["category (BURDI)"].to_numpy())
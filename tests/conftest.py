@@ -3,3 +3,85 @@ Re-useable fixtures etc. for tests
 
 See https://docs.pytest.org/en/7.1.x/reference/fixtures.html#conftest-py-sharing-fixtures-across-multiple-files
 """
+
+import json
+
+import openpyxl
+import pytest
+
+from unfccc_ghg_data.unfccc_crf_reader.crf_specifications.util import unit_info
+
+synthetic_crf_rows = [
+    ("Total", 3, 4),
+    ("Energy", 1, 2),
+    ("Other", 0.5, "NO"),
+    ("Waste", 2, 2),
+    ("Other", 1, "NE"),
+    ("Note: end of table", None, None),
+]
+
+
+def write_synthetic_crf_file(path, tables, rows=synthetic_crf_rows):
+    """Write a small CRT like xlsx file with one worksheet per table"""
+    workbook = openpyxl.Workbook()
+    workbook.remove(workbook.active)
+    for table in tables:
+        sheet = workbook.create_sheet(table)
+        sheet.append([f"{table} title"])
+        sheet.append([])
+        sheet.append([None, "CATEGORIES", "CO2", "CH4"])
+        sheet.append([None, None, "(kt)", "(kt)"])
+        for row in rows:
+            sheet.append([None, *row])
+    workbook.save(path)
+
+
+@pytest.fixture
+def synthetic_crf_table_spec():
+    """Specification matching the tables written by `write_synthetic_crf_file`"""
+    return {
+        "status": "tested",
+        "table": {
+            "firstrow": 3,
+            "lastrow": 12,
+            "header": ["entity", "unit"],
+            "col_for_categories": "CATEGORIES",
+            "categories": ["category"],
+            "cols_to_ignore": [],
+            "stop_cats": ["Note: end of table"],
+            "unit_info": unit_info["default"],
+        },
+        "sector_mapping": [
+            ["Total", ["0"], 0],
+            ["Energy", ["1"], 1],
+            ["Other", ["1.X"], 2],
+            ["Waste", ["5"], 1],
+            ["Other", ["5.X"], 2],
+        ],
+    }
+
+
+@pytest.fixture
+def synthetic_crf_folder(tmp_path):
+    """Folder with synthetic CRT files for two data years"""
+    for data_year in [2000, 2001]:
+        write_synthetic_crf_file(
+            tmp_path / f"AAA-CRT-2025-V1.0-{data_year}-20250101-000000.xlsx",
+            tables=["Table1"] if data_year == 2001 else ["Table1", "Table2"],
+        )
+    return tmp_path
+
+
+@pytest.fixture
+def synthetic_crf_data_folder(tmp_path):
+    """Data folder with a country folder with synthetic CRT files for DEU, round 1"""
+    data_folder = tmp_path / "downloaded_data"
+    submission_folder = data_folder / "Germany" / "BTR1"
+    submission_folder.mkdir(parents=True)
+    for data_year in [2000, 2001]:
+        write_synthetic_crf_file(
+            submission_folder / f"DEU-CRT-2025-V1.0-{data_year}-20250101-000000.xlsx",
+            tables=["Table1"],
+        )
+    (data_folder / "folder_mapping.json").write_text(json.dumps({"DEU": "Germany"}))
+    return data_folder
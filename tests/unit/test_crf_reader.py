@@ -1,13 +1,51 @@
+import multiprocessing
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from copy import deepcopy
 from pathlib import Path
 
+import numpy as np
+import pandas as pd
+import pytest
+
 from unfccc_ghg_data.helper import downloaded_data_path_UNFCCC
+from unfccc_ghg_data.unfccc_crf_reader import crf_specifications as crf
+from unfccc_ghg_data.unfccc_crf_reader import (
+    unfccc_crf_reader_core,
+    unfccc_crf_reader_prod,
+)
 from unfccc_ghg_data.unfccc_crf_reader.unfccc_crf_reader_core import (
+    CRFFileIndex,
     filter_category,
+    filter_filenames,
     find_latest_version,
+    get_category_index,
+    get_compiled_table_specification,
     get_country_folders,
     get_info_from_crf_filename,
     get_latest_date_for_country,
     get_latest_version_for_country,
+    prep_specification,
+    read_crf_table,
+    read_crf_table_from_file,
+    read_crf_tables,
+)
+from unfccc_ghg_data.unfccc_crf_reader.unfccc_crf_reader_prod import (
+    crf_table_is_up_to_date,
+    get_crf_input_files_key,
+    get_crf_table_fingerprint,
+    load_crf_table_info,
+    load_crf_table_result,
+    process_crf_table,
+    read_new_crf_for_year,
+    save_crf_table_result,
+)
+
+# the worker processes use the monkeypatched specifications and data folders
+requires_fork = pytest.mark.skipif(
+    multiprocessing.get_start_method() != "fork",
+    reason="worker processes only inherit the test setup if they are forked",
 )
 
 
@@ -205,3 +243,396 @@ def test_get_country_folders():
     )
     folders = [folder.relative_to(downloaded_data_path_UNFCCC) for folder in folders]
     assert expected == folders
+
+
+def test_crf_file_index(monkeypatch, tmp_path):
+    data_folder = tmp_path / "data"
+    files = {
+        "Aaa/CRF2023": [
+            "AAA_2023_1990_01012023_120000.xlsx",
+            "AAA_2023_1991_01012023_120000.xlsx",
+        ],
+        "Aaa/CRT2025": [
+            "AAA-CRT-2025-V1.0-1990-20250101-000000.xlsx",
+            "AAA-CRT-2025-V1.1-1990-20250301-000000.xlsx",
+            "AAA-CRT-2025-V1.1-1991-20250301-000000.xlsx",
+            "notes.txt",
+            "not_a_crf_file.xlsx",
+        ],
+        "Bbb/CRT2025": ["BBB-CRT-2025-V0.2-1990-20250101-000000.xlsx"],
+        "Bbb/other": ["BBB-CRT-2025-V0.2-1991-20250101-000000.xlsx"],
+    }
+    for folder, filenames in files.items():
+        (data_folder / folder).mkdir(parents=True)
+        for filename in filenames:
+            (data_folder / folder / filename).touch()
+
+    cache_file = tmp_path / "cache" / "crf_file_index.json"
+    index = CRFFileIndex(cache_file=cache_file)
+    assert index.scan(data_folder) == 6
+    assert cache_file.exists()
+
+    folder = data_folder / "Aaa" / "CRT2025"
+    for file_filter in [{}, {"data_year": 1990}, {"version": "V1.1", "party": "AAA"}]:
+        assert sorted(index.filter_files(folder, **file_filter)) == sorted(
+            filter_filenames(folder.glob("*.xlsx"), **file_filter)
+        )
+    assert sorted(index.get_values(folder, "version", {})) == ["V1.0", "V1.1"]
+    assert index.get_values(folder, "date", {"version": "V1.0"}) == ["20250101"]
+
+    # a new index uses the stored file infos without parsing the file names again
+    def fail(filename):
+        raise AssertionError(filename)
+
+    monkeypatch.setattr(unfccc_crf_reader_core, "get_info_from_crf_filename", fail)
+    index_loaded = CRFFileIndex(cache_file=cache_file)
+    assert index_loaded.get_file_infos(folder) == index.get_file_infos(folder)
+    monkeypatch.undo()
+
+    # changed folders are scanned again
+    (folder / "AAA-CRT-2025-V1.2-1990-20250401-000000.xlsx").touch()
+    os.utime(folder, ns=(0, 0))
+    assert sorted(index_loaded.get_values(folder, "version", {})) == [
+        "V1.0",
+        "V1.1",
+        "V1.2",
+    ]
+
+
+def test_read_crf_table_from_file_workbook(
+    synthetic_crf_folder, synthetic_crf_table_spec
+):
+    file = synthetic_crf_folder / "AAA-CRT-2025-V1.0-2000-20250101-000000.xlsx"
+    df_file, unknown_file, last_row_file = read_crf_table_from_file(
+        file, "Table1", synthetic_crf_table_spec
+    )
+    with pd.ExcelFile(file, engine="openpyxl") as workbook:
+        df_wb, unknown_wb, last_row_wb = read_crf_table_from_file(
+            file, "Table1", synthetic_crf_table_spec, workbook=workbook
+        )
+
+    pd.testing.assert_frame_equal(df_file, df_wb)
+    assert unknown_file == unknown_wb
+    assert last_row_file == last_row_wb
+    assert list(df_file["category"].unique()) == ["0", "1", "1.X", "5", "5.X"]
+
+
+def test_read_crf_tables(monkeypatch, synthetic_crf_folder, synthetic_crf_table_spec):
+    monkeypatch.setattr(
+        crf,
+        "CRT1",
+        {"Table1": synthetic_crf_table_spec, "Table2": synthetic_crf_table_spec},
+        raising=False,
+    )
+    tables_read = read_crf_tables(
+        "AAA",
+        ["Table1", "Table2"],
+        submission_year=1,
+        date_or_version="V1.0",
+        folder=str(synthetic_crf_folder),
+        submission_type="CRT",
+    )
+
+    df_table1, unknown_rows, last_row_info, not_present, skipped = tables_read["Table1"]
+    assert sorted(df_table1["time"].unique()) == ["2000", "2001"]
+    assert not not_present
+    assert unknown_rows == []
+    assert last_row_info == []
+    assert skipped == []
+
+    # Table2 is only present in one of the files
+    df_table2, _, _, not_present, _ = tables_read["Table2"]
+    assert list(df_table2["time"].unique()) == ["2000"]
+    assert not_present
+
+    # single table reading gives the same result
+    df_single, *_ = read_crf_table(
+        "AAA",
+        "Table1",
+        submission_year=1,
+        date_or_version="V1.0",
+        folder=str(synthetic_crf_folder),
+        submission_type="CRT",
+    )
+    pd.testing.assert_frame_equal(df_single, df_table1)
+
+
+@requires_fork
+def test_read_new_crf_for_year_workers(
+    monkeypatch, tmp_path, capfd, synthetic_crf_data_folder, synthetic_crf_table_spec
+):
+    monkeypatch.setattr(
+        crf, "CRT1", {"Table1": synthetic_crf_table_spec}, raising=False
+    )
+    monkeypatch.setattr(
+        unfccc_crf_reader_core, "downloaded_data_path_UNFCCC", synthetic_crf_data_folder
+    )
+    file_index = CRFFileIndex()
+    monkeypatch.setattr(unfccc_crf_reader_core, "crf_file_index", file_index)
+    monkeypatch.setattr(unfccc_crf_reader_prod, "crf_file_index", file_index)
+    extracted_folder = tmp_path / "extracted"
+    extracted_folder.mkdir()
+    monkeypatch.setattr(
+        unfccc_crf_reader_prod, "extracted_data_path_UNFCCC", extracted_folder
+    )
+    log_folder = tmp_path / "log"
+    monkeypatch.setattr(unfccc_crf_reader_prod, "log_path", log_folder)
+
+    # DEU has data, AUS has no data folder
+    countries = ["DEU", "AUS"]
+    read_kwargs = dict(countries=countries, re_read=True, submission_type="CRT")
+    read_sequential = read_new_crf_for_year(1, **read_kwargs)
+    capfd.readouterr()
+    run_logs = list((log_folder / "CRT1").iterdir())
+    assert len(run_logs) == 1
+    run_log_sequential = run_logs[0].read_text()
+    run_logs[0].unlink()
+    shutil.rmtree(extracted_folder / "Germany")
+    read_parallel = read_new_crf_for_year(1, n_workers=2, **read_kwargs)
+    output_parallel = capfd.readouterr().out
+
+    assert read_sequential == read_parallel == {"DEU": "read", "AUS": "failed"}
+    assert (extracted_folder / "Germany" / "DEU_CRT1_V1.0.nc").exists()
+    # the output of the workers is printed with the country as prefix
+    assert "DEU: Reading table Table1 for year 2000" in output_parallel
+    assert "AUS: The following error occurred: No data folder" in output_parallel
+    # and merged into the run log in the order of the countries
+    run_logs = list((log_folder / "CRT1").iterdir())
+    assert len(run_logs) == 1
+    run_log_parallel = run_logs[0].read_text()
+    assert run_log_parallel == run_log_sequential
+    assert run_log_parallel.index("##### DEU: read") < run_log_parallel.index(
+        "Reading table Table1 for year 2000"
+    )
+    assert run_log_parallel.index("Reading table Table1") < run_log_parallel.index(
+        "##### AUS: failed"
+    )
+
+
+@requires_fork
+def test_read_crf_tables_workers(
+    monkeypatch, synthetic_crf_folder, synthetic_crf_table_spec
+):
+    monkeypatch.setattr(
+        crf,
+        "CRT1",
+        {"Table1": synthetic_crf_table_spec, "Table2": synthetic_crf_table_spec},
+        raising=False,
+    )
+    # a file that can't be opened ends up in the skipped files
+    (synthetic_crf_folder / "AAA-CRT-2025-V1.0-2002-20250101-000000.xlsx").write_text(
+        "not an xlsx file"
+    )
+    read_kwargs = dict(
+        submission_year=1,
+        date_or_version="V1.0",
+        folder=str(synthetic_crf_folder),
+        submission_type="CRT",
+    )
+    read_sequential = read_crf_tables("AAA", ["Table1", "Table2"], **read_kwargs)
+
+    # files are fetched from the annex once in the main process
+    fetched_files = []
+    monkeypatch.setattr(
+        unfccc_crf_reader_core, "get_crf_files_from_annex", fetched_files.append
+    )
+    read_parallel = read_crf_tables(
+        "AAA", ["Table1", "Table2"], n_workers=2, **read_kwargs
+    )
+    assert len(fetched_files) == 1
+    assert len(fetched_files[0]) == 3
+
+    # in worker processes the files are read sequentially
+    def fail_process_pool(*args, **kwargs):
+        raise AssertionError  # process pool started in worker process
+
+    monkeypatch.setattr(
+        unfccc_crf_reader_core, "ProcessPoolExecutor", fail_process_pool
+    )
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        read_in_worker = executor.submit(
+            read_crf_tables, "AAA", ["Table1", "Table2"], n_workers=2, **read_kwargs
+        ).result()
+
+    for table in ["Table1", "Table2"]:
+        df_sequential, *info_sequential = read_sequential[table]
+        for tables_read in [read_parallel, read_in_worker]:
+            df_parallel, *info_parallel = tables_read[table]
+            pd.testing.assert_frame_equal(df_sequential, df_parallel)
+            assert info_sequential == info_parallel
+            # skipped files
+            assert [entry[:3] for entry in info_parallel[3]] == [[table, "AAA", 2002]]
+
+
+def test_get_category_index():
+    specification = [
+        ["Total", ["0"], 0],
+        ["Energy", ["1"], 1],
+        ["Other", ["1.X"], 2],
+        ["Waste", ["5"], 1],
+        ["Other", ["5.X"], 2],
+        ["\\C-AUS\\ Special", ["5.S"], 2],
+    ]
+    category_index = get_category_index(specification, "Table1", "DEU")
+
+    assert get_category_index(specification, "Table1", "DEU") is category_index
+    assert dict(category_index.children["root"]) == {"Total": 0}
+    assert dict(category_index.children[0]) == {"Energy": 1, "Waste": 3}
+    assert dict(category_index.children[3]) == {"Other": 4}
+    assert not category_index.children[4]
+    assert category_index.parents[4] == 3
+    assert category_index.parents[0] == "root"
+    assert category_index.codes[4] == ("5.X",)
+    assert category_index.all_tags == {"Table1", "Total", "Energy", "Waste", "Other"}
+
+    # country specific categories
+    category_index_aus = get_category_index(specification, "Table1", "AUS")
+    assert dict(category_index_aus.children[3]) == {"Other": 4, "Special": 5}
+
+
+def test_get_compiled_table_specification(monkeypatch, synthetic_crf_table_spec):
+    synthetic_crf_table_spec["sector_mapping"] = [
+        ["Total", ["0"], 0],
+        ["Energy", ["1"], 1],
+        ["\\C-AUS\\ Special", ["1.S"], 2],
+        ["Other", ["1.X"], 2],
+        ["Waste", ["5"], 1],
+        ["Other", ["5.X"], 2],
+    ]
+    original_mapping = deepcopy(synthetic_crf_table_spec["sector_mapping"])
+
+    compiled_spec = get_compiled_table_specification(
+        synthetic_crf_table_spec, "Table1", "DEU"
+    )
+    # the specification is not modified
+    assert synthetic_crf_table_spec["sector_mapping"] == original_mapping
+    assert (
+        get_compiled_table_specification(synthetic_crf_table_spec, "Table1", "DEU")
+        is compiled_spec
+    )
+    assert dict(compiled_spec.unique_mapping) == {
+        "Total": ("0",),
+        "Energy": ("1",),
+        "Waste": ("5",),
+    }
+    assert compiled_spec.non_unique_cats == {"Other"}
+    assert compiled_spec.category_index is not None
+    assert len(compiled_spec.sector_mapping) == 5
+
+    compiled_spec_aus = get_compiled_table_specification(
+        synthetic_crf_table_spec, "Table1", "AUS"
+    )
+    assert compiled_spec_aus.unique_mapping["Special"] == ("1.S",)
+
+    # the category index is shared with the compiled specification
+    assert (
+        get_category_index(synthetic_crf_table_spec["sector_mapping"], "Table1", "DEU")
+        is compiled_spec.category_index
+    )
+
+    # specifications changed in place are compiled again, preparing the
+    # specification only once
+    prep_calls = []
+
+    def count_prep_specification(*args, **kwargs):
+        prep_calls.append(args)
+        return prep_specification(*args, **kwargs)
+
+    monkeypatch.setattr(
+        unfccc_crf_reader_core, "prep_specification", count_prep_specification
+    )
+    synthetic_crf_table_spec["sector_mapping"][5][1] = ["5.Y"]
+    compiled_spec_changed = get_compiled_table_specification(
+        synthetic_crf_table_spec, "Table1", "DEU"
+    )
+    assert compiled_spec_changed.category_index.codes[4] == ("5.Y",)
+    assert len(prep_calls) == 1
+
+    # the cache size is bounded
+    monkeypatch.setattr(
+        unfccc_crf_reader_core, "compiled_table_specification_cache_max_size", 2
+    )
+    get_compiled_table_specification(synthetic_crf_table_spec, "Table1", "FRA")
+    get_compiled_table_specification(synthetic_crf_table_spec, "Table1", "ITA")
+    assert len(unfccc_crf_reader_core.compiled_table_specification_cache) <= 2
+
+
+def test_crf_table_incremental(
+    monkeypatch, tmp_path, synthetic_crf_folder, synthetic_crf_table_spec
+):
+    monkeypatch.setattr(
+        crf,
+        "CRT1",
+        {"Table1": synthetic_crf_table_spec, "Table2": synthetic_crf_table_spec},
+        raising=False,
+    )
+    tables_read = read_crf_tables(
+        "AAA",
+        ["Table1", "Table2"],
+        submission_year=1,
+        date_or_version="V1.0",
+        folder=str(synthetic_crf_folder),
+        submission_type="CRT",
+    )
+    meta_data_input = {"title": "Synthetic data"}
+    input_files = sorted(synthetic_crf_folder.glob("*.xlsx"))
+    table_folder = tmp_path / "AAA_CRT1_V1.0_tables"
+
+    table_info = load_crf_table_info(table_folder)
+    assert table_info == {}
+    table_result = process_crf_table(
+        tables_read["Table2"],
+        "Table2",
+        synthetic_crf_table_spec,
+        "AAA",
+        submission_year=1,
+        submission_type="CRT",
+        meta_data_input=meta_data_input,
+    )
+    # Table2 is only present for 2000
+    assert table_result["missing_worksheets"] == []
+    assert list(table_result["data"].coords["time"].dt.year.values) == [2000]
+    input_files_key = get_crf_input_files_key(input_files)
+    fingerprint = get_crf_table_fingerprint(
+        synthetic_crf_table_spec, input_files_key, meta_data_input
+    )
+    assert not crf_table_is_up_to_date("Table2", fingerprint, table_info, table_folder)
+    # log values taken from the input files can be numpy values
+    table_result["unknown_categories"] = [
+        ["Table2", "AAA", "1.Z", np.int64(2000), np.int64(5), "root"]
+    ]
+    save_crf_table_result("Table2", table_result, fingerprint, table_info, table_folder)
+
+    # stored results are used if nothing changed
+    table_info = load_crf_table_info(table_folder)
+    # numpy values are stored as numbers, not as strings
+    assert table_info["Table2"]["unknown_categories"] == [
+        ["Table2", "AAA", "1.Z", 2000, 5, "root"]
+    ]
+    assert crf_table_is_up_to_date("Table2", fingerprint, table_info, table_folder)
+    table_result_stored = load_crf_table_result("Table2", table_info, table_folder)
+    assert table_result_stored["data"].equals(table_result["data"])
+    for log in ["unknown_categories", "last_row_info", "missing_worksheets"]:
+        assert table_result_stored[log] == table_result[log]
+
+    # a changed specification or input file gives a new fingerprint
+    table_spec_changed = deepcopy(synthetic_crf_table_spec)
+    table_spec_changed["sector_mapping"][0][1] = ["M.0"]
+    assert fingerprint != get_crf_table_fingerprint(
+        table_spec_changed, input_files_key, meta_data_input
+    )
+    # the file for 2001 now also contains Table2
+    input_files[-1].write_bytes(input_files[0].read_bytes())
+    fingerprint_changed = get_crf_table_fingerprint(
+        synthetic_crf_table_spec,
+        get_crf_input_files_key(input_files),
+        meta_data_input,
+    )
+    assert fingerprint != fingerprint_changed
+    assert not crf_table_is_up_to_date(
+        "Table2", fingerprint_changed, table_info, table_folder
+    )
+
+    # the data file has to be present
+    (table_folder / table_info["Table2"]["file"]).unlink()
+    assert not crf_table_is_up_to_date("Table2", fingerprint, table_info, table_folder)
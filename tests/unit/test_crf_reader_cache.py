@@ -0,0 +1,135 @@
+import os
+
+import pandas as pd
+import pytest
+
+from unfccc_ghg_data.unfccc_crf_reader import (
+    unfccc_crf_reader_cache,
+    unfccc_crf_reader_core,
+)
+from unfccc_ghg_data.unfccc_crf_reader.unfccc_crf_reader_cache import (
+    clear_crf_sheet_cache,
+    get_crf_file_key,
+    get_crf_sheet_cache_file,
+    trim_crf_sheet_cache,
+)
+from unfccc_ghg_data.unfccc_crf_reader.unfccc_crf_reader_core import (
+    read_crf_table_from_file,
+    read_crf_tables_from_file,
+)
+
+
+def test_get_crf_file_key(tmp_path):
+    annex_target = tmp_path / ".git" / "annex" / "objects" / "MD5E-s10--abc.xlsx"
+    annex_target.parent.mkdir(parents=True)
+    link = tmp_path / "AAA-CRT-2025-V1.0-2000-20250101-000000.xlsx"
+    os.symlink(annex_target, link)
+    # content is not needed for annexed files
+    assert get_crf_file_key(link) == "MD5E-s10--abc.xlsx"
+
+    file = tmp_path / "file.xlsx"
+    file.write_bytes(b"content")
+    other_file = tmp_path / "other_file.xlsx"
+    other_file.write_bytes(b"content")
+    assert get_crf_file_key(file) == get_crf_file_key(other_file)
+    assert get_crf_file_key(file).startswith("SHA256-")
+
+    # the hash is computed again only if the file changes
+    hits = unfccc_crf_reader_cache.get_crf_file_hash.cache_info().hits
+    get_crf_file_key(file)
+    assert unfccc_crf_reader_cache.get_crf_file_hash.cache_info().hits == hits + 1
+    file.write_bytes(b"new content")
+    assert get_crf_file_key(file) != get_crf_file_key(other_file)
+
+
+def test_read_crf_table_from_file_cache(
+    monkeypatch, tmp_path, synthetic_crf_folder, synthetic_crf_table_spec
+):
+    cache_folder = tmp_path / "cache"
+    monkeypatch.setattr(unfccc_crf_reader_cache, "crf_sheet_cache_path", cache_folder)
+    file = synthetic_crf_folder / "AAA-CRT-2025-V1.0-2000-20250101-000000.xlsx"
+
+    df_uncached, *_ = read_crf_table_from_file(file, "Table1", synthetic_crf_table_spec)
+    assert not cache_folder.exists()
+    df_first, *_ = read_crf_table_from_file(
+        file, "Table1", synthetic_crf_table_spec, use_cache=True
+    )
+    cache_files = list(cache_folder.glob("*.pkl.gz"))
+    assert len(cache_files) == 1
+
+    # second read comes from the cache and doesn't need the xlsx file
+    def fail_read_excel(*args, **kwargs):
+        raise AssertionError  # xlsx file read although data is cached
+
+    monkeypatch.setattr(pd, "read_excel", fail_read_excel)
+    df_cached, *_ = read_crf_table_from_file(
+        file, "Table1", synthetic_crf_table_spec, use_cache=True
+    )
+    pd.testing.assert_frame_equal(df_uncached, df_first)
+    pd.testing.assert_frame_equal(df_uncached, df_cached)
+
+    # different row window gives a different cache entry
+    table_spec = synthetic_crf_table_spec["table"]
+    assert get_crf_sheet_cache_file(
+        file, "Table1", table_spec["firstrow"] - 1, 10, cache_folder=cache_folder
+    ) != get_crf_sheet_cache_file(
+        file, "Table1", table_spec["firstrow"], 10, cache_folder=cache_folder
+    )
+
+
+def test_read_crf_table_from_file_cache_write_error(
+    monkeypatch, tmp_path, synthetic_crf_folder, synthetic_crf_table_spec
+):
+    cache_folder = tmp_path / "cache"
+    monkeypatch.setattr(unfccc_crf_reader_cache, "crf_sheet_cache_path", cache_folder)
+    file = synthetic_crf_folder / "AAA-CRT-2025-V1.0-2000-20250101-000000.xlsx"
+
+    def fail_to_pickle(*args, **kwargs):
+        raise OSError("disk full")  # noqa: TRY003
+
+    monkeypatch.setattr(pd.DataFrame, "to_pickle", fail_to_pickle)
+    with pytest.raises(OSError, match="disk full"):
+        read_crf_table_from_file(
+            file, "Table1", synthetic_crf_table_spec, use_cache=True
+        )
+    # the temporary file is removed
+    assert list(cache_folder.iterdir()) == []
+
+
+def test_read_crf_tables_from_file_cache(
+    monkeypatch, tmp_path, synthetic_crf_folder, synthetic_crf_table_spec
+):
+    cache_folder = tmp_path / "cache"
+    monkeypatch.setattr(unfccc_crf_reader_cache, "crf_sheet_cache_path", cache_folder)
+    file = synthetic_crf_folder / "AAA-CRT-2025-V1.0-2000-20250101-000000.xlsx"
+    crf_spec = {"Table1": synthetic_crf_table_spec}
+
+    tables_first = read_crf_tables_from_file(file, ["Table1"], crf_spec, use_cache=True)
+
+    # cached worksheets don't need the file to be fetched from the annex and opened
+    def fail_open(*args, **kwargs):
+        raise AssertionError  # file fetched or opened although data is cached
+
+    monkeypatch.setattr(unfccc_crf_reader_core, "get_crf_file_from_annex", fail_open)
+    monkeypatch.setattr(pd, "ExcelFile", fail_open)
+    tables_cached = read_crf_tables_from_file(
+        file, ["Table1"], crf_spec, use_cache=True
+    )
+    assert tables_cached["Table1"][4] == []
+    pd.testing.assert_frame_equal(tables_first["Table1"][0], tables_cached["Table1"][0])
+
+
+def test_trim_crf_sheet_cache(tmp_path):
+    for i in range(4):
+        cache_file = tmp_path / f"entry_{i}.pkl.gz"
+        cache_file.write_bytes(b"x" * 100)
+        os.utime(cache_file, (1000 + i, 1000 + i))
+    # mark the oldest entry as recently used
+    os.utime(tmp_path / "entry_0.pkl.gz", (2000, 2000))
+
+    assert trim_crf_sheet_cache(max_size=250, cache_folder=tmp_path) == 2
+    remaining = sorted(file.name for file in tmp_path.glob("*.pkl.gz"))
+    assert remaining == ["entry_0.pkl.gz", "entry_3.pkl.gz"]
+
+    assert clear_crf_sheet_cache(cache_folder=tmp_path) == 2
+    assert list(tmp_path.glob("*.pkl.gz")) == []
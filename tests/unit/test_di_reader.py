@@ -0,0 +1,669 @@
+import functools
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+import primap2 as pm2
+import pytest
+import requests
+import unfccc_di_api
+import xarray as xr
+
+from unfccc_ghg_data.unfccc_di_reader import (
+    unfccc_di_reader_core,
+    unfccc_di_reader_fetch,
+    unfccc_di_reader_proc,
+)
+from unfccc_ghg_data.unfccc_di_reader.unfccc_di_reader_core import (
+    convert_DI_data_to_pm2_if,
+    get_zenodo_DI_data_by_party,
+    read_UNFCCC_DI_for_country_df,
+    read_UNFCCC_DI_for_country_df_zenodo,
+    read_UNFCCC_DI_for_country_group,
+)
+from unfccc_ghg_data.unfccc_di_reader.unfccc_di_reader_fetch import (
+    clear_DI_query_cache,
+    fetch_DI_queries,
+)
+from unfccc_ghg_data.unfccc_di_reader.unfccc_di_reader_helper import (
+    get_DI_data_hash,
+)
+from unfccc_ghg_data.unfccc_di_reader.unfccc_di_reader_io import write_DI_data_files
+from unfccc_ghg_data.unfccc_di_reader.unfccc_di_reader_proc import (
+    process_UNFCCC_DI_for_country_group,
+    profile_UNFCCC_DI_processing,
+)
+
+
+def make_di_data(parties):
+    """DI data in the format returned by the unfccc_di_api readers"""
+    rng = np.random.default_rng(1)
+    rows = []
+    for category in ["1.  Energy", "2.  Industrial Processes"]:
+        for party in parties:
+            for gas in ["CO2", "CH4", "No gas"]:
+                for year in ["1990", "2000", "Base year"]:
+                    rows.append(
+                        {
+                            "party": party,
+                            "category": category,
+                            "classification": "Total for category",
+                            "measure": "Net emissions/removals",
+                            "gas": gas,
+                            "unit": "Gg",
+                            "year": year,
+                            "numberValue": rng.random(),
+                            "stringValue": None,
+                        }
+                    )
+    return pd.DataFrame(rows)
+
+
+class ZenodoReaderStandIn:
+    """Reads the data from memory instead of the Zenodo dataset"""
+
+    n_instances = 0
+
+    def __init__(self):
+        ZenodoReaderStandIn.n_instances = ZenodoReaderStandIn.n_instances + 1
+        self.df = make_di_data(["ARG", "BRA", "CHL"])
+        self.parties = list(self.df["party"].unique())
+
+    def query(self, *, party_code):
+        if party_code not in self.parties:
+            raise ValueError(f"Unknown party {party_code}.")  # noqa: TRY003
+        return self.df[self.df["party"] == party_code].copy()
+
+
+@pytest.fixture
+def zenodo_reader(monkeypatch):
+    ZenodoReaderStandIn.n_instances = 0
+    monkeypatch.setattr(unfccc_di_api, "ZenodoReader", ZenodoReaderStandIn)
+    return ZenodoReaderStandIn
+
+
+def test_get_zenodo_DI_data_by_party(zenodo_reader):
+    di_data_by_party = get_zenodo_DI_data_by_party(parties=["BRA", "ARG", "XYZ"])
+    assert zenodo_reader.n_instances == 1
+    assert sorted(di_data_by_party.keys()) == ["ARG", "BRA"]
+
+    for party, data_party in di_data_by_party.items():
+        assert "No gas" not in data_party["gas"].to_numpy()
+        # same result as reading the country on its own
+        pd.testing.assert_frame_equal(
+            read_UNFCCC_DI_for_country_df_zenodo(party, zenodo_data=data_party),
+            read_UNFCCC_DI_for_country_df_zenodo(party),
+        )
+
+    assert len(get_zenodo_DI_data_by_party()) == 3
+
+
+di_api_parties = {
+    "annexOne": [{"id": 3, "code": "DEU", "name": "Germany"}],
+    "nonAnnexOne": [
+        {"id": 1, "code": "ARG", "name": "Argentina"},
+        {"id": 2, "code": "BRA", "name": "Brazil"},
+    ],
+}
+di_api_categories = {
+    1: "Totals",
+    2: "1.  Energy",
+    3: "2.  Industrial Processes",
+    4: "3.  Agriculture",
+}
+di_api_gases = {1: "CO₂", 2: "CH₄", 3: "No gas"}
+# no data for agriculture
+di_api_categories_with_data = [2, 3]
+
+
+def make_di_api_responses():
+    """Responses of the DI API GET endpoints for a small fixed dataset"""
+    responses = {}
+    for party_category, parties in di_api_parties.items():
+        responses[f"parties/{party_category}"] = [
+            {"categoryCode": party_category, "name": "Parties", "parties": parties}
+        ]
+        responses[f"variables/fq/{party_category}"] = [
+            {
+                "variableId": cat_id * 10 + gas_id,
+                "categoryId": cat_id,
+                "classificationId": 1,
+                "measureId": 1,
+                "gasId": gas_id,
+                "unitId": 1,
+            }
+            for cat_id in di_api_categories
+            for gas_id in di_api_gases
+        ]
+    category_tree = {
+        "id": 1,
+        "name": di_api_categories[1],
+        "children": [
+            {"id": cat_id, "name": di_api_categories[cat_id]} for cat_id in [2, 3, 4]
+        ],
+    }
+    per_party_category = {
+        "years/single": [{"id": 1, "name": "1990"}, {"id": 2, "name": "2000"}],
+        "dimension-instances/category": [category_tree],
+        "dimension-instances/classification": [{"id": 1, "name": "Total for category"}],
+        "dimension-instances/measure": [{"id": 1, "name": "Net emissions/removals"}],
+        "dimension-instances/gas": [
+            {"id": gas_id, "name": gas} for gas_id, gas in di_api_gases.items()
+        ],
+        "conversion/fq": [],
+    }
+    for component, response in per_party_category.items():
+        responses[component] = {
+            party_category: response for party_category in di_api_parties
+        }
+    responses["conversion/fq"]["units"] = [{"id": 1, "name": "Gg"}]
+    return responses
+
+
+class DIApiStandIn(BaseHTTPRequestHandler):
+    """Serves a small fixed dataset in the format of the DI API"""
+
+    n_posts = 0
+    n_failing_posts = 0
+    lock = threading.Lock()
+    responses = make_di_api_responses()
+    categories_with_data = di_api_categories_with_data
+
+    def send_json(self, data):
+        body = json.dumps(data).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        component = self.path.removeprefix("/api/")
+        if component in self.responses:
+            self.send_json(self.responses[component])
+        else:
+            self.send_error(404)
+
+    def do_POST(self):
+        query = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with DIApiStandIn.lock:
+            DIApiStandIn.n_posts = DIApiStandIn.n_posts + 1
+            fail = DIApiStandIn.n_failing_posts > 0
+            if fail:
+                DIApiStandIn.n_failing_posts = DIApiStandIn.n_failing_posts - 1
+        if fail:
+            self.send_error(503)
+            return
+        self.send_json(
+            [
+                {
+                    "variableId": variable_id,
+                    "partyId": party_id,
+                    "yearId": year_id,
+                    "numberValue": variable_id * 100 + party_id * 10 + year_id,
+                    "stringValue": None,
+                }
+                for variable_id in query["variableIds"]
+                if variable_id // 10 in self.categories_with_data
+                for party_id in query["partyIds"]
+                for year_id in query["yearIds"]
+            ]
+        )
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def di_api_url():
+    DIApiStandIn.n_posts = 0
+    DIApiStandIn.n_failing_posts = 0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), DIApiStandIn)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/api/"
+    server.shutdown()
+    server.server_close()
+
+
+def test_fetch_DI_queries(di_api_url):
+    reader = unfccc_di_api.UNFCCCSingleCategoryApiReader(
+        party_category="nonAnnexOne", base_url=di_api_url
+    )
+    queries = [
+        {"party_codes": ["ARG", "BRA"], "category_ids": [cat_id]}
+        for cat_id in [2, 3, 4]
+    ]
+
+    data_sequential = fetch_DI_queries(reader, queries)
+    assert DIApiStandIn.n_posts == 3
+    assert data_sequential[2] is None
+    assert list(data_sequential[0]["category"].unique()) == ["1.  Energy"]
+    assert sorted(data_sequential[1]["party"].unique()) == ["ARG", "BRA"]
+
+    data_concurrent = fetch_DI_queries(reader, queries, n_workers=3, rate_limit=100)
+    assert data_concurrent[2] is None
+    for data_seq, data_conc in zip(data_sequential[:2], data_concurrent[:2]):
+        pd.testing.assert_frame_equal(data_seq, data_conc)
+
+    # failed queries are retried
+    DIApiStandIn.n_posts = 0
+    DIApiStandIn.n_failing_posts = 1
+    data_retried = fetch_DI_queries(reader, queries[:1], backoff=0.01)
+    assert DIApiStandIn.n_posts == 2
+    pd.testing.assert_frame_equal(data_retried[0], data_sequential[0])
+
+    DIApiStandIn.n_failing_posts = 2
+    with pytest.raises(requests.HTTPError):
+        fetch_DI_queries(reader, queries[:1], max_retries=1, backoff=0.01)
+
+
+def test_fetch_DI_queries_cache(di_api_url, monkeypatch, tmp_path):
+    reader = unfccc_di_api.UNFCCCSingleCategoryApiReader(
+        party_category="nonAnnexOne", base_url=di_api_url
+    )
+    queries = [
+        {"party_codes": ["ARG"], "category_ids": [cat_id], "gases": ["CO2", "CH4"]}
+        for cat_id in [2, 4]
+    ]
+
+    data = fetch_DI_queries(reader, queries, use_cache=True, cache_folder=tmp_path)
+    assert DIApiStandIn.n_posts == 2
+
+    # equivalent queries are read from the cache, also if they returned no data
+    queries_reordered = [
+        {"gases": ["CH4", "CO2"], "category_ids": [cat_id], "party_codes": ["ARG"]}
+        for cat_id in [2, 4]
+    ]
+    data_cached = fetch_DI_queries(
+        reader, queries_reordered, n_workers=2, use_cache=True, cache_folder=tmp_path
+    )
+    assert DIApiStandIn.n_posts == 2
+    pd.testing.assert_frame_equal(data[0], data_cached[0])
+    assert data_cached[1] is None
+
+    assert clear_DI_query_cache(cache_folder=tmp_path) == 2
+    fetch_DI_queries(reader, queries, use_cache=True, cache_folder=tmp_path)
+    assert DIApiStandIn.n_posts == 4
+
+    # the temporary file is removed if writing the cache fails
+    def fail_to_pickle(*args, **kwargs):
+        raise OSError("disk full")  # noqa: TRY003
+
+    clear_DI_query_cache(cache_folder=tmp_path)
+    monkeypatch.setattr(pd, "to_pickle", fail_to_pickle)
+    with pytest.raises(OSError, match="disk full"):
+        fetch_DI_queries(reader, queries[:1], use_cache=True, cache_folder=tmp_path)
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_read_UNFCCC_DI_for_country_df_concurrent(di_api_url, monkeypatch):
+    monkeypatch.setattr(
+        unfccc_di_api,
+        "UNFCCCApiReader",
+        functools.partial(unfccc_di_api.UNFCCCApiReader, base_url=di_api_url),
+    )
+    category_groups = {
+        "1.  Energy": {"gases": ["CO2"]},
+        "2.  Industrial Processes": {"measure": ["Net emissions/removals"]},
+        "3.  Agriculture": {},
+    }
+
+    data_sequential = read_UNFCCC_DI_for_country_df(
+        "BRA", category_groups=category_groups
+    )
+    data_concurrent = read_UNFCCC_DI_for_country_df(
+        "BRA", category_groups=category_groups, n_workers=3, rate_limit=100
+    )
+    pd.testing.assert_frame_equal(data_sequential, data_concurrent)
+    assert sorted(data_concurrent["category"].unique()) == [
+        "1.  Energy",
+        "2.  Industrial Processes",
+    ]
+    assert list(
+        data_concurrent[data_concurrent["category"] == "1.  Energy"]["gas"].unique()
+    ) == ["CO2"]
+
+
+def test_read_UNFCCC_DI_for_country_df_no_data(di_api_url, monkeypatch):
+    monkeypatch.setattr(
+        unfccc_di_api,
+        "UNFCCCApiReader",
+        functools.partial(unfccc_di_api.UNFCCCApiReader, base_url=di_api_url),
+    )
+    monkeypatch.setattr(DIApiStandIn, "categories_with_data", [])
+
+    # a single query without data raises the same error as the DI API
+    with pytest.raises(unfccc_di_api.NoDataError, match="BRA"):
+        read_UNFCCC_DI_for_country_df("BRA", use_cache=False)
+
+
+def test_read_UNFCCC_DI_for_country_group_cache(di_api_url, monkeypatch, tmp_path):
+    monkeypatch.setattr(
+        unfccc_di_api,
+        "UNFCCCApiReader",
+        functools.partial(unfccc_di_api.UNFCCCApiReader, base_url=di_api_url),
+    )
+    monkeypatch.setattr(unfccc_di_reader_core, "nAI_countries", ["ARG", "BRA"])
+    monkeypatch.setattr(
+        unfccc_di_reader_fetch, "di_query_cache_path", tmp_path / "di_queries"
+    )
+    monkeypatch.setattr(
+        unfccc_di_reader_core, "save_DI_country_data", lambda *args, **kwargs: None
+    )
+    monkeypatch.setattr(
+        unfccc_di_reader_core, "save_DI_dataset", lambda *args, **kwargs: None
+    )
+    read_options = dict(use_zenodo=False, n_workers=2, rate_limit=100, use_cache=True)
+
+    data_fetched = read_UNFCCC_DI_for_country_group(**read_options)
+    assert DIApiStandIn.n_posts > 0
+    assert sorted(data_fetched["area (ISO3)"].to_numpy()) == ["ARG", "BRA"]
+
+    # a second (e.g. resumed) read only uses the cached query results
+    n_posts = DIApiStandIn.n_posts
+    data_cached = read_UNFCCC_DI_for_country_group(**read_options)
+    assert DIApiStandIn.n_posts == n_posts
+    xr.testing.assert_identical(data_cached, data_fetched)
+
+
+def test_convert_DI_data_to_pm2_if():
+    data = pd.DataFrame(
+        {
+            "party": "ARG",
+            "category": [
+                "1.  Energy",
+                "1.A  Fuel Combustion",
+                "Total GHG emissions excluding LULUCF/LUCF",
+                "1.  Energy",
+            ],
+            "classification": "Total for category",
+            "measure": "Net emissions/removals",
+            "gas": ["CO2", "CH4", "Aggregate GHGs", "CO2"],
+            "unit": ["Gg", "Gg", "Gg CO2 equivalent", "Gg"],
+            "year": ["1990", "1990", "1990", "Base year"],
+            "numberValue": [1.0, np.nan, 3.0, 4.0],
+            "stringValue": [None, "NO", None, None],
+        }
+    )
+    data_orig = data.copy(deep=True)
+
+    data_if = convert_DI_data_to_pm2_if(data, date_str="2024-01-01")
+
+    # the input data is not altered
+    pd.testing.assert_frame_equal(data, data_orig)
+    data_if = data_if.set_index("category (BURDI)")
+    assert list(data_if.index) == ["1.A", "1", "15163"]
+    assert list(data_if["entity"]) == ["CH4", "CO2", "KYOTOGHG (SARGWP100)"]
+    assert list(data_if["orig_cat_name"]) == [
+        "1.A  Fuel Combustion",
+        "1.  Energy",
+        "Total GHG emissions excluding LULUCF/LUCF",
+    ]
+    # string values are used where no numerical value is given
+    assert list(data_if["1990"]) == [0.0, 1.0, 3.0]
+    assert (data_if["scenario (Access_Date)"] == "DI2024-01-01").all()
+
+    data_if = convert_DI_data_to_pm2_if(
+        data, date_str="2024-01-01", use_gwp="AR5GWP100"
+    )
+    assert "Aggregate GHGs (AR5GWP100)" in list(data_if["entity"])
+
+
+def make_processed_di_data(country_code, n_categories, years):
+    """Small dataset in the format of processed DI data for one country"""
+    rng = np.random.default_rng(len(country_code) * n_categories)
+    data_di = pd.DataFrame(
+        {
+            "source": "UNFCCC",
+            "scenario (Access_Date)": "DI2023-05-24",
+            "provenance": "measured",
+            "area (ISO3)": country_code,
+            "entity": "CO2",
+            "unit": "Gg CO2 / yr",
+            "category (IPCC2006_PRIMAP)": [str(cat) for cat in range(n_categories)],
+        }
+    )
+    dimensions = list(data_di.columns)
+    for year in years:
+        data_di[year] = rng.random(len(data_di))
+    data_di.attrs = {
+        "attrs": {
+            "area": "area (ISO3)",
+            "cat": "category (IPCC2006_PRIMAP)",
+            "scen": "scenario (Access_Date)",
+        },
+        "time_format": "%Y",
+        "dimensions": {"*": dimensions},
+    }
+    return pm2.pm2io.from_interchange_format(data_di)
+
+
+@pytest.mark.parametrize("n_workers", [1, 2])
+def test_process_UNFCCC_DI_for_country_group(n_workers, monkeypatch, tmp_path):
+    countries = {
+        "ARG": (3, ["1990", "2000"]),
+        "BRA": (4, ["2000", "2010"]),
+        "CHL": None,
+        "COL": (2, []),
+        "MEX": (2, ["1990"]),
+    }
+
+    def process_and_save(country_code, date_str=None, no_save=False):
+        if countries[country_code] is None:
+            raise ValueError(f"No raw data available for {country_code}.")  # noqa: TRY003
+        return make_processed_di_data(country_code, *countries[country_code])
+
+    def save_country_data(data_pm2, raw=True):
+        country_code = data_pm2.coords["area (ISO3)"].to_numpy()[0]
+        data_pm2.pr.to_netcdf(tmp_path / f"{country_code}.nc")
+        return tmp_path / f"{country_code}.nc"
+
+    saved_datasets = []
+    monkeypatch.setattr(unfccc_di_reader_proc, "nAI_countries", list(countries))
+    monkeypatch.setattr(
+        unfccc_di_reader_proc,
+        "process_and_save_UNFCCC_DI_for_country",
+        process_and_save,
+    )
+    monkeypatch.setattr(
+        unfccc_di_reader_proc, "save_DI_country_data", save_country_data
+    )
+    monkeypatch.setattr(
+        unfccc_di_reader_proc,
+        "save_DI_dataset",
+        lambda data_pm2, raw, annexI, compression: saved_datasets.append(data_pm2),
+    )
+
+    data_all = process_UNFCCC_DI_for_country_group(n_workers=n_workers)
+    assert saved_datasets[0] is data_all
+    assert list(data_all.coords["area (ISO3)"].to_numpy()) == ["ARG", "BRA", "MEX"]
+    assert data_all.attrs["scen"] == "scenario (Process_Date)"
+    assert data_all.attrs["title"].endswith("Countries: ARG, BRA, MEX")
+
+    # same result as merging the countries one by one
+    data_expected = None
+    for country_code in ["ARG", "BRA", "MEX"]:
+        data_country = process_and_save(country_code).rename(
+            {"scenario (Access_Date)": "scenario (Process_Date)"}
+        )
+        data_country.attrs["scen"] = "scenario (Process_Date)"
+        if data_expected is None:
+            data_expected = data_country
+        else:
+            data_expected = data_expected.pr.merge(data_country)
+    data_expected = data_expected.assign_coords(
+        {
+            "scenario (Process_Date)": data_all.coords[
+                "scenario (Process_Date)"
+            ].to_numpy()
+        }
+    )
+    xr.testing.assert_equal(data_all.pr.dequantify(), data_expected.pr.dequantify())
+
+
+def test_profile_UNFCCC_DI_processing(monkeypatch, tmp_path, capsys):
+    def process_and_save(country_code, date_str=None, no_save=False, profiler=None):
+        data = make_processed_di_data(country_code, 2, ["2000"])
+        profiler.record("remove_nan", data)
+        if country_code == "BRA":
+            raise ValueError("broken processing info")  # noqa: TRY003
+        return data
+
+    monkeypatch.setattr(unfccc_di_reader_proc, "log_path", tmp_path)
+    monkeypatch.setattr(
+        unfccc_di_reader_proc,
+        "process_and_save_UNFCCC_DI_for_country",
+        process_and_save,
+    )
+
+    assert profile_UNFCCC_DI_processing(countries=[]).empty
+
+    profiles = profile_UNFCCC_DI_processing(countries=["ARG", "BRA"])
+    assert list(profiles["country"]) == ["ARG", "BRA", "BRA"]
+    assert list(profiles["step"]) == ["remove_nan", "remove_nan", "failed"]
+    assert profiles["error"].isna().tolist() == [True, True, False]
+    assert profiles["error"].iloc[-1] == "ValueError: broken processing info"
+    # the traceback of the failed country is shown
+    assert "Traceback" in capsys.readouterr().err
+
+    profile_folder = tmp_path / "processing_profiles"
+    assert len(pd.read_csv(profile_folder / "DI_all_countries.csv")) == 3
+    with open(profile_folder / "DI_BRA.json") as report_file:
+        assert json.load(report_file)["steps"][-1]["step"] == "failed"
+
+
+def test_DI_data_hash():
+    data = make_processed_di_data("ARG", 3, ["1990", "2000"])
+    data_hash = get_DI_data_hash(data)
+
+    # the date in the scenario is not part of the hash
+    data_new_date = data.assign_coords({"scenario (Access_Date)": ["DI2024-01-10"]})
+    assert get_DI_data_hash(data_new_date) == data_hash
+    data_changed = make_processed_di_data("ARG", 3, ["1990", "2000", "2010"])
+    assert get_DI_data_hash(data_changed) != data_hash
+
+
+def test_write_DI_data_files(tmp_path, capsys):
+    data = make_processed_di_data("ARG", 3, ["1990", "2000"])
+    filename_hash = tmp_path / "ARG" / f"ARG_DI_{get_DI_data_hash(data)}_hash"
+
+    file_nc = write_DI_data_files(
+        data, filename_hash, name="ARG", compression={"compression": "lzf"}
+    )
+    assert file_nc == filename_hash.parent / (filename_hash.name + ".nc")
+    for suffix in [".nc", ".csv", ".yaml"]:
+        assert (filename_hash.parent / (filename_hash.name + suffix)).exists()
+    xr.testing.assert_identical(
+        pm2.open_dataset(file_nc).pr.dequantify(), data.pr.dequantify()
+    )
+    read_if = pm2.pm2io.read_interchange_format(filename_hash)
+    data_if = data.pr.to_interchange_format()
+    assert list(read_if.columns) == list(data_if.columns)
+    np.testing.assert_allclose(
+        read_if[["1990", "2000"]].astype(float), data_if[["1990", "2000"]]
+    )
+
+    # present files are not written again
+    capsys.readouterr()
+    mtime_nc = file_nc.stat().st_mtime_ns
+    filename_hash.with_suffix(".csv").unlink()
+    write_DI_data_files(data, filename_hash, name="ARG")
+    assert file_nc.stat().st_mtime_ns == mtime_nc
+    assert filename_hash.with_suffix(".csv").exists()
+    assert "Save to" in capsys.readouterr().out
+    write_DI_data_files(data, filename_hash, name="ARG")
+    assert "Data unchanged for ARG" in capsys.readouterr().out
+
+
+def make_raw_ai_di_data(country_code, n_categories, years, entities):
+    """Small dataset in the format of raw AnnexI DI data for one country"""
+    rng = np.random.default_rng(n_categories * len(years))
+    categories = [str(cat) for cat in range(n_categories)]
+    data_di = pd.DataFrame(
+        {
+            "source": "UNFCCC",
+            "scenario (Access_Date)": "DI2024-01-10",
+            "provenance": "measured",
+            "area (ISO3)": country_code,
+            "entity": np.repeat(entities, 2 * n_categories),
+            "unit": np.repeat(
+                [f"Gg {entity} / yr" for entity in entities], 2 * n_categories
+            ),
+            "category (CRF2013)": np.tile(np.repeat(categories, 2), len(entities)),
+            "measure": np.tile(
+                ["Net emissions/removals", "Emissions"], len(entities) * n_categories
+            ),
+        }
+    )
+    dimensions = list(data_di.columns)
+    for year in years:
+        data_di[year] = np.where(
+            rng.random(len(data_di)) < 0.3, np.nan, rng.random(len(data_di))
+        )
+    data_di.attrs = {
+        "attrs": {
+            "area": "area (ISO3)",
+            "cat": "category (CRF2013)",
+            "scen": "scenario (Access_Date)",
+        },
+        "time_format": "%Y",
+        "dimensions": {"*": dimensions},
+    }
+    return pm2.pm2io.from_interchange_format(data_di)
+
+
+def test_read_UNFCCC_DI_for_country_group_streaming(monkeypatch, tmp_path):
+    countries = {
+        "AUS": (4, ["1990", "2000"], ["CO2", "CH4"]),
+        "DEU": (3, ["1990", "2010"], ["CO2"]),
+        "FRA": (5, ["2000"], ["CH4", "N2O"]),
+    }
+
+    def read_country(country_code, **kwargs):
+        return make_raw_ai_di_data(country_code, *countries[country_code])
+
+    def save_dataset(data_pm2, raw, annexI, compression, streaming=False):
+        folder = tmp_path / f"streaming_{streaming}"
+        return write_DI_data_files(
+            data_pm2, folder / "DI_AnnexI", name="AnnexI", streaming=streaming
+        )
+
+    monkeypatch.setattr(unfccc_di_reader_core, "AI_countries", list(countries))
+    monkeypatch.setattr(unfccc_di_reader_core, "cache_path", tmp_path / "cache")
+    monkeypatch.setattr(
+        unfccc_di_reader_core, "read_UNFCCC_DI_for_country", read_country
+    )
+    monkeypatch.setattr(unfccc_di_reader_core, "save_DI_dataset", save_dataset)
+
+    data_memory = read_UNFCCC_DI_for_country_group(annexI=True, use_zenodo=False)
+    data_streaming = read_UNFCCC_DI_for_country_group(
+        annexI=True, use_zenodo=False, streaming=True
+    )
+    assert data_streaming["CO2"].chunks is not None
+    assert data_streaming.attrs["title"] == data_memory.attrs["title"]
+    # temporary country files are removed
+    assert list((tmp_path / "cache").iterdir()) == []
+
+    # the order of the dimensions of data read from the interchange format depends
+    # on the hash seed, so it can differ between the two datasets
+    data_streaming = data_streaming.transpose(*data_memory["CO2"].dims)
+    xr.testing.assert_equal(
+        data_streaming.pr.dequantify().load(), data_memory.pr.dequantify()
+    )
+    assert (tmp_path / "streaming_True" / "DI_AnnexI.csv").read_text() == (
+        tmp_path / "streaming_False" / "DI_AnnexI.csv"
+    ).read_text()
+
+    # temporary country files are also removed if saving fails (and not only when
+    # the traceback is freed)
+    def fail_save_dataset(*args, **kwargs):
+        raise OSError("disk full")  # noqa: TRY003
+
+    monkeypatch.setattr(unfccc_di_reader_core, "save_DI_dataset", fail_save_dataset)
+    with pytest.raises(OSError, match="disk full") as excinfo:
+        read_UNFCCC_DI_for_country_group(annexI=True, use_zenodo=False, streaming=True)
+    assert list((tmp_path / "cache").iterdir()) == []
+    assert excinfo.traceback
@@ -0,0 +1,543 @@
+import copy
+import json
+import os
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import primap2 as pm2
+import pytest
+import xarray as xr
+
+from unfccc_ghg_data.helper import (
+    DatasetCombiner,
+    FolderMappingIndex,
+    ProcessingProfiler,
+    add_aggregates_coordinates_planned,
+    combine_datasets,
+    compression,
+    concat_area_datasets,
+    create_folder_mapping,
+    get_country_code,
+    get_country_name,
+    get_dataset_hash,
+    plan_aggregation,
+    process_data_for_country,
+    write_interchange_format_streaming,
+    write_netcdf_streaming,
+)
+
+
+def make_dataset(rng, idx):
+    """Dataset with random categories, years and entities (with NaN values)"""
+    categories = rng.choice(list("ABCDEFGHIJ"), size=3, replace=False)
+    years = rng.choice(np.arange(2000, 2010), size=4, replace=False)
+    entities = rng.choice(["CO2", "CH4", "N2O"], size=2, replace=False)
+    ds = xr.Dataset(
+        {
+            entity: (
+                ("category", "time"),
+                np.where(rng.random((3, 4)) < 0.3, np.nan, rng.random((3, 4))),
+                {"entity": entity, "source": idx},
+            )
+            for entity in entities
+        },
+        coords={"category": categories, "time": years},
+        attrs={"source": idx},
+    )
+    return ds
+
+
+@pytest.mark.parametrize("n_datasets", [1, 2, 3, 7, 8, 13])
+def test_combine_datasets(n_datasets):
+    rng = np.random.default_rng(n_datasets)
+    datasets = [make_dataset(rng, idx) for idx in range(n_datasets)]
+
+    ds_expected = datasets[0]
+    for ds in datasets[1:]:
+        ds_expected = ds_expected.combine_first(ds)
+
+    xr.testing.assert_identical(combine_datasets(datasets), ds_expected)
+
+    # None is ignored and results can be taken in between
+    combiner = DatasetCombiner()
+    for idx, ds in enumerate(datasets):
+        combiner.add(ds)
+        combiner.add(None)
+        if idx == n_datasets // 2:
+            combiner.result()
+    assert len(combiner) == n_datasets
+    xr.testing.assert_identical(combiner.result(), ds_expected)
+
+
+def test_combine_datasets_units():
+    # pint quantities are converted to the units of the first dataset, variables
+    # and dims missing in some of the datasets are filled
+    ds_gg = xr.Dataset(
+        {
+            "CO2": (
+                ("area (ISO3)", "time"),
+                [[1.0, np.nan]],
+                {"entity": "CO2", "units": "Gg CO2 / year"},
+            ),
+        },
+        coords={"area (ISO3)": ["DEU"], "time": [2000, 2001], "source": "A"},
+        attrs={"area": "area (ISO3)"},
+    ).pr.quantify()
+    ds_mt = xr.Dataset(
+        {
+            "CO2": (
+                ("time", "area (ISO3)"),
+                [[5.0, 3.0], [2.0, 4.0]],
+                {"entity": "CO2", "units": "Mt CO2 / year"},
+            ),
+            "CH4": ("time", [7.0, 8.0], {"entity": "CH4", "units": "Gg CH4 / year"}),
+        },
+        coords={"area (ISO3)": ["DEU", "FRA"], "time": [2001, 2002], "source": "A"},
+        attrs={"area": "area (ISO3)"},
+    ).pr.quantify()
+
+    ds_expected = ds_gg.combine_first(ds_mt)
+    ds_combined = combine_datasets([ds_gg, ds_mt])
+
+    xr.testing.assert_identical(ds_combined, ds_expected)
+    assert str(ds_combined["CO2"].pint.units) == "CO2 * gigagram / year"
+    co2_deu_2001 = ds_combined["CO2"].sel({"area (ISO3)": "DEU", "time": 2001})
+    assert co2_deu_2001.pint.magnitude.item() == pytest.approx(5000.0)
+
+
+def test_combine_datasets_empty():
+    assert combine_datasets([]) is None
+    assert combine_datasets([None, None]) is None
+
+
+def make_country_dataset(rng, country, n_categories, years):
+    """Small primap2 dataset for one country"""
+    entities = ["CO2", "CH4"]
+    data_if = pd.DataFrame(
+        {
+            "source": "UNFCCC",
+            "scenario (PRIMAP)": "CRT1",
+            "provenance": "measured",
+            "area (ISO3)": country,
+            "entity": np.repeat(entities, n_categories),
+            "unit": np.repeat(
+                [f"Gg {entity} / yr" for entity in entities], n_categories
+            ),
+            "category (CRT1)": np.tile(
+                [f"1.{idx}" for idx in range(n_categories)], len(entities)
+            ),
+        }
+    )
+    dimensions = list(data_if.columns)
+    for year in years:
+        data_if[year] = np.where(
+            rng.random(len(data_if)) < 0.2, np.nan, rng.random(len(data_if))
+        )
+    data_if.attrs = {
+        "attrs": {
+            "area": "area (ISO3)",
+            "cat": "category (CRT1)",
+            "scen": "scenario (PRIMAP)",
+        },
+        "time_format": "%Y",
+        "dimensions": {"*": dimensions},
+    }
+    return pm2.pm2io.from_interchange_format(data_if)
+
+
+def test_process_data_for_country():
+    rng = np.random.default_rng(2)
+    years = [str(year) for year in range(2000, 2006)]
+    ds = make_country_dataset(rng, "DEU", 4, years).pr.dequantify().fillna(0.5)
+    ds.attrs["title"] = "test"
+    ds["UnspMixOfHFCs (SARGWP100)"] = ds["CO2"].assign_attrs(
+        entity="UnspMixOfHFCs", gwp_context="SARGWP100"
+    )
+    # time series can only be moved to empty time series
+    ds["CH4"].pr.loc[{"category": "1.3"}] = np.nan
+    processing_info = {
+        "remove_ts": {
+            "CO2_2001": {
+                "category": ["1.0", "1.1"],
+                "entities": ["CO2"],
+                "time": ["2002"],
+            },
+        },
+        "move_ts": {
+            "CH4": {
+                "entities": ["CH4"],
+                "dim": "category",
+                "sel": {"time": ["2002", "2003"]},
+                "from": "1.2",
+                "to": "1.3",
+            },
+        },
+        "interpolate_ts": {
+            "CO2": {"entities": ["CO2"], "category": ["1.0"]},
+        },
+        "basket_copy": {
+            "GWPs_to_add": ["AR4GWP100"],
+            "entities": ["UnspMixOfHFCs"],
+            "source_GWP": "SARGWP100",
+            "sel": {"category": ["1.3"]},
+        },
+    }
+    result = process_data_for_country(
+        ds.copy(deep=True), [], {}, processing_info_country=processing_info
+    )
+
+    def values(data, entity, category, year):
+        return data[entity].pr.loc[{"category": category, "time": year}].item()
+
+    # removed
+    assert np.isnan(values(result, "CO2", "1.1", "2002"))
+    assert values(result, "CH4", "1.1", "2002") == values(ds, "CH4", "1.1", "2002")
+    # removed and interpolated
+    assert values(result, "CO2", "1.0", "2002") == pytest.approx(
+        (values(ds, "CO2", "1.0", "2001") + values(ds, "CO2", "1.0", "2003")) / 2
+    )
+    # moved
+    for year in ["2002", "2003"]:
+        assert np.isnan(values(result, "CH4", "1.2", year))
+        assert values(result, "CH4", "1.3", year) == values(ds, "CH4", "1.2", year)
+    assert values(result, "CH4", "1.2", "2004") == values(ds, "CH4", "1.2", "2004")
+    assert np.isnan(values(result, "CH4", "1.3", "2004"))
+    # copied
+    data_AR4 = result["UnspMixOfHFCs (AR4GWP100)"]
+    assert data_AR4.attrs["gwp_context"] == "AR4GWP100"
+    assert data_AR4.pr.loc[{"category": "1.3"}].to_numpy() == pytest.approx(
+        1.1 * ds["CO2"].pr.loc[{"category": "1.3"}].to_numpy()
+    )
+    assert data_AR4.pr.loc[{"category": ["1.0", "1.1", "1.2"]}].isnull().all()  # noqa: PD003
+
+
+def test_process_data_for_country_subtract_cats(capsys):
+    rng = np.random.default_rng(3)
+    years = [str(year) for year in range(2000, 2004)]
+    ds = make_country_dataset(rng, "DEU", 6, years).pr.dequantify()
+    ds.attrs["title"] = "test"
+    # the generated categories depend on each other as in the Mexico config
+    subtract_cats = {
+        "A": {"parent": "1.0", "subtract": ["1.1", "1.2"]},
+        "B": {"parent": "1.3", "subtract": ["1.4"], "entities": ["CO2"]},
+        "C": {"parent": "A", "subtract": ["1.5"]},
+        "D": {"parent": "1.3", "subtract": ["C", "B"], "entities": ["CO2"]},
+    }
+    results = {}
+    for batched in [False, True]:
+        results[batched] = process_data_for_country(
+            ds.copy(deep=True),
+            [],
+            {},
+            processing_info_country={"subtract_cats": copy.deepcopy(subtract_cats)},
+            batch_subtract_cats=batched,
+        )
+        results[batched].attrs.pop("comment")
+        results[f"{batched} log"] = capsys.readouterr().out
+
+    xr.testing.assert_identical(results[True], results[False])
+    assert results["True log"] == results["False log"]
+    assert "Generating D through subtraction" in results["True log"]
+
+    def category(data, entity, cat):
+        return data[entity].pr.loc[{"category": cat}]
+
+    result = results[True]
+    expected = (
+        category(ds, "CO2", "1.0")
+        - category(ds, "CO2", ["1.1", "1.2"]).sum("category (CRT1)", min_count=1)
+        - category(ds, "CO2", "1.5")
+    )
+    np.testing.assert_allclose(
+        category(result, "CO2", "C").to_numpy(), expected.to_numpy()
+    )
+    assert category(result, "CH4", ["B", "D"]).isnull().all()  # noqa: PD003
+
+
+def test_processing_profiler(tmp_path):
+    rng = np.random.default_rng(5)
+    years = [str(year) for year in range(2000, 2004)]
+    ds = make_country_dataset(rng, "DEU", 4, years)
+    ds.attrs["title"] = "test"
+    processing_info = {
+        "remove_ts": {
+            "CO2": {"category": ["1.0"], "entities": ["CO2"], "time": ["2001"]},
+            "CH4": {"category": ["1.1"], "entities": ["CH4"], "time": ["2002"]},
+        },
+        "aggregate_coords": {"category": {"1": ["1.0", "1.1", "1.2", "1.3"]}},
+    }
+
+    with ProcessingProfiler("DEU", folder=tmp_path) as profiler:
+        result = process_data_for_country(
+            ds, [], {}, processing_info_country=processing_info, profiler=profiler
+        )
+
+    steps = [(record["step"], record["case"]) for record in profiler.records]
+    assert steps == [
+        ("remove_nan", None),
+        ("entities_to_ignore", None),
+        ("remove_ts", "CO2"),
+        ("remove_ts", "CH4"),
+        ("aggregate_coords", None),
+    ]
+    assert profiler.records[-1]["size_after"] == result.nbytes
+    assert profiler.records[-1]["size_after"] > profiler.records[-1]["size_before"]
+
+    with open(tmp_path / "DEU.json") as report_file:
+        report = json.load(report_file)
+    assert report["steps"] == profiler.records
+    assert report["wall_time"] == pytest.approx(
+        sum(record["wall_time"] for record in profiler.records)
+    )
+    report_csv = pd.read_csv(tmp_path / "DEU.csv")
+    assert list(report_csv["step"]) == [step for step, _ in steps]
+
+
+def test_processing_profiler_peak_memory(tmp_path):
+    ds = xr.Dataset({"CO2": ("time", np.zeros(10))})
+    n_bytes = 8 * 2**20
+    with ProcessingProfiler("peak", folder=tmp_path) as profiler:
+        assert tracemalloc.is_tracing()
+        # the peak is measured per step, so a step with a lower peak than an
+        # earlier step is recorded correctly
+        array = np.ones(4 * n_bytes // 8)
+        del array
+        profiler.record("large", ds)
+        array = np.ones(n_bytes // 8)
+        del array
+        profiler.record("small", ds)
+        profiler.record("nothing", ds)
+    assert not tracemalloc.is_tracing()
+
+    peaks = {record["step"]: record["peak_memory"] for record in profiler.records}
+    assert 4 * n_bytes <= peaks["large"] < 5 * n_bytes
+    assert n_bytes <= peaks["small"] < 2 * n_bytes
+    assert peaks["nothing"] < n_bytes
+
+
+def test_plan_aggregation():
+    agg_rules = {
+        # uses A and B as they are before they are aggregated
+        "T": ["A", "B"],
+        "B": ["B.1", "B.2"],
+        "A": {"sources": ["A.1", "A.2"], "orig_cat_name": "A"},
+        "C": ["A", "C.1"],
+        "D": ["C", "B"],
+        "E": ["E.1"],
+    }
+    assert plan_aggregation(agg_rules) == [["T", "B", "A", "E"], ["C"], ["D"]]
+    assert plan_aggregation({}) == []
+    with pytest.raises(ValueError, match="Unrecognized aggregation definition"):
+        plan_aggregation({"A": "A.1"})
+
+
+def test_add_aggregates_coordinates_planned():
+    rng = np.random.default_rng(4)
+    years = [str(year) for year in range(2000, 2004)]
+    ds = make_country_dataset(rng, "DEU", 6, years)
+    ds.attrs["title"] = "test"
+    agg_info = {
+        "category": {
+            "1": ["1.A", "1.B", "1.5"],
+            "1.A": ["1.0", "1.1", "1.6"],
+            "1.B": {"sources": ["1.2", "1.3"], "sel": {"entity": ["CO2"]}},
+            "1.C": {"sources": ["1.A", "1.4"], "tolerance": 0.1},
+            "1.D": ["1.C", "1.B"],
+            "1.E": ["1.7"],
+        },
+    }
+
+    result = add_aggregates_coordinates_planned(ds, agg_info)
+
+    expected = ds.pr.add_aggregates_coordinates(agg_info=agg_info)
+    xr.testing.assert_identical(result, expected)
+    assert "1.E" not in result.indexes["category (CRT1)"]
+    assert result["CH4"].pr.loc[{"category": "1.B"}].isnull().all()  # noqa: PD003
+
+    # X uses 1.0 before it's filled by the rule for 1.0, which is in the same level
+    # but computed with a different selection
+    ds = make_country_dataset(rng, "DEU", 5, years).pr.dequantify().fillna(0.5)
+    ds.attrs["title"] = "test"
+    for var in ds.data_vars:
+        ds[var].pr.loc[{"category": "1.0"}] = (
+            ds[var].pr.loc[{"category": ["1.1", "1.2"]}].sum("category (CRT1)")
+        )
+    ds["CO2"].pr.loc[{"category": "1.0", "time": "2001"}] = np.nan
+    ds = ds.pr.quantify()
+    agg_info = {
+        "category": {
+            "W": ["1.4"],
+            "X": {"sources": ["1.0"], "sel": {"entity": ["CO2"]}},
+            "1.0": ["1.1", "1.2"],
+        },
+    }
+
+    result = add_aggregates_coordinates_planned(ds, agg_info)
+
+    expected = ds.pr.add_aggregates_coordinates(agg_info=agg_info)
+    xr.testing.assert_identical(result, expected)
+    assert result["CO2"].pr.loc[{"category": "X", "time": "2001"}].isnull().all()  # noqa: PD003
+
+
+def test_streaming_output(tmp_path):
+    rng = np.random.default_rng(1)
+    files = []
+    # countries with different categories, years, and attrs
+    for country, n_categories, years in [
+        ("DEU", 5, ["2000", "2001", "2002"]),
+        ("AUS", 3, ["2001", "2002"]),
+        ("FRA", 7, ["2000", "2002"]),
+    ]:
+        file = tmp_path / f"{country}.nc"
+        ds = make_country_dataset(rng, country, n_categories, years)
+        ds.attrs["title"] = f"test {country}"
+        ds.pr.to_netcdf(file)
+        files.append(file)
+
+    ds_memory = combine_datasets(pm2.open_dataset(file) for file in files)
+    encoding = {var: compression for var in ds_memory.data_vars}
+    pm2.pm2io.write_interchange_format(
+        tmp_path / "memory", ds_memory.pr.to_interchange_format()
+    )
+    ds_memory.pr.to_netcdf(tmp_path / "memory.nc", encoding=encoding)
+
+    ds_lazy = concat_area_datasets(
+        [pm2.open_dataset(file, chunks=-1) for file in files]
+    )
+    assert ds_lazy["CO2"].chunks is not None
+    assert ds_lazy.attrs == ds_memory.attrs
+    assert ds_lazy.attrs["title"] == "test DEU"
+    write_interchange_format_streaming(tmp_path / "streaming", ds_lazy)
+    write_netcdf_streaming(tmp_path / "streaming.nc", ds_lazy, encoding=encoding)
+
+    assert (tmp_path / "streaming.csv").read_text() == (
+        tmp_path / "memory.csv"
+    ).read_text()
+    assert (tmp_path / "streaming.yaml").read_text() == (
+        tmp_path / "memory.yaml"
+    ).read_text().replace("memory.csv", "streaming.csv")
+    xr.testing.assert_identical(
+        pm2.open_dataset(tmp_path / "streaming.nc").pr.dequantify(),
+        pm2.open_dataset(tmp_path / "memory.nc").pr.dequantify(),
+    )
+
+    # overlapping areas can't be concatenated
+    with pytest.raises(ValueError):
+        concat_area_datasets([pm2.open_dataset(file) for file in files[:1] * 2])
+
+
+def test_get_dataset_hash(tmp_path):
+    rng = np.random.default_rng(2)
+    ds = concat_area_datasets(
+        [
+            make_country_dataset(rng, "DEU", 5, ["2000", "2001", "2002"]),
+            make_country_dataset(rng, "FRA", 3, ["2000", "2002"]),
+        ]
+    )
+    ds_hash = get_dataset_hash(ds)
+    assert len(ds_hash) == 32
+
+    # independent of order and blocks
+    ds_reordered = ds[["CH4", "CO2"]].isel(
+        {"area (ISO3)": [1, 0], "category (CRT1)": [4, 2, 0, 1, 3]}
+    )
+    assert get_dataset_hash(ds_reordered.transpose(*list(ds.sizes)[::-1])) == ds_hash
+    assert get_dataset_hash(ds, block_size=7) == ds_hash
+
+    # lazily loaded data
+    ds.pr.to_netcdf(tmp_path / "data.nc")
+    assert get_dataset_hash(pm2.open_dataset(tmp_path / "data.nc")) == ds_hash
+    ds_lazy = pm2.open_dataset(tmp_path / "data.nc", chunks={"area (ISO3)": 1})
+    assert get_dataset_hash(ds_lazy) == ds_hash
+
+    # changed data, units and coordinates
+    ds_changed = ds.copy(deep=True)
+    ds_changed["CO2"].pint.magnitude[0, 0, 0, 0, 0, 0] = 1.5
+    assert get_dataset_hash(ds_changed) != ds_hash
+    ds_units = ds.pr.dequantify()
+    ds_units["CO2"].attrs["units"] = "Mt CO2 / yr"
+    assert get_dataset_hash(ds_units.pr.quantify()) != ds_hash
+    ds_scen = ds.assign_coords({"scenario (PRIMAP)": ["CRT2"]})
+    assert get_dataset_hash(ds_scen) != ds_hash
+    assert get_dataset_hash(
+        ds_scen, exclude_coords=["scenario (PRIMAP)"]
+    ) == get_dataset_hash(ds, exclude_coords=["scenario (PRIMAP)"])
+
+
+def test_folder_mapping_index(tmp_path):
+    mapping_file = tmp_path / "folder_mapping.json"
+    mapping_file.write_text(
+        json.dumps(
+            {
+                "ARG": "Argentina",
+                "CIV": ["Cote_d_Ivoire", "Côte_d'Ivoire"],
+                "KOR": [["Republic_of_Korea", "Korea"], "Korea,_Republic_of"],
+            }
+        )
+    )
+    index = FolderMappingIndex()
+    assert index.get_folders(tmp_path, "ARG") == ["Argentina"]
+    assert index.get_folders(tmp_path, "CIV") == ["Cote_d_Ivoire", "Côte_d'Ivoire"]
+    assert index.get_folders(tmp_path, "KOR") == [
+        "Republic_of_Korea",
+        "Korea",
+        "Korea,_Republic_of",
+    ]
+    assert index.get_folders(tmp_path, "BRA") == []
+    # the returned lists can be changed without changing the index
+    index.get_folders(tmp_path, "ARG").append("Brazil")
+    assert index.get_mapping(tmp_path)["ARG"] == ["Argentina"]
+
+    # the file is only read again if it changed
+    mapping = index.get_mapping(tmp_path)
+    assert index.get_mapping(tmp_path) is mapping
+    mapping_file.write_text(json.dumps({"BRA": "Brazil"}))
+    os.utime(mapping_file, ns=(0, 0))
+    assert index.get_mapping(tmp_path) == {"BRA": ["Brazil"]}
+    assert index.get_folders(tmp_path, "ARG") == []
+
+    mapping_file.write_text(json.dumps({"BRA": 1}))
+    os.utime(mapping_file, ns=(1, 1))
+    with pytest.raises(TypeError):
+        index.get_mapping(tmp_path)
+
+
+def test_get_country_code():
+    assert get_country_code("DEU") == "DEU"
+    assert get_country_code("EUA") == "EUA"
+    assert get_country_code("Germany") == "DEU"
+    assert get_country_code("Federal_Republic_of_Germany") == "DEU"
+    # exact names are not resolved by the fuzzy search
+    assert get_country_code("Niger") == "NER"
+    assert get_country_code("Republic_of_Korea") == "KOR"
+    assert get_country_code("Venezeula_(Bolivarian_Republic_of)") == "VEN"
+    # fuzzy search
+    assert get_country_code("Saint_Vincent") == "VCT"
+    with pytest.raises(ValueError):
+        get_country_code("Atlantis")
+    assert get_country_name("DEU") == "Germany"
+    assert get_country_name("EUA") == "European Union"
+    with pytest.raises(ValueError):
+        get_country_name("XXX")
+
+
+def test_create_folder_mapping(tmp_path):
+    for folder in ["Germany", "Niger", "Nigeria", "Republic_of_Korea", "Atlantis"]:
+        (tmp_path / folder).mkdir()
+    (tmp_path / "Venezeula_(Bolivarian_Republic_of)").mkdir()
+    (tmp_path / "Venezuela_(Bolivarian_Republic_of)").mkdir()
+    create_folder_mapping(tmp_path)
+    with open(tmp_path / "folder_mapping.json") as mapping_file:
+        mapping = json.load(mapping_file)
+    mapping["VEN"] = sorted(mapping["VEN"])
+    assert mapping == {
+        "DEU": "Germany",
+        "KOR": "Republic_of_Korea",
+        "NER": "Niger",
+        "NGA": "Nigeria",
+        "VEN": [
+            "Venezeula_(Bolivarian_Republic_of)",
+            "Venezuela_(Bolivarian_Republic_of)",
+        ],
+    }